@@ -0,0 +1,64 @@
+"""Compare the JSON and binary player record formats.
+
+Usage: python -m benchmarks.bench_codec [--players 10000] [--trades 2]
+
+Encodes and decodes the same synthetic records with every codec and reports
+records per second each way and the average encoded size.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fruitTycoon.codec import CODECS
+from fruitTycoon.player import Player
+from fruitTycoon.trade import Trade, OutgoingTrade
+
+
+def make_record(n, trades):
+    player = Player(str(100000000000000000 + n), ("apple", "banana", "grape")[n % 3])
+    player.money = n * 7
+    player.last_harvest = 1500000000 + n
+    player.inventory = {"apple": n, "banana": n * 2, "grape": n * 3}
+    player.upgrades["farm"] = ["Refinery"] if n % 2 else []
+    for slot in range(trades):
+        player.in_trade[slot] = Trade(
+            sender=(str(n + 1), "sender{}".format(n), slot), recipient=(player.id, "player{}".format(n), slot),
+            request=("apple", 10), offer=("banana", 12)
+        )
+        player.out_trade[slot] = OutgoingTrade("recipient{}".format(n), str(n + 2), ("grape", 5), ("money", 100))
+    return json.loads(json.dumps(player.to_record()))
+
+def timed(func, items):
+    start = time.perf_counter()
+    results = [func(x) for x in items]
+    return results, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=10000)
+    parser.add_argument("--trades", type=int, default=2, help="Incoming and outgoing trades per player (0-4).")
+    args = parser.parse_args()
+
+    records = [make_record(n, args.trades) for n in range(args.players)]
+
+    results = {"players": args.players, "trades_per_player": args.trades}
+    for name, codec in CODECS.items():
+        encoded, encode_time = timed(codec.encode, records)
+        decoded, decode_time = timed(codec.decode, encoded)
+        if decoded != records:
+            raise RuntimeError("{} codec did not round trip".format(name))
+
+        results[name] = {
+            "encode_per_s": round(args.players / encode_time),
+            "decode_per_s": round(args.players / decode_time),
+            "avg_bytes": round(sum(len(x) for x in encoded) / args.players, 1)
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
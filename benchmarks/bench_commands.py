@@ -0,0 +1,277 @@
+"""Benchmark GameManager commands headlessly against a synthetic population.
+
+Usage: python -m benchmarks.bench_commands [--players 1000 10000] [--backend json|sqlite]
+                                            [--iterations 200] [--output results.json]
+
+For every population size a fresh data directory is filled with players, then
+join, harvest, sell, trade/accept, produce, upgrade (one level and max),
+profile and leaderboard are driven through a FakeDiscordClient. sell, trade and
+produce run both as a dialogue and as a single line command (the _oneshot
+scenarios). The output is JSON with per-command p50/p99
+latency, storage I/O per command, Discord API calls per command (as sent by
+the outbox, after merging) and memory allocated per command.
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import inspect
+import argparse
+import tempfile
+import tracemalloc
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fruitTycoon.game import GameManager
+from fruitTycoon.player import Player
+from fruitTycoon.production import ProductionScheduler
+from fruitTycoon.eventLog import EventLog
+from fruitTycoon.storage import create_storage
+
+from benchmarks.fake_client import FakeDiscordClient
+
+APPLE, BANANA = "\U0001F34E", "\U0001F34C"
+
+COUNTED_METHODS = (
+    "load_player", "load_player_async", "save_player", "save_player_async",
+    "save_players", "save_players_async", "delete_player", "iter_players", "iter_money",
+    "index_add", "index_remove"
+)
+
+
+def make_config(directory, backend):
+    return {
+        "credentials": {"token": "", "owner_id": ""},
+        "chat": {"prefix": "!", "bind_to_channels": [], "leaderboard_channel": "1"},
+        "bot": {"debug_level": "WARNING", "discord_debug_mode": False},
+        "storage": {
+            "backend": backend,
+            "path": directory if backend == "json" else os.path.join(directory, "players.db"),
+            "commit_window": 0.05
+        },
+        "cache": {"max_players": 1000, "ttl": 900, "flush_interval": 30},
+        # Nothing is really sent, so don't hold the commands back
+        "outbox": {"rate": 10 ** 6, "per": 1, "global_rate": 10 ** 6}
+    }
+
+def build_population(config, count):
+    """Write count players straight into storage, with enough money and fruit for every command."""
+    storage = create_storage(config["storage"]["backend"], config["storage"]["path"])
+    fruits = ("apple", "banana", "grape")
+
+    ids = []
+    batch = []
+    for n in range(count):
+        player = Player("p{}".format(n), fruits[n % 3])
+        player.money = 10 ** 9 + n
+        player.inventory = {"apple": 10 ** 6, "banana": 10 ** 6, "grape": 10 ** 6}
+        player.farm_level = 1 # Regular drinks only, so produce asks no quality question
+        ids.append(player.id)
+        batch.append((player.id, player.to_record()))
+        if len(batch) >= 1000:
+            storage.save_players(batch)
+            batch = []
+    storage.save_players(batch)
+    storage.save_index(ids)
+    storage.close()
+    return ids
+
+
+class IOCounter:
+
+    def __init__(self, storage):
+        """Counts calls to the storage backend's methods."""
+        self.counts = Counter()
+        for name in COUNTED_METHODS:
+            setattr(storage, name, self._wrap(name, getattr(storage, name)))
+
+    def _wrap(self, name, method):
+        counts = self.counts
+        if inspect.iscoroutinefunction(method):
+            async def counted(*args, **kwargs):
+                counts[name] += 1
+                return await method(*args, **kwargs)
+        else:
+            def counted(*args, **kwargs):
+                counts[name] += 1
+                return method(*args, **kwargs)
+        return counted
+
+
+class Scenario:
+
+    def __init__(self, game, client, ids):
+        """Builds each command's call for iteration i."""
+        self.game = game
+        self.client = client
+        self.ids = ids
+        self.members = {}
+        self.joined = 0
+
+    def member(self, i):
+        player_id = self.ids[i % len(self.ids)]
+        if player_id not in self.members:
+            self.members[player_id] = self.client.add_member(player_id)
+        return self.members[player_id]
+
+    def join(self, i):
+        self.joined += 1
+        member = self.client.add_member("new{}".format(self.joined))
+        return self.game.join_game(self.client.context(member), "apple")
+
+    def harvest(self, i):
+        return self.game.harvest(self.client.context(self.member(i)))
+
+    def sell(self, i):
+        member = self.member(i)
+        self.client.script(member, "yes")
+        return self.game.sell(self.client.context(member), APPLE + "x10")
+
+    def sell_oneshot(self, i):
+        return self.game.sell(self.client.context(self.member(i)), APPLE + "x10", BANANA + "x10", "yes")
+
+    async def trade(self, i):
+        # Disjoint pairs, so the recipient's first trade slot is always free
+        sender, recipient = self.member(2 * i), self.member(2 * i + 1)
+        self.client.script(sender, APPLE, "10", BANANA, "10", "yes")
+        await self.game.send_trade(self.client.context(sender), "<@{}>".format(recipient.id), None, None)
+        await self.game.accept_trade(self.client.context(recipient), "1")
+
+    async def trade_oneshot(self, i):
+        sender, recipient = self.member(2 * i), self.member(2 * i + 1)
+        await self.game.send_trade(self.client.context(sender), "<@{}>".format(recipient.id), APPLE + "x10", BANANA + "x10", "yes")
+        await self.game.accept_trade(self.client.context(recipient), "1")
+
+    def produce(self, i):
+        member = self.member(i)
+        self.client.script(member, APPLE, "10", "yes")
+        return self.game.produce(self.client.context(member), "regular")
+
+    def produce_oneshot(self, i):
+        return self.game.produce(self.client.context(self.member(i)), "regular", "apple", "10", "yes")
+
+    def upgrade(self, i):
+        return self.game.upgrade(self.client.context(self.member(i)), "size")
+
+    def upgrade_max(self, i):
+        return self.game.upgrade(self.client.context(self.member(i)), "multiplier", "max")
+
+    def profile(self, i):
+        return self.game.get_profile(self.client.context(self.member(i)))
+
+    def leaderboard(self, i):
+        return self.game.get_leaderboard(self.client.context(self.member(i)))
+
+    commands = (
+        "join", "harvest", "sell", "sell_oneshot", "trade", "trade_oneshot", "produce", "produce_oneshot",
+        "upgrade", "upgrade_max", "profile", "leaderboard"
+    )
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def run_command(scenario, io, name, iterations, offset):
+    command = getattr(scenario, name)
+    io_before = Counter(io.counts)
+    calls_before = Counter(scenario.client.calls)
+
+    latencies = []
+    for i in range(offset, offset + iterations):
+        start = time.perf_counter()
+        await command(i)
+        latencies.append(time.perf_counter() - start)
+
+    # Drain the outbox, the write-back cache and the group-commit writer so their calls and I/O are counted too
+    await scenario.client.outbox.drain()
+    await scenario.game.cache.flush_async()
+    await scenario.game.storage.writer.flush()
+
+    io_used = Counter(io.counts)
+    io_used.subtract(io_before)
+    calls = Counter(scenario.client.calls)
+    calls.subtract(calls_before)
+
+    # Allocations are measured in a separate, shorter pass as tracemalloc slows everything down
+    allocations = []
+    tracemalloc.start()
+    for i in range(offset + iterations, offset + iterations + max(1, iterations // 10)):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await command(i)
+        current, peak = tracemalloc.get_traced_memory()
+        allocations.append((current - before, peak - before))
+    await scenario.client.outbox.drain()
+    tracemalloc.stop()
+
+    return {
+        "count": iterations,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "mean_ms": round(sum(latencies) / iterations * 1000, 3),
+        "io_per_command": {k: round(v / iterations, 3) for k, v in io_used.items() if v},
+        "discord_calls_per_command": {k: round(v / iterations, 3) for k, v in calls.items() if v},
+        "retained_kb_per_command": round(sum(x[0] for x in allocations) / len(allocations) / 1024, 2),
+        "peak_kb_per_command": round(sum(x[1] for x in allocations) / len(allocations) / 1024, 2)
+    }
+
+async def run_population(count, backend, iterations):
+    with tempfile.TemporaryDirectory() as directory:
+        config = make_config(directory, backend)
+        ProductionScheduler.journal_location = os.path.join(directory, "productions.journal")
+        EventLog.log_location = os.path.join(directory, "economy.log")
+
+        build_start = time.perf_counter()
+        ids = build_population(config, count)
+        build_time = time.perf_counter() - build_start
+
+        startup_start = time.perf_counter()
+        game = GameManager(config=config, client_class=FakeDiscordClient)
+        startup_time = time.perf_counter() - startup_start
+
+        io = IOCounter(game.storage)
+        scenario = Scenario(game, game.client, ids)
+
+        results = {}
+        offset = 0
+        for name in Scenario.commands:
+            results[name] = await run_command(scenario, io, name, iterations, offset)
+            offset += iterations * 3
+
+        game.shutdown()
+        return {
+            "players": count,
+            "backend": backend,
+            "populate_s": round(build_time, 3),
+            "startup_s": round(startup_time, 3),
+            "cache": game.cache.stats(),
+            "writer": game.storage.writer.stats(),
+            "commands": results
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--backend", choices=["json", "sqlite"], default="json")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default=None, help="Write the JSON results to this file instead of stdout.")
+    args = parser.parse_args()
+
+    loop = asyncio.get_event_loop()
+    results = {
+        "python": sys.version.split()[0],
+        "runs": [loop.run_until_complete(run_population(n, args.backend, args.iterations)) for n in args.players]
+    }
+
+    output = json.dumps(results, indent=2)
+    if args.output is None:
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
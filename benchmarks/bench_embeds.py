@@ -0,0 +1,106 @@
+"""Compare rendering embeds from precompiled EmbedTemplates against deepcopy + format.
+
+Usage: python -m benchmarks.bench_embeds [--iterations N]
+
+Prints a JSON object with the time per render and the memory allocated per
+render (measured with tracemalloc) for each approach.
+"""
+import os
+import sys
+import copy
+import json
+import timeit
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fruitTycoon.embedTemplate import compile_templates
+
+GAME_DATA = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/game_data.json"
+
+
+def profile_deepcopy(embeds):
+    # The approach used before templates were compiled
+    embed = copy.deepcopy(embeds["profile"])
+    embed["title"] = embed["title"].format("Player")
+    embed["thumbnail"]["url"] = embed["thumbnail"]["url"].format("https://example.com/avatar.png")
+    embed["fields"][0]["value"] = embed["fields"][0]["value"].format("apple")
+    embed["fields"][1]["value"] = embed["fields"][1]["value"].format("1 hours 5 minutes")
+    embed["fields"][2]["value"] = embed["fields"][2]["value"].format(100, 200, 300)
+    embed["fields"][3]["value"] = embed["fields"][3]["value"].format(5000)
+    embed["fields"][4]["value"] = embed["fields"][4]["value"].format(2, 2500)
+    embed["fields"][5]["value"] = embed["fields"][5]["value"].format(1.1)
+    embed["fields"][6]["value"] = embed["fields"][6]["value"].format("None")
+    return embed
+
+def profile_template(templates):
+    return templates["profile"].render({
+        "title": "Player",
+        "thumbnail.url": "https://example.com/avatar.png",
+        "fields.0.value": "apple",
+        "fields.1.value": "1 hours 5 minutes",
+        "fields.2.value": (100, 200, 300),
+        "fields.3.value": 5000,
+        "fields.4.value": (2, 2500),
+        "fields.5.value": 1.1,
+        "fields.6.value": "None"
+    })
+
+def harvest_deepcopy(embeds):
+    embed = copy.deepcopy(embeds["harvest"])
+    embed["thumbnail"]["url"] = embed["thumbnail"]["url"].format("https://example.com/apple.png")
+    embed["fields"][0]["value"] = embed["fields"][0]["value"].format("apple", 1500)
+    return embed
+
+def harvest_template(templates):
+    return templates["harvest"].render({
+        "thumbnail.url": "https://example.com/apple.png",
+        "fields.0.value": ("apple", 1500)
+    })
+
+
+def measure(func, arg, iterations):
+    seconds = timeit.timeit(lambda: func(arg), number=iterations)
+
+    # Keep every result alive so the allocations are not freed and reused
+    results = []
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(1000):
+        results.append(func(arg))
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    stats = after.compare_to(before, "filename")
+    size = sum(x.size_diff for x in stats)
+    blocks = sum(x.count_diff for x in stats)
+    return {
+        "us_per_render": round(seconds / iterations * 1e6, 3),
+        "bytes_per_render": round(size / 1000, 1),
+        "blocks_per_render": round(blocks / 1000, 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    with open(GAME_DATA, encoding="utf-8") as f:
+        embeds = json.load(f)["embeds"]
+    templates = compile_templates(embeds)
+
+    # Both approaches must build the same embed
+    assert profile_deepcopy(embeds) == profile_template(templates)
+    assert harvest_deepcopy(embeds) == harvest_template(templates)
+
+    results = {}
+    for name, old, new in (("profile", profile_deepcopy, profile_template), ("harvest", harvest_deepcopy, harvest_template)):
+        results[name] = {
+            "deepcopy": measure(old, embeds, args.iterations),
+            "template": measure(new, templates, args.iterations)
+        }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
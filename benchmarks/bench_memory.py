@@ -0,0 +1,89 @@
+"""Measure the memory held by resident Player objects.
+
+Usage: python -m benchmarks.bench_memory [--players 100000] [--trades 2]
+
+Builds records the way storage returns them, loads them into Players, drops
+the records and reports the bytes each player keeps alive (tracemalloc). The
+same records are also loaded the old way, as a plain object whose __dict__ is
+the record, for comparison.
+"""
+import os
+import gc
+import sys
+import json
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from fruitTycoon.player import Player
+from fruitTycoon.trade import Trade
+
+
+class DictPlayer:
+    """How players were held before: the record became the instance __dict__."""
+
+    def __init__(self, record):
+        self.__dict__ = record
+        for pos, trade in enumerate(self.in_trade):
+            if trade != 0:
+                loaded = DictTrade()
+                loaded.__dict__ = trade
+                self.in_trade[pos] = loaded
+
+
+class DictTrade:
+    pass
+
+
+def make_record(n, trades):
+    player = Player(str(100000000000000000 + n), ("apple", "banana", "grape")[n % 3])
+    player.money = n * 7
+    player.last_harvest = 1500000000 + n
+    for slot in range(trades):
+        trade = Trade(
+            sender=(str(n + 1), "sender{}".format(n), slot), recipient=(player.id, "player{}".format(n), slot),
+            request=("apple", 10), offer=("banana", 12)
+        )
+        player.in_trade[slot] = trade
+    record = player.to_record()
+
+    # Round trip through JSON, as storage would
+    return json.loads(json.dumps(record))
+
+def measure(count, trades, load):
+    """Bytes still allocated once the records are dropped and only the players remain."""
+    tracemalloc.start()
+    records = [make_record(n, trades) for n in range(count)]
+    resident = [load(record) for record in records]
+    del records
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    del resident
+    return used
+
+def load_slotted(record):
+    player = Player(record["id"])
+    player.load_record(record)
+    return player
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--players", type=int, default=100000)
+    parser.add_argument("--trades", type=int, default=2, help="Incoming trades per player (0-4).")
+    args = parser.parse_args()
+
+    results = {"players": args.players, "trades_per_player": args.trades}
+    for name, load in (("slotted", load_slotted), ("dict", DictPlayer)):
+        used = measure(args.players, args.trades, load)
+        results[name] = {
+            "total_mb": round(used / 1024 / 1024, 2),
+            "bytes_per_player": round(used / args.players)
+        }
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
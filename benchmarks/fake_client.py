@@ -0,0 +1,155 @@
+"""A local stand-in for DiscordClient, so GameManager commands can run without Discord.
+
+Sends go through the same Outbox as DiscordClient and are recorded instead of
+delivered, so calls counts what would reach Discord after merging.
+wait_for_message/wait_for_reaction are answered from scripted answers queued
+per member.
+"""
+import itertools
+from datetime import datetime
+from collections import deque, namedtuple, Counter
+
+from fruitTycoon.memberDirectory import MemberDirectory
+from fruitTycoon.outbox import Outbox
+
+ReactionResult = namedtuple("ReactionResult", ["reaction", "user"])
+
+_ids = itertools.count(1)
+
+
+class FakeServer:
+    def __init__(self, server_id="1", name="Benchmark"):
+        self.id = server_id
+        self.name = name
+        self.members = []
+
+
+class FakeChannel:
+    def __init__(self, channel_id=None, is_private=False):
+        self.id = channel_id or str(next(_ids))
+        self.is_private = is_private
+
+
+class FakeMember:
+    def __init__(self, member_id, server, name=None):
+        self.id = member_id
+        self.name = name or "player{}".format(member_id)
+        self.server = server
+        self.avatar_url = ""
+        self.default_avatar_url = "https://cdn.discordapp.com/embed/avatars/0.png"
+        self.dm_channel = FakeChannel(is_private=True)
+
+
+class FakeMessage:
+    def __init__(self, author, channel, content=""):
+        self.id = str(next(_ids))
+        self.author = author
+        self.channel = channel
+        self.content = content
+        self.timestamp = datetime.utcnow()
+
+
+class FakeReaction:
+    def __init__(self, emoji, message):
+        self.emoji = emoji
+        self.message = message
+
+
+class FakeContext:
+    def __init__(self, message):
+        self.message = message
+
+
+class FakeDiscordClient:
+
+    def __init__(self, config, game_data, game=None):
+        self.game = game
+        self.command_prefix = config["chat"]["prefix"]
+        self.server = FakeServer()
+        self.member_directory = MemberDirectory()
+
+        outbox_config = config.get("outbox", {})
+        self.outbox = Outbox(
+            self._deliver_message, self._deliver_typing,
+            rate=outbox_config.get("rate", 5),
+            per=outbox_config.get("per", 5),
+            global_rate=outbox_config.get("global_rate", 50),
+            metrics=game.metrics if game is not None else None
+        )
+
+        self.answers = {} # member_id -> deque of scripted answers
+        self.sent = []
+        self.calls = Counter()
+
+    # Setup
+    # ---------------------------
+
+    def add_member(self, member_id):
+        member = FakeMember(member_id, self.server)
+        self.server.members.append(member)
+        self.member_directory.add(member)
+        return member
+
+    def script(self, member, *answers):
+        """Queue answers for a member's next dialogue prompts (emoji for reactions, text for messages)."""
+        self.answers.setdefault(member.id, deque()).extend(answers)
+
+    def context(self, member, content="", channel=None):
+        return FakeContext(FakeMessage(member, channel or FakeChannel(), content))
+
+    def _answer(self, member):
+        try:
+            return self.answers[member.id].popleft()
+        except (KeyError, IndexError):
+            raise RuntimeError("No scripted answer left for {}".format(member.id))
+
+    # DiscordClient API
+    # ---------------------------
+
+    def apply_config(self, config):
+        self.command_prefix = config["chat"]["prefix"]
+
+
+    def get_all_members(self):
+        return iter(self.server.members)
+
+    def get_channel(self, channel_id):
+        return FakeChannel(channel_id)
+
+    async def start_private_message(self, member):
+        return member.dm_channel
+
+    async def send_message(self, destination, content=None, **kwargs):
+        return await self.outbox.send(destination, content, **kwargs)
+
+    def post(self, destination, content=None, **kwargs):
+        self.outbox.post(destination, content, **kwargs)
+
+    async def send_typing(self, destination):
+        self.outbox.typing(destination)
+
+    async def _deliver_message(self, destination, content=None, *, embed=None, **kwargs):
+        self.calls["send_message"] += 1
+        self.sent.append((destination, content, embed))
+        return FakeMessage(None, destination, content or "")
+
+    async def _deliver_typing(self, destination):
+        self.calls["send_typing"] += 1
+
+    async def add_reaction(self, message, emoji):
+        self.calls["add_reaction"] += 1
+
+    async def add_reactions(self, message, reactions):
+        for x in reactions:
+            await self.add_reaction(message, x)
+
+    async def wait_for_message(self, timeout=None, *, author=None, channel=None, content=None, check=None):
+        self.calls["wait_for_message"] += 1
+        message = FakeMessage(author, channel, self._answer(author))
+        if check is not None and not check(message):
+            raise RuntimeError("Scripted answer {!r} was rejected".format(message.content))
+        return message
+
+    async def wait_for_reaction(self, emoji=None, *, user=None, timeout=None, message=None, check=None):
+        self.calls["wait_for_reaction"] += 1
+        return ReactionResult(FakeReaction(self._answer(user), message), user)
@@ -0,0 +1,115 @@
+# Internal Python Moduels
+import re
+import logging
+
+log = logging.getLogger("root")
+log.debug("arguments.py loaded")
+
+FRUIT_EMOJIS = {"\U0001F34E": "apple", "\U0001F34C": "banana", "\U0001F347": "grape"}
+ITEM_EMOJIS = dict(FRUIT_EMOJIS, **{"\U0001F4B0": "money"})
+
+# name -> emoji, used when echoing items back
+EMOJI_OF = {name: emoji for emoji, name in ITEM_EMOJIS.items()}
+
+# Every way an item can be written: emoji, name, plural or :shortcode:
+ITEM_NAMES = dict(ITEM_EMOJIS)
+for _name, _aliases in (("apple", ("apples",)), ("banana", ("bananas",)), ("grape", ("grapes",)), ("money", ("moneybag",))):
+    for _alias in (_name,) + _aliases:
+        ITEM_NAMES[_alias] = _name
+        ITEM_NAMES[":{}:".format(_alias)] = _name
+
+# Trailing word that confirms a command up front, skipping its yes/no question
+CONFIRM_WORDS = ("yes", "confirm", "y")
+
+MENTION = re.compile(r"^<@!?(\w+)>$")
+
+
+class ArgumentError(ValueError):
+    """A command argument could not be parsed. The message is shown to the user."""
+
+
+def parse_mention(text):
+    """Return the user id from an @mention (or a bare id), or None."""
+    if text is None:
+        return None
+    match = MENTION.match(text)
+    if match is not None:
+        return match.group(1)
+    return text if text.isdigit() else None
+
+def parse_item(token, allowed=None, allow_all=False):
+    """Parse an item and amount, e.g. "🍎x100", "applex20" or "💰xall".
+
+    Keyword Arguments:
+        allowed {iterable} -- Item names that may be used (default: every item). (default: {None})
+        allow_all {bool} -- Accept "all" as the amount. (default: {False})
+
+    Returns:
+        tuple -- (item name, amount), amount is an int or "all".
+    """
+    item, x, amount = token.lower().rpartition("x")
+    name = ITEM_NAMES.get(item)
+    if not x or name is None or (allowed is not None and name not in allowed):
+        raise ArgumentError("`{}` is not a valid item. Use an item and an amount, e.g. \U0001F34Ex10.".format(token))
+
+    if amount == "all" and allow_all:
+        return name, amount
+    if not amount.isdigit() or int(amount) < 1:
+        raise ArgumentError("`{}` does not have a correct amount. Please enter a positive number{}.".format(
+            token, " or all" if allow_all else ""
+        ))
+    return name, int(amount)
+
+def split_confirmation(tokens):
+    """Split a trailing confirmation word off the arguments.
+
+    Returns:
+        tuple -- (remaining tokens, True if the command was confirmed)
+    """
+    tokens = [x for x in tokens if x]
+    if tokens and tokens[-1].lower() in CONFIRM_WORDS:
+        return tokens[:-1], True
+    return tokens, False
+
+def parse_production(drink_type, tokens):
+    """Parse the one-line form of produce.
+
+    e.g. "regular apple all quality", "mixed apple banana 10 yes"
+
+    Arguments:
+        drink_type {str} -- "regular" or "mixed".
+        tokens {list} -- The words after the drink type.
+
+    Returns:
+        tuple -- (fruit names, level (0 regular, 1 quality), amount (int or "all"), confirmed)
+    """
+    tokens, confirmed = split_confirmation(tokens)
+    count = 1 if drink_type == "regular" else 2
+
+    fruits = []
+    amount = None
+    level = 0
+    for token in tokens:
+        word = token.lower()
+        name = ITEM_NAMES.get(word)
+        if name is not None and name != "money" and len(fruits) < count:
+            fruits.append(name)
+        elif word == "all" or word.isdigit():
+            amount = word if word == "all" else int(word)
+        elif word in ("quality", "high"):
+            level = 1
+        elif word in ("regular", "normal"):
+            level = 0
+        else:
+            raise ArgumentError("I don't understand `{}`.".format(token))
+
+    if len(fruits) != count:
+        raise ArgumentError("Please name {} fruit{}, e.g. `{}`.".format(
+            count, "" if count == 1 else "s", "regular apple all" if count == 1 else "mixed apple banana all"
+        ))
+    if count == 2 and fruits[0] == fruits[1]:
+        raise ArgumentError("Mixed drinks need two different fruits.")
+    if amount is None or amount == 0:
+        raise ArgumentError("Please enter how many drinks to make (a positive number or all).")
+
+    return fruits, level, amount, confirmed
@@ -0,0 +1,330 @@
+# Internal Python Moduels
+import os
+import json
+import struct
+import logging
+import argparse
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from .writer import write_files
+
+log = logging.getLogger("root")
+log.debug("codec.py loaded")
+
+class Codec(ABC):
+    """Turns a record (dict) into bytes and back.
+
+    Json uses a codec, when given one, in place of the json module, so the
+    same files can be read and written in another format.
+    """
+
+    name = None
+    extension = None
+
+    @abstractmethod
+    def encode(self, data):
+        """Return the record as bytes."""
+
+    @abstractmethod
+    def decode(self, raw):
+        """Return the record stored in raw bytes."""
+
+
+class JsonCodec(Codec):
+
+    name = "json"
+    extension = ".json"
+
+    def encode(self, data):
+        return json.dumps(data).encode('utf-8')
+
+    def decode(self, raw):
+        return json.loads(raw)
+
+
+# Player codec
+# ---------------------------
+
+# Every binary player file starts with MAGIC followed by a version byte
+MAGIC = b"FTP"
+VERSION = 1
+
+_HEADER = struct.Struct("<3sB")
+_COUNTS = struct.Struct("<HBBBBB") # number flags, farm upgrades, in slots, out slots, in mask, out mask
+
+# Bits 0-11 of the number flags are used by the numbers, the top bit holds notify
+_NOTIFY = 1 << 15
+_U8 = struct.Struct("<B")
+_U32 = struct.Struct("<I")
+
+# Strings are stored together, separated by NUL. None is stored as a lone SOH.
+_SEPARATOR = "\x00"
+_NONE = "\x01"
+
+# Record keys stored in the fixed part, anything else goes into the trailing JSON "extra" blob
+_KNOWN_KEYS = frozenset((
+    "id", "type", "money", "last_harvest", "inventory", "in_trade", "out_trade",
+    "upgrades", "upgrade_levels", "farm_level", "planting_cost", "max_harvest_percent", "notify"
+))
+_FRUITS = ("apple", "banana", "grape")
+
+@lru_cache(maxsize=None)
+def _numbers(flags, count):
+    """Struct for count 8 byte numbers, bit n of flags set means number n is a float."""
+    return struct.Struct("<" + "".join("d" if flags & (1 << n) else "q" for n in range(count)))
+
+def _number_flags(values):
+    flags = 0
+    for n, value in enumerate(values):
+        if not isinstance(value, int) or not -2**63 <= value < 2**63:
+            flags |= 1 << n
+    return flags
+
+def _string(value):
+    return _NONE if value is None else value
+
+def _pair(fruit, amount):
+    return None if fruit is None else [fruit, amount]
+
+
+class PlayerCodec(Codec):
+    """Compact binary player records.
+
+    Layout (version 1):
+        MAGIC, version                      -- 3s B
+        flags, counts, slot masks           -- H B B B B B (flag bit 15 is notify)
+        12 numbers                          -- q (int) or d (float, if its bit in flags is set):
+                                               money, last_harvest, apple, banana, grape, size, multiplier,
+                                               size level, multiplier level, farm_level, planting_cost,
+                                               max_harvest_percent
+        per incoming trade                  -- B flags + 4 numbers: sender_slot, recipient_slot, amounts
+        per outgoing trade                  -- B flags + 2 numbers: request and offer amounts
+        strings                             -- I length + utf-8, NUL separated: id, type, farm upgrades,
+                                               then the names/ids/fruits of each trade
+        extra                               -- I length + JSON of any other record keys
+
+    Empty trade slots are only recorded in the slot masks. decode also reads
+    legacy JSON files, which don't start with MAGIC.
+    """
+
+    name = "binary"
+    extension = ".dat"
+
+    def encode(self, data):
+        inventory = data.get("inventory", {})
+        upgrades = data.get("upgrades", {})
+        levels = data.get("upgrade_levels", {})
+        farm = upgrades.get("farm", [])
+        in_trade = data.get("in_trade", [0] * 4)
+        out_trade = data.get("out_trade", [0] * 4)
+
+        numbers = (
+            data.get("money", 0), data.get("last_harvest", 0),
+            inventory.get("apple", 0), inventory.get("banana", 0), inventory.get("grape", 0),
+            upgrades.get("size", 1000), upgrades.get("multiplier", 1),
+            levels.get("size", 1), levels.get("multiplier", 1),
+            data.get("farm_level", 0), data.get("planting_cost", 0), data.get("max_harvest_percent", 0)
+        )
+        flags = _number_flags(numbers)
+
+        in_mask = sum(1 << n for n, trade in enumerate(in_trade) if trade != 0)
+        out_mask = sum(1 << n for n, trade in enumerate(out_trade) if trade != 0)
+
+        parts = [
+            _HEADER.pack(MAGIC, VERSION),
+            _COUNTS.pack(flags | (_NOTIFY if data.get("notify") else 0), len(farm), len(in_trade), len(out_trade), in_mask, out_mask),
+            _numbers(flags, 12).pack(*numbers)
+        ]
+        strings = [data["id"], _string(data.get("type"))]
+        strings.extend(farm)
+
+        for trade in in_trade:
+            if trade == 0:
+                continue
+            request = trade.get("request") or (None, 0)
+            offer = trade.get("offer") or (None, 0)
+            sender_slot, recipient_slot = trade.get("sender_slot"), trade.get("recipient_slot")
+            values = (-1 if sender_slot is None else sender_slot, -1 if recipient_slot is None else recipient_slot, request[1], offer[1])
+            trade_flags = _number_flags(values)
+            parts.append(_U8.pack(trade_flags))
+            parts.append(_numbers(trade_flags, 4).pack(*values))
+            strings.extend((
+                _string(trade.get("sender")), _string(trade.get("recipient")),
+                _string(trade.get("sender_name")), _string(trade.get("recipient_name")),
+                _string(request[0]), _string(offer[0])
+            ))
+
+        for trade in out_trade:
+            if trade == 0:
+                continue
+            request = trade.get("request") or (None, 0)
+            offer = trade.get("offer") or (None, 0)
+            values = (request[1], offer[1])
+            trade_flags = _number_flags(values)
+            parts.append(_U8.pack(trade_flags))
+            parts.append(_numbers(trade_flags, 2).pack(*values))
+            strings.extend((
+                _string(trade.get("recipient_name")), _string(trade.get("recipient_id")),
+                _string(request[0]), _string(offer[0])
+            ))
+
+        text = _SEPARATOR.join(strings).encode('utf-8')
+        parts.append(_U32.pack(len(text)))
+        parts.append(text)
+
+        # Keys this version doesn't know about, plus unexpected inventory entries
+        extra = {k: v for k, v in data.items() if k not in _KNOWN_KEYS}
+        extra_inventory = {k: v for k, v in inventory.items() if k not in _FRUITS}
+        if extra_inventory:
+            extra["+inventory"] = extra_inventory
+        extra = json.dumps(extra).encode('utf-8') if extra else b""
+        parts.append(_U32.pack(len(extra)))
+        parts.append(extra)
+
+        return b"".join(parts)
+
+    def decode(self, raw):
+        if not raw.startswith(MAGIC):
+            # Legacy JSON player file
+            return json.loads(raw)
+
+        magic, version = _HEADER.unpack_from(raw, 0)
+        if version != VERSION:
+            raise ValueError("Unsupported player record version {}".format(version))
+
+        pos = _HEADER.size
+        flags, farm_count, in_count, out_count, in_mask, out_mask = _COUNTS.unpack_from(raw, pos)
+        pos += _COUNTS.size
+
+        (money, last_harvest, apple, banana, grape, size, multiplier,
+            size_level, multiplier_level, farm_level, planting_cost, max_harvest_percent) = _numbers(flags & ~_NOTIFY, 12).unpack_from(raw, pos)
+        pos += 96
+
+        in_numbers = []
+        for n in range(in_count):
+            if in_mask & (1 << n):
+                in_numbers.append(_numbers(raw[pos], 4).unpack_from(raw, pos + 1))
+                pos += 33
+        out_numbers = []
+        for n in range(out_count):
+            if out_mask & (1 << n):
+                out_numbers.append(_numbers(raw[pos], 2).unpack_from(raw, pos + 1))
+                pos += 17
+
+        length = _U32.unpack_from(raw, pos)[0]
+        pos += 4
+        strings = [None if x == _NONE else x for x in raw[pos:pos + length].decode('utf-8').split(_SEPARATOR)]
+        pos += length
+
+        in_trade = [0] * in_count
+        i = 2 + farm_count
+        for n, (sender_slot, recipient_slot, request, offer) in zip((n for n in range(in_count) if in_mask & (1 << n)), in_numbers):
+            in_trade[n] = {
+                "sender": strings[i],
+                "recipient": strings[i+1],
+                "sender_name": strings[i+2],
+                "recipient_name": strings[i+3],
+                "sender_slot": None if sender_slot == -1 else sender_slot,
+                "recipient_slot": None if recipient_slot == -1 else recipient_slot,
+                "request": _pair(strings[i+4], request),
+                "offer": _pair(strings[i+5], offer)
+            }
+            i += 6
+
+        out_trade = [0] * out_count
+        for n, (request, offer) in zip((n for n in range(out_count) if out_mask & (1 << n)), out_numbers):
+            out_trade[n] = {
+                "recipient_name": strings[i],
+                "recipient_id": strings[i+1],
+                "request": _pair(strings[i+2], request),
+                "offer": _pair(strings[i+3], offer)
+            }
+            i += 4
+
+        record = {
+            "id": strings[0],
+            "type": strings[1],
+            "money": money,
+            "last_harvest": last_harvest,
+            "inventory": {"apple": apple, "banana": banana, "grape": grape},
+            "in_trade": in_trade,
+            "out_trade": out_trade,
+            "upgrades": {"size": size, "multiplier": multiplier, "farm": strings[2:2 + farm_count]},
+            "upgrade_levels": {"size": size_level, "multiplier": multiplier_level},
+            "farm_level": farm_level,
+            "planting_cost": planting_cost,
+            "max_harvest_percent": max_harvest_percent,
+            "notify": bool(flags & _NOTIFY)
+        }
+
+        length = _U32.unpack_from(raw, pos)[0]
+        if length:
+            extra = json.loads(raw[pos + 4:pos + 4 + length])
+            record["inventory"].update(extra.pop("+inventory", {}))
+            record.update(extra)
+
+        return record
+
+
+CODECS = {
+    JsonCodec.name: JsonCodec(),
+    PlayerCodec.name: PlayerCodec()
+}
+
+def convert(directory, target):
+    """Rewrite every player file in directory with the target codec.
+
+    Files are written in batches, and each original is removed once its
+    replacement is on disk. Originals that already have a file in the target
+    format are stale (the player was saved since) and are only removed.
+
+    Arguments:
+        directory {str} -- A player_data directory.
+        target {str} -- The codec name to convert to.
+
+    Returns:
+        int -- The amount of files converted.
+    """
+    codec = CODECS[target]
+    sources = []
+    for entry in os.scandir(directory):
+        base, ext = os.path.splitext(entry.path)
+        if ext == codec.extension or not any(ext == c.extension for c in CODECS.values()):
+            continue
+        if os.path.exists(base + codec.extension):
+            # Already saved in the target format since, this copy is stale
+            os.remove(entry.path)
+            continue
+        sources.append(entry.path)
+
+    converted = 0
+    for start in range(0, len(sources), 500):
+        batch = sources[start:start + 500]
+        items = []
+        for path in batch:
+            with open(path, 'rb') as f:
+                # PlayerCodec reads both formats
+                record = CODECS[PlayerCodec.name].decode(f.read())
+            items.append((os.path.splitext(path)[0] + codec.extension, codec.encode(record)))
+
+        for path, succeeded in zip(batch, write_files(items)):
+            if succeeded:
+                os.remove(path)
+                converted += 1
+            else:
+                log.error("Codec: could not convert {}".format(path))
+    return converted
+
+
+if __name__ == "__main__":
+    # python -m fruitTycoon.codec binary
+    data_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/"
+
+    parser = argparse.ArgumentParser(description="Convert every player file to another record format.")
+    parser.add_argument("target", choices=CODECS.keys())
+    parser.add_argument("--path", default=None, help="Data directory to convert (holds player_data).")
+    args = parser.parse_args()
+
+    directory = os.path.join(args.path or data_path, "player_data")
+    print("Converted {} player files to {}.".format(convert(directory, args.target), args.target))
@@ -1 +1,4 @@
-VERSION = "1.0.0"
\ No newline at end of file
+VERSION = "1.0.0"
+
+# Seconds between harvests
+HARVEST_COOLDOWN = 7200
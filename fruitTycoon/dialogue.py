@@ -0,0 +1,153 @@
+# Internal Python Moduels
+import asyncio
+import logging
+import itertools
+from collections import OrderedDict, namedtuple
+
+log = logging.getLogger("root")
+log.debug("dialogue.py loaded")
+
+# Same shape as the result of discord.Client.wait_for_reaction
+ReactionResult = namedtuple("ReactionResult", ["reaction", "user"])
+
+
+class Session:
+
+    __slots__ = ("future", "check", "emoji", "started")
+
+    # Orders sessions across both routing tables
+    counter = itertools.count()
+
+    def __init__(self, future, check=None, emoji=None):
+        self.future = future
+        self.check = check
+        self.emoji = emoji
+        self.started = next(Session.counter)
+
+
+class DialogueRouter:
+
+    def __init__(self, timeout=120, max_sessions=1000):
+        """Routes incoming messages and reactions to the dialogue waiting for them.
+
+        A dialogue waiting for a message is keyed by (user id, channel id),
+        one waiting for a reaction by (user id, message id), so each event is
+        matched with a dict lookup instead of running every pending check.
+        Every wait times out, and once max_sessions are waiting the oldest is
+        dropped. A dropped or timed out wait returns None.
+
+        Keyword Arguments:
+            timeout {int} -- Seconds a dialogue waits when no timeout is given. (default: {120})
+            max_sessions {int} -- Most dialogues waiting at once. (default: {1000})
+        """
+        self.timeout = timeout
+        self.max_sessions = max_sessions
+
+        self.messages = OrderedDict() # (user_id, channel_id) -> Session
+        self.reactions = OrderedDict() # (user_id, message_id) -> Session
+
+        # Counters
+        self.dispatched = 0
+        self.timeouts = 0
+        self.evicted = 0
+
+    def __len__(self):
+        return len(self.messages) + len(self.reactions)
+
+    # Waiting
+    # ---------------------------
+
+    async def wait_for_message(self, timeout=None, *, author, channel, check=None):
+        """Wait for author's next message in channel that passes check.
+
+        Returns:
+            discord.Message -- The message, or None if the dialogue timed out or was dropped.
+        """
+        return await self._wait(self.messages, (author.id, channel.id), Session(self._future(), check), timeout)
+
+    async def wait_for_reaction(self, emoji=None, *, user, message, timeout=None, check=None):
+        """Wait for user to react to message with one of emoji (any emoji if None).
+
+        Returns:
+            ReactionResult -- (reaction, user), or None if the dialogue timed out or was dropped.
+        """
+        if isinstance(emoji, str):
+            emoji = [emoji]
+        session = Session(self._future(), check, None if emoji is None else frozenset(emoji))
+        return await self._wait(self.reactions, (user.id, message.id), session, timeout)
+
+    def _future(self):
+        return asyncio.get_event_loop().create_future()
+
+    async def _wait(self, sessions, key, session, timeout):
+        # A newer dialogue for the same key replaces the old one
+        previous = sessions.pop(key, None)
+        if previous is not None and not previous.future.done():
+            previous.future.set_result(None)
+
+        while len(self) >= self.max_sessions:
+            self._evict_oldest()
+        sessions[key] = session
+
+        try:
+            return await asyncio.wait_for(session.future, timeout or self.timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            return None
+        finally:
+            if sessions.get(key) is session:
+                del sessions[key]
+
+    def _evict_oldest(self):
+        # Both tables are in insertion order, so the oldest session is first in one of them
+        heads = [sessions for sessions in (self.messages, self.reactions) if sessions]
+        sessions = min(heads, key=lambda x: next(iter(x.values())).started)
+        key, session = sessions.popitem(last=False)
+        if not session.future.done():
+            session.future.set_result(None)
+        self.evicted += 1
+
+    # Dispatch
+    # ---------------------------
+
+    def dispatch_message(self, message):
+        """Hand a message to the dialogue waiting for it.
+
+        Returns:
+            bool -- True if a dialogue took the message.
+        """
+        session = self.messages.get((message.author.id, message.channel.id))
+        if session is None or session.future.done():
+            return False
+        if session.check is not None and not session.check(message):
+            return False
+
+        session.future.set_result(message)
+        self.dispatched += 1
+        return True
+
+    def dispatch_reaction(self, reaction, user):
+        """Hand a reaction to the dialogue waiting for it.
+
+        Returns:
+            bool -- True if a dialogue took the reaction.
+        """
+        session = self.reactions.get((user.id, reaction.message.id))
+        if session is None or session.future.done():
+            return False
+        if session.emoji is not None and reaction.emoji not in session.emoji:
+            return False
+        if session.check is not None and not session.check(reaction, user):
+            return False
+
+        session.future.set_result(ReactionResult(reaction, user))
+        self.dispatched += 1
+        return True
+
+    def stats(self):
+        return {
+            "waiting": len(self),
+            "dispatched": self.dispatched,
+            "timeouts": self.timeouts,
+            "evicted": self.evicted
+        }
@@ -12,9 +12,13 @@ from discord.ext import commands
 
 # Other project files
 from .player import Player
+from .memberDirectory import MemberDirectory
+from .economy import format_report
+from .dialogue import DialogueRouter
+from .outbox import Outbox
 
 # Misc
-from .constants import VERSION
+from .constants import VERSION, HARVEST_COOLDOWN
 from .json import Json
 
 log = logging.getLogger("root")
@@ -39,6 +43,32 @@ class DiscordClient(commands.Bot):
 
         self.game = game
         self.loop = None
+        self.loops_started = False
+
+        # id -> discord.Member lookups
+        self.member_directory = MemberDirectory()
+
+        # Pending wait_for_message/wait_for_reaction dialogues
+        dialogue_config = config.get("dialogue", {})
+        self.dialogues = DialogueRouter(
+            timeout=dialogue_config.get("timeout", 120),
+            max_sessions=dialogue_config.get("max_sessions", 1000)
+        )
+
+        # Outgoing messages, rate limited per destination
+        outbox_config = config.get("outbox", {})
+        self.outbox = Outbox(
+            self._deliver_message, self._deliver_typing,
+            rate=outbox_config.get("rate", 5),
+            per=outbox_config.get("per", 5),
+            global_rate=outbox_config.get("global_rate", 50),
+            metrics=game.metrics if game is not None else None
+        )
+        if game is not None:
+            game.metrics.gauge("outbox_queue_depth", lambda: len(self.outbox))
+
+        # Commands are only read from these text channels (and DMs), none means every channel
+        self.bound_channels = frozenset(str(x) for x in config["chat"].get("bind_to_channels", []))
 
         # Instantiate Embeds
         self.help_embed = None
@@ -49,19 +79,57 @@ class DiscordClient(commands.Bot):
         self.create_user_commands()
         self.create_admin_commands()
         self.help_embed = self.create_help_embed()
+        self.instrument_commands()
 
         @self.event
         async def on_ready():
             await self.setup_bot()
 
-        # @self.event
-        # async def on_message(message):
-        #     await self.process_commands(message)
+        # Keep the member directory up to date
+        @self.event
+        async def on_member_join(member):
+            self.member_directory.add(member)
+
+        @self.event
+        async def on_member_update(before, after):
+            self.member_directory.add(after)
+
+        @self.event
+        async def on_member_remove(member):
+            self.member_directory.remove(member)
+
+        @self.event
+        async def on_server_join(server):
+            self.member_directory.add_server(server)
+
+        @self.event
+        async def on_server_remove(server):
+            self.member_directory.remove_server(server)
+
+        @self.event
+        async def on_message(message):
+            # Answers to a dialogue are not commands
+            if self.dialogues.dispatch_message(message):
+                return
+
+            # Drop everything that can't be a command before discord.py parses it
+            reason = self._drop_reason(message)
+            if reason is not None:
+                self.game.metrics.inc("messages_dropped_total", reason=reason)
+                return
+            await self.process_commands(message)
+
+        @self.event
+        async def on_reaction_add(reaction, user):
+            self.dialogues.dispatch_reaction(reaction, user)
 
     async def setup_bot(self):
         """Once bot is ready, do other stuff."""
         
         log.info("Connected Successfully. FruitTycoon v{}".format(VERSION))
+
+        self.member_directory.rebuild(self.get_all_members())
+        log.debug("Member directory: {} members".format(len(self.member_directory)))
         
         app_info = await self.application_info()
         log.info('\nBot id: {}\nBot name: {}'.format(app_info.id, app_info.name))
@@ -70,14 +138,41 @@ class DiscordClient(commands.Bot):
         for x in self.servers:
             log.info(" - {}/{}\n".format(x.id, x.name))
 
-        log.info("Bound text channels:\n - None")
+        if self.bound_channels:
+            channels = (self.get_channel(x) for x in sorted(self.bound_channels))
+            log.info("Bound text channels:\n" + "\n".join(
+                " - {}/{}".format(x.id, x.name) for x in channels if x is not None
+            ))
+        else:
+            log.info("Bound text channels:\n - None")
         log.info("\nOptions:\n  Command prefix: {}\n".format(self.command_prefix))
         
         await self.change_presence(game=discord.Game(name="{}help".format(self.command_prefix)))  
 
+        # on_ready fires again after a reconnect, only start the loops once
+        if self.loops_started:
+            return
+        self.loops_started = True
+
         # Start leaderboard loop
         asyncio.ensure_future(self.game.leaderboard_day_loop(), loop=self.loop)      
 
+        # Start player cache write-back loop
+        asyncio.ensure_future(self.game.cache_flush_loop(), loop=self.loop)
+
+        # Start production scheduler
+        asyncio.ensure_future(self.game.production.run(), loop=self.loop)
+
+        # Start harvest reminders
+        asyncio.ensure_future(self.game.notifier.run(), loop=self.loop)
+
+        # Start game_data.json/config.json watcher
+        asyncio.ensure_future(self.game.reload_loop(), loop=self.loop)
+
+        # Start metrics file writer
+        if self.game.metrics_path:
+            asyncio.ensure_future(self.game.metrics.write_loop(self.game.metrics_path, self.game.metrics_interval), loop=self.loop)
+
     # Helper Functions
     # ---------------------------
  
@@ -85,6 +180,64 @@ class DiscordClient(commands.Bot):
         for x in reactions:
             await self.add_reaction(message, x)
 
+    # Instrumentation
+    # ---------------------------
+
+    def instrument_commands(self):
+        """Wrap every command and admin subcommand callback to record latency and errors."""
+        wrapped = set()
+        for name, command in list(self.commands.items()):
+            # Aliases map to the same Command, only wrap it once
+            if id(command) in wrapped:
+                continue
+            wrapped.add(id(command))
+            command.callback = self.game.metrics.instrument(name, command.callback)
+
+            if name == "admin":
+                for sub_name, sub_command in command.commands.items():
+                    if id(sub_command) in wrapped:
+                        continue
+                    wrapped.add(id(sub_command))
+                    sub_command.callback = self.game.metrics.instrument("admin " + sub_name, sub_command.callback)
+
+    async def add_reaction(self, *args, **kwargs):
+        self.game.metrics.inc("discord_calls_total", method="add_reaction")
+        return await super(DiscordClient, self).add_reaction(*args, **kwargs)
+
+    # Outgoing messages
+    # ---------------------------
+
+    async def send_message(self, destination, content=None, **kwargs):
+        """Queued through the Outbox. Returns the sent discord.Message."""
+        return await self.outbox.send(destination, content, **kwargs)
+
+    def post(self, destination, content=None, **kwargs):
+        """Queue a message without waiting for it to be sent. Use when the message isn't needed."""
+        self.outbox.post(destination, content, **kwargs)
+
+    async def send_typing(self, destination):
+        """Queued through the Outbox, and dropped if a message follows right away."""
+        self.outbox.typing(destination)
+
+    async def _deliver_message(self, destination, content=None, **kwargs):
+        self.game.metrics.inc("discord_calls_total", method="send_message")
+        return await super(DiscordClient, self).send_message(destination, content, **kwargs)
+
+    async def _deliver_typing(self, destination):
+        self.game.metrics.inc("discord_calls_total", method="send_typing")
+        return await super(DiscordClient, self).send_typing(destination)
+
+    # Dialogues
+    # ---------------------------
+
+    async def wait_for_message(self, timeout=None, *, author, channel, check=None):
+        """Routed through the DialogueRouter. Returns None if the dialogue timed out."""
+        return await self.dialogues.wait_for_message(timeout, author=author, channel=channel, check=check)
+
+    async def wait_for_reaction(self, emoji=None, *, user, message, timeout=None, check=None):
+        """Routed through the DialogueRouter. Returns None if the dialogue timed out."""
+        return await self.dialogues.wait_for_reaction(emoji, user=user, message=message, timeout=timeout, check=check)
+
     # Commands
     # ---------------------------
 
@@ -94,10 +247,10 @@ class DiscordClient(commands.Bot):
         @self.command(pass_context=True, description="Open this panel.", help="none")
         async def help(ctx):
             await self.send_typing(ctx.message.channel)
-            await self.send_message(ctx.message.author, embed=self.help_embed)
+            self.post(ctx.message.author, embed=self.help_embed)
             
             if not ctx.message.channel.is_private:
-                await self.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(ctx.message.author.id))
+                self.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(ctx.message.author.id))
 
         @self.command(pass_context=True, description="Join the game.", help="[type] (optional)")
         async def join(ctx, fruit_type=None):
@@ -108,31 +261,37 @@ class DiscordClient(commands.Bot):
         async def harvest(ctx):
             """Harvest fruit"""
             await self.game.harvest(ctx)
+
+        @self.command(pass_context=True, description="Get a DM when your fruit is ready to harvest.", help="[on/off] (optional)")
+        async def notify(ctx, setting=None):
+            await self.game.set_notify(ctx, setting)
             
-        @self.command(pass_context=True, description="Turn fruit into drinks.", help="[type] (regular/mixed)")
-        async def produce(ctx, drink_type=None):
+        @self.command(pass_context=True, description="Turn fruit into drinks.", help="[type] (regular/mixed) [fruit(s) amount/all quality yes] (optional)")
+        async def produce(ctx, drink_type=None, *options):
             """
             Arguments:
                 drink_type {str} -- Either "regular" or "mixed".
+                options {str} -- Optional fruit(s), amount, "quality" and "yes", to skip the dialogue.
             """
 
-            await self.game.produce(ctx, drink_type)
+            await self.game.produce(ctx, drink_type, *options)
 
-        @self.command(pass_context=True, description="Sell fruit directly.", help="[type]")
-        async def sell(ctx, type_amount=None):
-            await self.game.sell(ctx, type_amount)
+        @self.command(pass_context=True, description="Sell fruit directly.", help="[type x amount/all]... [yes] (optional)")
+        async def sell(ctx, *type_amounts):
+            await self.game.sell(ctx, *type_amounts)
 
-        @self.command(pass_context=True, description="Send a trade request.", help="[@user]")
-        async def trade(ctx, recipient_id=None, request=None, offer=None):
+        @self.command(pass_context=True, description="Send a trade request.", help="[@user] [request] [offer] [yes] (optional)")
+        async def trade(ctx, recipient_id=None, request=None, offer=None, confirm=None):
             """Manage trading between players
             
             Arguments:
                 ctx {context} -- Contains message context.
                 recipient {Member} -- @Mention of the player.
-                request {string} -- [description]
-                offer {string} -- [description]
+                request {string} -- What is requested, e.g. 🍎x100 (optional, asked for if missing)
+                offer {string} -- What is offered, e.g. 💰x50 (optional, asked for if missing)
+                confirm {string} -- "yes" to send without asking for confirmation.
             """
-            await self.game.send_trade(ctx, recipient_id, request, offer)
+            await self.game.send_trade(ctx, recipient_id, request, offer, confirm)
 
         @self.command(pass_context=True, description="Accept a trade request.", help="[slot]")
         async def accept(ctx, trade_slot=None):
@@ -146,9 +305,9 @@ class DiscordClient(commands.Bot):
         async def profile(ctx):
             await self.game.get_profile(ctx)            
 
-        @self.command(pass_context=True, description="Upgrade a stat.", help="[stat]")
-        async def upgrade(ctx, stat=None):
-            await self.game.upgrade(ctx, stat)
+        @self.command(pass_context=True, description="Upgrade a stat.", help="[stat] [amount/max] (optional)")
+        async def upgrade(ctx, stat=None, amount=None):
+            await self.game.upgrade(ctx, stat, amount)
 
         @self.command(pass_context=True, description="Open the shop.", help="none")
         async def shop(ctx):
@@ -164,13 +323,13 @@ class DiscordClient(commands.Bot):
         @self.group(pass_context=True, description="admin", help="[admin]")
         async def admin(ctx):
             if ctx.invoked_subcommand is None:
-                await self.send_message(ctx.message.channel, "Please enter a valid subcommand.")
+                self.post(ctx.message.channel, "Please enter a valid subcommand.")
 
         @admin.command(pass_context=True, description="help", help="[help]")
         async def help(ctx, description="help", help="[help]"):            
             await self.send_typing(ctx.message.channel)
-            await self.send_message(ctx.message.author, embed=self.admin_embed)
-            await self.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(ctx.message.author.id))
+            self.post(ctx.message.author, embed=self.admin_embed)
+            self.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(ctx.message.author.id))
 
         @admin.command(pass_context=True, description="remove_player", help="[remove_player]")
         async def remove_player(ctx, player_id=None):
@@ -181,21 +340,21 @@ class DiscordClient(commands.Bot):
 
             # Ensure there is a player
             if await self.game.get_player(player_id) is None:
-                await self.send_message(ctx.message.author, content="Player does not exist.")
+                self.post(ctx.message.author, content="Player does not exist.")
                 return
             
             # Remove user from PlayerIndex
             await self.game.remove_player(player_id)
-            await self.send_message(ctx.message.channel, "Removed {} from list.".format(player_id))
+            self.post(ctx.message.channel, "Removed {} from list.".format(player_id))
 
         @admin.command(pass_context=True, description="print_list", help="[print_list]")
         async def print_list(ctx):
-            await self.send_message(ctx.message.channel, content=str(self.game.players.list))
+            self.post(ctx.message.channel, content=str(self.game.players.list))
 
         @admin.command(pass_context=True, description="load_player", help="[load_player]")
         async def load_player(ctx, pid):
             player = await self.game.get_player(pid)
-            print(player.__dict__)
+            print(player.to_record())
         
         @admin.command(pass_context=True, description="load_player", help="[load_player]")
         async def make_harvestable(ctx, player_id=None):
@@ -204,14 +363,15 @@ class DiscordClient(commands.Bot):
             
             # Ensure there is a player
             if await self.game.get_player(player_id) is None:
-                await self.send_message(ctx.message.author, content="Player does not exist.")
+                self.post(ctx.message.author, content="Player does not exist.")
                 return
             
             # Change last harvest time
-            player = await self.game.get_player(player_id)
-            player.last_harvest -= 7200
-            player.save()
-            await self.send_message(ctx.message.channel, "Made {} harvestable.".format(player_id))
+            async with self.game.locks.hold(player_id):
+                player = await self.game.get_player(player_id)
+                player.last_harvest -= HARVEST_COOLDOWN
+                self.game.save_player(player, "admin make_harvestable")
+            self.post(ctx.message.channel, "Made {} harvestable.".format(player_id))
         
         @admin.command(pass_context=True, description="load_player", help="[load_player]")
         async def add_money(ctx, player_id=None, amount=None):
@@ -222,19 +382,96 @@ class DiscordClient(commands.Bot):
             
             # Ensure there is a player
             if await self.game.get_player(player_id) is None:
-                await self.send_message(ctx.message.author, content="Player does not exist.")
+                self.post(ctx.message.author, content="Player does not exist.")
                 return
             
             # Change last harvest time
-            player = await self.game.get_player(player_id)
-            player.money += int(amount)
-            player.save()
-            await self.send_message(ctx.message.channel, "Added {} money to {}".format(amount, player_id))
+            async with self.game.locks.hold(player_id):
+                player = await self.game.get_player(player_id)
+                player.money += int(amount)
+                self.game.save_player(player, "admin add_money")
+            self.post(ctx.message.channel, "Added {} money to {}".format(amount, player_id))
         
         @admin.command(pass_context=True, description="load_player", help="[load_player]")
         async def top_leaderboard(ctx):
             await self.game.get_leaderboard(daily=True)
 
+        @admin.command(pass_context=True, description="cache", help="[cache]")
+        async def cache(ctx):
+            stats = self.game.cache.stats()
+            self.post(ctx.message.channel, "Player cache:\n" + "\n".join(
+                "{}: {}".format(k, v) for k, v in stats.items()
+            ))
+
+        @admin.command(pass_context=True, description="stats", help="[stats]")
+        async def stats(ctx):
+            metrics = self.game.metrics
+            lines = ["{:<20}{:>8}{:>10}{:>10}{:>8}".format("command", "count", "p50", "p99", "errors")]
+            for command, count, p50, p99, errors in metrics.command_summary():
+                lines.append("{:<20}{:>8}{:>9.0f}ms{:>9.0f}ms{:>8}".format(command, count, p50 * 1000, p99 * 1000, errors))
+
+            lines.append("")
+            for method in ("send_message", "send_typing", "add_reaction"):
+                lines.append("{:<20}{:>8}".format(method, metrics.get("discord_calls_total", method=method)))
+            lines.append("{:<20}{:>8}".format("player loads", metrics.get("player_loads_total")))
+            lines.append("{:<20}{:>8}".format("player saves", metrics.get("player_saves_total")))
+            for key, value in self.dialogues.stats().items():
+                lines.append("{:<20}{:>8}".format("dialogues " + key, value))
+            for key, value in self.outbox.stats().items():
+                lines.append("{:<20}{:>8}".format("outbox " + key, value))
+            for key, value in self.game.notifier.stats().items():
+                lines.append("{:<20}{:>8}".format("reminders " + key, value))
+            for key, value in self.game.events.stats().items():
+                lines.append("{:<20}{:>8}".format("event log " + key, value))
+            for key, value in self.game.locks.stats().items():
+                lines.append("{:<20}{:>8}".format("locks " + key, value))
+            for reason in ("prefix", "channel"):
+                lines.append("{:<20}{:>8}".format("dropped (" + reason + ")", metrics.get("messages_dropped_total", reason=reason)))
+
+            self.post(ctx.message.channel, "```\n{}\n```".format("\n".join(lines)[:1980]))
+
+        @admin.command(pass_context=True, description="economy", help="[economy]")
+        async def economy(ctx):
+            report = format_report(self.game.get_economy())
+            self.post(ctx.message.channel, "```\n{}\n```".format(report[:1980]))
+
+        @admin.command(pass_context=True, description="history", help="[player_id] [count] (optional)")
+        async def history(ctx, player_id=None, count="10"):
+            if player_id is None:
+                player_id = ctx.message.author.id
+            if not count.isdigit():
+                self.post(ctx.message.channel, "Please enter a correct number.")
+                return
+
+            events = await self.game.get_history(player_id, int(count))
+            if not events:
+                self.post(ctx.message.channel, "No logged events for {}.".format(player_id))
+                return
+
+            lines = []
+            for event in events:
+                changes = ["{} {}->{}".format(field, before, after) for field, before, after in event.changes]
+                if event.trades is not None:
+                    changes.append("trade slots")
+                lines.append("#{} {} {}: {}".format(
+                    event.seq, datetime.utcfromtimestamp(event.time).strftime("%Y-%m-%d %H:%M"), event.action, ", ".join(changes)
+                ))
+            # Keep the newest events if it doesn't fit in one message
+            text = "\n".join(lines)[-1980:]
+            self.post(ctx.message.channel, "```\n{}\n```".format(text))
+
+        @admin.command(pass_context=True, description="rollback", help="[player_id] [event #]")
+        async def rollback(ctx, player_id=None, seq=None):
+            if player_id is None or seq is None or not seq.lstrip("#").isdigit():
+                self.post(ctx.message.channel, "Please enter a player id and an event number (see admin history).")
+                return
+
+            undone = await self.game.rollback_player(player_id, int(seq.lstrip("#")))
+            if undone is None:
+                self.post(ctx.message.author, content="Player does not exist.")
+                return
+            self.post(ctx.message.channel, "Rolled {} back to before event #{} ({} event(s) undone).".format(player_id, seq.lstrip("#"), undone))
+
         @admin.command(pass_context=True, description="reset", help="[reset]")
         async def reset(ctx):
             pass
@@ -243,17 +480,25 @@ class DiscordClient(commands.Bot):
         async def ping(ctx):
             time_difference = datetime.utcnow() - ctx.message.timestamp
             log.info("Pong. Delay: {}s".format(time_difference.total_seconds()))
-            await self.send_message(ctx.message.channel, "Pong. Delay: {}s".format(time_difference.total_seconds()))
+            self.post(ctx.message.channel, "Pong. Delay: {}s".format(time_difference.total_seconds()))
 
         @admin.command(pass_context=True, description="reboot", help="[reboot]")
         async def reboot(ctx):
+            self.game.shutdown()
+            await self.outbox.drain()
             await self.logout()
             os.system('cls')
             os.execv(sys.executable, ['python'] + sys.argv)
 
+        @admin.command(pass_context=True, description="reload", help="[reload]")
+        async def reload(ctx):
+            self.post(ctx.message.channel, await self.game.reload())
+
         @admin.command(pass_context=True, description="exit", help="[exit]")
         async def exit(ctx):
-            await self.send_message(ctx.message.channel, "Powering down")
+            self.post(ctx.message.channel, "Powering down")
+            self.game.shutdown()
+            await self.outbox.drain()
             await self.logout()
             log.info("Logged out")
             self.loop.stop()
@@ -319,6 +564,33 @@ class DiscordClient(commands.Bot):
 
     # Misc
     # ---------------------------        
+    def apply_config(self, config):
+        """Use the settings of a reloaded config that can change while the bot runs."""
+        self.bound_channels = frozenset(str(x) for x in config["chat"].get("bind_to_channels", []))
+        self.dialogues.timeout = config.get("dialogue", {}).get("timeout", 120)
+
+        outbox_config = config.get("outbox", {})
+        self.outbox.set_rates(
+            outbox_config.get("rate", 5),
+            outbox_config.get("per", 5),
+            outbox_config.get("global_rate", 50)
+        )
+
+        prefix = config["chat"]["prefix"]
+        if prefix != self.command_prefix:
+            self.command_prefix = prefix
+            self.help_embed = self.create_help_embed()
+            if self.is_logged_in:
+                asyncio.ensure_future(self.change_presence(game=discord.Game(name="{}help".format(prefix))), loop=self.loop)
+
+    def _drop_reason(self, message):
+        """Return why a message can't be a command for the bot ("prefix" or "channel"), or None."""
+        if not message.content.startswith(self.command_prefix):
+            return "prefix"
+        if self.bound_channels and not message.channel.is_private and message.channel.id not in self.bound_channels:
+            return "channel"
+        return None
+
     def start_bot(self, token):
         self.loop = asyncio.get_event_loop()
 
@@ -333,6 +605,7 @@ class DiscordClient(commands.Bot):
                 except Exception as e:
                     log.critical(e)
         except KeyboardInterrupt:
+            self.game.shutdown()
             log.info("Logging out")
             self.loop.run_until_complete(self.logout())
             log.info("Logged out")
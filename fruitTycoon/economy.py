@@ -0,0 +1,134 @@
+# Internal Python Moduels
+import os
+import sys
+import json
+import math
+import logging
+import argparse
+import operator
+from collections import Counter
+
+from .playerTable import PlayerTable
+
+log = logging.getLogger("root")
+log.debug("economy.py loaded")
+
+PERCENTILES = (10, 25, 50, 75, 90, 99)
+
+HISTOGRAM_COLUMNS = ("size_level", "multiplier_level", "farm_level")
+
+
+def farm_upgrade_prices(game_data):
+    """Return the price of the next farm upgrade for each farm level (inf once maxed)."""
+    juice_upgrades = game_data["juice_upgrades"]
+    id_to_name = juice_upgrades["id_to_name"]
+    return [
+        juice_upgrades[id_to_name[str(level + 1)]]["unlock_price"] if str(level + 1) in id_to_name else math.inf
+        for level in range(len(id_to_name) + 1)
+    ]
+
+def gini(values, total):
+    """Gini coefficient of values, which must be sorted in ascending order."""
+    n = len(values)
+    if n == 0 or total <= 0:
+        return 0.0
+    weighted = sum(map(operator.mul, range(1, n + 1), values))
+    return (2 * weighted) / (n * total) - (n + 1) / n
+
+def summarize(table, game_data):
+    """Compute economy statistics from a PlayerTable.
+
+    Every figure comes from whole-column scans (sum/sorted/map/Counter over the
+    typed arrays), no Player objects are touched.
+
+    Arguments:
+        table {PlayerTable} -- The players to summarize.
+        game_data {dict} -- game_data.json, for fruit names and upgrade prices.
+
+    Returns:
+        dict -- JSON serializable report.
+    """
+    columns = table.columns
+    money = sorted(columns["money"])
+    count = len(money)
+    total = math.fsum(money)
+
+    # Players that can pay for their next farm upgrade
+    prices = farm_upgrade_prices(game_data)
+    farm_prices = map(prices.__getitem__, columns["farm_level"])
+    can_afford = sum(map(operator.ge, columns["money"], farm_prices))
+
+    return {
+        "players": count,
+        "money": {
+            "total": total,
+            "mean": total / count if count else 0,
+            "min": money[0] if count else 0,
+            "max": money[-1] if count else 0,
+            "percentiles": {
+                "p{}".format(p): money[min(count - 1, (count * p) // 100)] if count else 0 for p in PERCENTILES
+            },
+            "gini": round(gini(money, total), 4)
+        },
+        "inventory": {fruit: table.total(fruit) for fruit in game_data["fruits"]},
+        "levels": {
+            name: dict(sorted(Counter(columns[name]).items())) for name in HISTOGRAM_COLUMNS
+        },
+        "can_afford_farm_upgrade": can_afford
+    }
+
+def format_report(report):
+    """Render a report from summarize as plain text."""
+    money = report["money"]
+    lines = [
+        "Players: {}".format(report["players"]),
+        "Money in circulation: {:,.0f} (mean {:,.0f}, min {:,.0f}, max {:,.0f})".format(
+            money["total"], money["mean"], money["min"], money["max"]),
+        "Percentiles: " + ", ".join("{} {:,.0f}".format(k, v) for k, v in money["percentiles"].items()),
+        "Gini coefficient: {}".format(money["gini"]),
+        "Inventory: " + ", ".join("{} {:,}".format(k, v) for k, v in report["inventory"].items()),
+        "Can afford next farm upgrade: {}".format(report["can_afford_farm_upgrade"])
+    ]
+    for name, histogram in report["levels"].items():
+        lines.append("{}: ".format(name) + ", ".join("L{} x{}".format(k, v) for k, v in histogram.items()))
+    return "\n".join(lines)
+
+def load_table(storage, only_indexed=True):
+    """Stream every stored player into a PlayerTable, one record at a time.
+
+    Only the numeric columns are kept, so memory grows with the number of
+    players rather than with the size of their records.
+    """
+    indexed = set(storage.load_index()) if only_indexed else None
+    table = PlayerTable()
+    for player_id, record in storage.iter_players():
+        if indexed is None or player_id in indexed:
+            table.set(player_id, PlayerTable.record_values(record))
+    return table
+
+
+if __name__ == "__main__":
+    # python -m fruitTycoon.economy [--backend json] [--path data]
+    from .storage import BACKENDS, create_storage
+
+    data_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/game_data.json"
+
+    parser = argparse.ArgumentParser(description="Print economy statistics over every stored player.")
+    parser.add_argument("--backend", choices=BACKENDS.keys(), default="json")
+    parser.add_argument("--path", default=None, help="Data directory or database file to read from.")
+    parser.add_argument("--all", action="store_true", help="Include player files that are not in the index.")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON.")
+    args = parser.parse_args()
+
+    with open(data_path, encoding='utf-8') as f:
+        game_data = json.load(f)
+
+    storage = create_storage(args.backend, args.path)
+    report = summarize(load_table(storage, only_indexed=not args.all), game_data)
+    storage.close()
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print(format_report(report))
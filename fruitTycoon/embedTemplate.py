@@ -0,0 +1,84 @@
+# Internal Python Moduels
+import logging
+
+log = logging.getLogger("root")
+log.debug("embedTemplate.py loaded")
+
+class EmbedTemplate:
+
+    def __init__(self, data):
+        """An embed from game_data.json compiled once into static parts and format slots.
+
+        Every string containing a "{" becomes a slot, named by its path in the
+        embed, e.g. "title", "thumbnail.url" or "fields.2.value". Rendering only
+        copies the dicts/lists leading to the slots that are filled in, everything
+        else is shared with the template.
+
+        Arguments:
+            data {dict} -- The embed template. It is never modified.
+        """
+        self.data = data
+        self.slots = {} # name -> (path, format string)
+        self._compile(data, ())
+
+    def _compile(self, node, path):
+        if isinstance(node, dict):
+            items = node.items()
+        elif isinstance(node, list):
+            items = enumerate(node)
+        else:
+            if isinstance(node, str) and "{" in node:
+                self.slots[".".join(str(x) for x in path)] = (path, node)
+            return
+
+        for key, value in items:
+            self._compile(value, path + (key,))
+
+    def render(self, values=None, replace=None):
+        """Build an embed dict with the given slots filled in.
+
+        Keyword Arguments:
+            values {dict} -- Slot name -> format arguments (a tuple, or a single value). (default: {None})
+            replace {dict} -- Slot name -> string used instead of the template's text. (default: {None})
+
+        Returns:
+            dict -- Ready for discord.Embed.from_data.
+        """
+        root = dict(self.data)
+        copied = {(): root}
+
+        if values:
+            for name, args in values.items():
+                path, fmt = self.slots[name]
+                text = fmt.format(*args) if isinstance(args, tuple) else fmt.format(args)
+                self._set(root, copied, path, text)
+
+        if replace:
+            for name, text in replace.items():
+                self._set(root, copied, self.slots[name][0], text)
+
+        return root
+
+    @staticmethod
+    def _set(root, copied, path, text):
+        # Copy each container on the way to the slot (once), then set the leaf
+        node = root
+        for depth in range(1, len(path)):
+            prefix = path[:depth]
+            child = copied.get(prefix)
+            if child is None:
+                original = node[path[depth-1]]
+                child = dict(original) if isinstance(original, dict) else list(original)
+                node[path[depth-1]] = child
+                copied[prefix] = child
+            node = child
+        node[path[-1]] = text
+
+
+def compile_templates(embeds):
+    """Compile every embed in game_data.json's "embeds" section.
+
+    Returns:
+        dict -- Embed name -> EmbedTemplate
+    """
+    return {name: EmbedTemplate(data) for name, data in embeds.items()}
@@ -0,0 +1,360 @@
+# Internal Python Moduels
+import os
+import json
+import time
+import zlib
+import struct
+import logging
+from collections import deque, namedtuple
+
+from .playerTable import PlayerTable
+
+log = logging.getLogger("root")
+log.debug("eventLog.py loaded")
+
+# The logged fields are the player table's columns
+FIELDS = tuple(name for name, code in PlayerTable.columns_spec)
+
+# Every segment starts with MAGIC followed by a version byte
+MAGIC = b"FTE"
+VERSION = 1
+
+_HEADER = struct.Struct("<3sB")
+_FRAME = struct.Struct("<IIB") # payload length, crc32 of the payload, record type
+_EVENT = struct.Struct("<QdBBB") # seq, time, id length, action length, change count
+_CHECKPOINT = struct.Struct("<Qd") # last seq written to storage, time
+_CHANGES = tuple(struct.Struct("<B" + code * 2) for name, code in PlayerTable.columns_spec) # field, before, after
+_TRADES = struct.Struct("<I") # length of the JSON [before, after] trade slots, after the changes (only if they changed)
+_COUNT = struct.Struct("<H") # events in a transaction, each follows as its length and an event payload
+_LENGTH = struct.Struct("<I")
+
+# Record types
+EVENT = 0
+CHECKPOINT = 1
+TRANSACTION = 2
+
+# changes: ((field, before, after), ...)
+# trades: (before, after) {"in_trade": [...], "out_trade": [...]} as in Player.trade_slots, or None if they didn't change
+Event = namedtuple("Event", ["seq", "time", "player_id", "action", "changes", "trades"])
+
+
+def _number(value):
+    # Money is stored as a double, give whole amounts back as ints
+    return int(value) if isinstance(value, float) and value.is_integer() else value
+
+def _frames(data, pos):
+    """Yield (end offset, record type, payload) from pos, stopping at the first incomplete or corrupt frame."""
+    while pos + _FRAME.size <= len(data):
+        length, crc, kind = _FRAME.unpack_from(data, pos)
+        end = pos + _FRAME.size + length
+        if end > len(data):
+            return
+        payload = data[pos + _FRAME.size:end]
+        if zlib.crc32(payload, kind) != crc:
+            return
+        yield end, kind, payload
+        pos = end
+
+def _decode_event(payload):
+    seq, when, id_length, action_length, count = _EVENT.unpack_from(payload, 0)
+    pos = _EVENT.size
+    player_id = payload[pos:pos + id_length].decode('utf-8')
+    pos += id_length
+    action = payload[pos:pos + action_length].decode('utf-8')
+    pos += action_length
+
+    changes = []
+    for n in range(count):
+        field, before, after = _CHANGES[payload[pos]].unpack_from(payload, pos)
+        pos += _CHANGES[field].size
+        changes.append((FIELDS[field], _number(before), _number(after)))
+
+    trades = None
+    if pos < len(payload):
+        length, = _TRADES.unpack_from(payload, pos)
+        pos += _TRADES.size
+        trades = tuple(json.loads(payload[pos:pos + length].decode('utf-8')))
+    return Event(seq, when, player_id, action, tuple(changes), trades)
+
+def _decode_events(kind, payload):
+    """The events in an EVENT or TRANSACTION record, [] for other records."""
+    if kind == EVENT:
+        return [_decode_event(payload)]
+    if kind != TRANSACTION:
+        return []
+    events = []
+    pos = _COUNT.size
+    for n in range(_COUNT.unpack_from(payload)[0]):
+        length, = _LENGTH.unpack_from(payload, pos)
+        pos += _LENGTH.size
+        events.append(_decode_event(payload[pos:pos + length]))
+        pos += length
+    return events
+
+
+class EventLog:
+
+    log_location = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/economy.log"
+
+    def __init__(self, path=None, max_bytes=16 * 1024 * 1024, keep=4):
+        """Append-only binary log of every change to a player's numeric fields and trade slots.
+
+        save_player appends one event per save: the player, the action that
+        caused it, the before/after value of each changed field and, if any
+        trade offer was sent, answered or withdrawn, the trade slots. Players
+        changed together (see Transaction) are logged as one record holding
+        each player's event, so a crash keeps all of them or none. Player
+        files act as snapshots. After the player cache has written everything
+        back, a checkpoint records the last event covered, so startup only
+        replays the events after it. The log rolls over to a new segment at a
+        checkpoint once it passes max_bytes (carrying over any events the
+        checkpoint doesn't cover), keeping keep old segments for history and
+        rollback.
+
+        Keyword Arguments:
+            path {str} -- Log file to use instead of the default. (default: {None})
+            max_bytes {int} -- Size at which the log rolls over. (default: {16MB})
+            keep {int} -- Old segments kept. (default: {4})
+        """
+        self.path = path or EventLog.log_location
+        self.max_bytes = max_bytes
+        self.keep = keep
+
+        self.file = None
+        self.size = 0
+        self.seq = 0 # Last event written
+        self.checkpointed = 0 # Last event covered by the player files
+
+    # Segments
+    # ---------------------------
+
+    def open(self):
+        """Open the log for appending, and return what happened since the last checkpoint.
+
+        Returns:
+            dict -- player_id -> {field: value} for every field changed after the last checkpoint,
+                    and "trades" -> trade slots if they changed.
+        """
+        pending = []
+        end = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                data = f.read()
+            if data[:_HEADER.size] == _HEADER.pack(MAGIC, VERSION):
+                end = _HEADER.size
+                for end, kind, payload in _frames(data, _HEADER.size):
+                    if kind == CHECKPOINT:
+                        # Events made while the cache was flushing can come before the checkpoint that follows them
+                        self.checkpointed = _CHECKPOINT.unpack_from(payload)[0]
+                        self.seq = max(self.seq, self.checkpointed)
+                        pending = [x for x in pending if x.seq > self.checkpointed]
+                    else:
+                        for event in _decode_events(kind, payload):
+                            self.seq = event.seq
+                            if event.seq > self.checkpointed:
+                                pending.append(event)
+                if end < len(data):
+                    log.warning("Event log: dropping {} bytes of a partly written record".format(len(data) - end))
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(end)
+            else:
+                log.warning("Event log: {} is not an event log, starting a new one".format(self.path))
+                self._shift_segments()
+
+        tail = {}
+        for event in pending:
+            values = tail.setdefault(event.player_id, {})
+            for field, before, after in event.changes:
+                values[field] = after
+            if event.trades is not None:
+                values["trades"] = event.trades[1]
+
+        if end == 0:
+            self._start_segment()
+        else:
+            self.file = open(self.path, 'ab')
+            self.size = end
+
+        log.debug("Event log: at event {}, {} player(s) changed since the last checkpoint".format(self.seq, len(tail)))
+        return tail
+
+    def _start_segment(self):
+        if self.file is not None:
+            self.file.close()
+        self.file = open(self.path, 'wb')
+        self.file.write(_HEADER.pack(MAGIC, VERSION))
+        self.size = _HEADER.size
+        # Every segment starts from a checkpoint, so the tail is always in the newest one
+        self._write(CHECKPOINT, _CHECKPOINT.pack(self.checkpointed, time.time()))
+        self._sync()
+
+    def _shift_segments(self):
+        # economy.log -> economy.log.1 -> economy.log.2 ..., dropping the oldest
+        for n in range(self.keep, 0, -1):
+            source = self.path if n == 1 else "{}.{}".format(self.path, n - 1)
+            if os.path.exists(source):
+                os.replace(source, "{}.{}".format(self.path, n))
+
+    def segments(self):
+        """Segment paths, oldest first."""
+        paths = ["{}.{}".format(self.path, n) for n in range(self.keep, 0, -1)] + [self.path]
+        return [x for x in paths if os.path.exists(x)]
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    # Writing
+    # ---------------------------
+
+    def _write(self, kind, payload):
+        frame = _FRAME.pack(len(payload), zlib.crc32(payload, kind), kind) + payload
+        self.file.write(frame)
+        self.file.flush()
+        self.size += len(frame)
+
+    def _sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def record(self, player_id, before, after, action="update", trades=None):
+        """Append an event for the fields that differ between before and after.
+
+        Arguments:
+            player_id {str} -- The player.
+            before {tuple} -- Field values before, in FIELDS order (None for a new player).
+            after {tuple} -- Field values after, in FIELDS order.
+
+        Keyword Arguments:
+            action {str} -- What caused the change, e.g. a command name. (default: {"update"})
+            trades {tuple} -- (before, after) trade slots as in Player.trade_slots, logged if they differ. (default: {None})
+
+        Returns:
+            int -- The event's seq, or None if nothing changed.
+        """
+        payload = self._encode(self.seq + 1, player_id, before, after, action, trades)
+        if payload is None:
+            return None
+        self.seq += 1
+        self._write(EVENT, payload)
+        return self.seq
+
+    def record_many(self, changes, action="update"):
+        """Append one record holding an event for each player, and wait for it to reach the disk.
+
+        The record is written whole or (after a crash part way) dropped whole,
+        so recovery replays every player's changes or none of them.
+
+        Arguments:
+            changes {list} -- (player_id, before, after, trades) per player, as the arguments of record.
+
+        Keyword Arguments:
+            action {str} -- What caused the change. (default: {"update"})
+
+        Returns:
+            list -- The events' seqs, players with nothing changed are left out.
+        """
+        seqs = []
+        parts = []
+        for player_id, before, after, trades in changes:
+            payload = self._encode(self.seq + len(seqs) + 1, player_id, before, after, action, trades)
+            if payload is not None:
+                seqs.append(self.seq + len(seqs) + 1)
+                parts.extend((_LENGTH.pack(len(payload)), payload))
+        if not seqs:
+            return seqs
+
+        self.seq = seqs[-1]
+        self._write(TRANSACTION, _COUNT.pack(len(seqs)) + b"".join(parts))
+        self._sync()
+        return seqs
+
+    def _encode(self, seq, player_id, before, after, action, trades):
+        if before is None:
+            before = (0,) * len(FIELDS)
+        changed = [n for n in range(len(FIELDS)) if before[n] != after[n]]
+        slots = None
+        if trades is not None and trades[0] != trades[1]:
+            # Pairs can be tuples or lists (after a JSON round trip), compare them as they would be logged
+            encoded = [json.dumps(x, separators=(',', ':'), sort_keys=True) for x in trades]
+            if encoded[0] != encoded[1]:
+                slots = "[{},{}]".format(*encoded).encode('utf-8')
+        if (not changed and slots is None) or self.file is None:
+            return None
+
+        player = player_id.encode('utf-8')
+        name = action.encode('utf-8')[:255]
+        try:
+            parts = [_EVENT.pack(seq, time.time(), len(player), len(name), len(changed)), player, name]
+            parts.extend(_CHANGES[n].pack(n, before[n], after[n]) for n in changed)
+            if slots is not None:
+                parts.extend((_TRADES.pack(len(slots)), slots))
+        except struct.error as e:
+            log.error("Event log: could not record {} for {}: {}".format(action, player_id, e))
+            return None
+        return b"".join(parts)
+
+    def checkpoint(self, seq=None):
+        """Record that every event up to seq is in the player files, then roll over if the log is large.
+
+        Keyword Arguments:
+            seq {int} -- The last event covered. (default: {the last event written})
+        """
+        self.checkpointed = self.seq if seq is None else seq
+        self._write(CHECKPOINT, _CHECKPOINT.pack(self.checkpointed, time.time()))
+        self._sync()
+
+        if self.size >= self.max_bytes:
+            self._roll_over()
+
+    def _roll_over(self):
+        # Events the checkpoint doesn't cover yet are copied into the new segment
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        carried = [
+            (kind, payload) for end, kind, payload in _frames(data, _HEADER.size)
+            if any(x.seq > self.checkpointed for x in _decode_events(kind, payload))
+        ]
+
+        self.close()
+        self._shift_segments()
+        self._start_segment()
+        for kind, payload in carried:
+            self._write(kind, payload)
+
+    # Reading
+    # ---------------------------
+
+    def events(self, player_id=None, since=0):
+        """Yield logged events, oldest first.
+
+        Keyword Arguments:
+            player_id {str} -- Only this player's events. (default: {None})
+            since {int} -- Only events with at least this seq. (default: {0})
+        """
+        last = 0
+        for path in self.segments():
+            with open(path, 'rb') as f:
+                data = f.read()
+            if data[:_HEADER.size] != _HEADER.pack(MAGIC, VERSION):
+                continue
+            for end, kind, payload in _frames(data, _HEADER.size):
+                for event in _decode_events(kind, payload):
+                    # Events carried over into the next segment are only yielded once
+                    if event.seq <= last:
+                        continue
+                    last = event.seq
+                    if event.seq >= since and (player_id is None or event.player_id == player_id):
+                        yield event
+
+    def history(self, player_id, limit=10):
+        """The player's last limit events, oldest first."""
+        return list(deque(self.events(player_id), maxlen=limit))
+
+    def stats(self):
+        return {
+            "seq": self.seq,
+            "checkpointed": self.checkpointed,
+            "bytes": self.size
+        }
@@ -4,7 +4,6 @@ import asyncio
 import logging
 import time
 import datetime
-import copy
 
 # Imported (External) Python Modules
 import discord
@@ -12,12 +11,27 @@ import discord
 # Game
 from .discordClient import DiscordClient
 from .playerIndex import PlayerIndex
+from .playerCache import PlayerCache
+from .leaderboard import Leaderboard
+from .playerTable import PlayerTable
+from .economy import summarize
+from .production import ProductionScheduler
+from .harvestNotifier import HarvestNotifier
+from .eventLog import EventLog, FIELDS
+from .ruleset import Ruleset, RulesetError
+from .metrics import Metrics
 from .player import Player
-from .trade import Trade
+from .upgrades import CURVES
+from .storage import create_storage
+from .trade import Trade, OutgoingTrade
+from .transaction import Transaction, TransactionError
+from .locks import LockManager
+from .arguments import FRUIT_EMOJIS, EMOJI_OF, ArgumentError, parse_item, parse_mention, parse_production, split_confirmation
 from .logger import setup_discord_logger, set_logger_level
+from .constants import HARVEST_COOLDOWN
 
 # Misc
-from .json import Json
+from .json import Json, run_io
 
 log = logging.getLogger("root")
 log.debug("game.py loaded")
@@ -28,19 +42,91 @@ class GameManager:
     data_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/game_data.json"
     log_path = ""
 
-    def __init__(self):
-        self.config = self.load_config()
-        self.game_data = Json(GameManager.data_path).data
-        self.players = PlayerIndex()
-        self.client = DiscordClient(self.config, self.game_data, game=self)
+    def __init__(self, config=None, client_class=DiscordClient):
+        """Sets up the game and its Discord client.
+
+        Keyword Arguments:
+            config {dict} -- Use this config instead of loading config/config.json. (default: {None})
+            client_class {class} -- The client to create, e.g. a stand-in for benchmarks. (default: {DiscordClient})
+        """
+        # A config passed in is used as is, only config.json is watched for changes
+        self.config_watched = config is None
+        self.config = config if config is not None else self.load_config()
+
+        # game_data.json and config, checked and precompiled (swapped out whole on reload)
+        self.ruleset = Ruleset(Json(GameManager.data_path).data, self.config)
+        self.game_data = self.ruleset.game_data
+        self.reload_interval = self.config.get("reload", {}).get("interval", 5)
+        self.ruleset_stamps = self._ruleset_stamps()
+
+        # Storage backend (json or sqlite)
+        storage_config = self.config.get("storage", {})
+        self.storage = create_storage(
+            storage_config.get("backend", "json"), storage_config.get("path"),
+            commit_window=storage_config.get("commit_window", 0.05),
+            codec=storage_config.get("codec", "json")
+        )
+        Player.storage = self.storage
+        self.players = PlayerIndex(self.storage)
+
+        # Player cache (write-back)
+        cache_config = self.config.get("cache", {})
+        self.cache = PlayerCache(
+            max_size=cache_config.get("max_players", 1000),
+            ttl=cache_config.get("ttl", 900)
+        )
+        self.cache_flush_interval = cache_config.get("flush_interval", 30)
+        self.loading = {} # player_id -> Future of an in-progress load
+
+        # Commands that change a player hold its lock from loading it to saving it
+        self.locks = LockManager(self.config.get("locks", {}).get("stripes", 256))
+
+        # Economy event log, changes since the last checkpoint are replayed over the player files
+        events_config = self.config.get("events", {})
+        self.events = EventLog(
+            events_config.get("path") or None,
+            max_bytes=events_config.get("max_bytes", 16 * 1024 * 1024),
+            keep=events_config.get("keep", 4)
+        )
+        self.recover(self.events.open())
+
+        # Command latency, Discord API call and player I/O counters
+        metrics_config = self.config.get("metrics", {})
+        self.metrics = Metrics()
+        self.metrics_path = metrics_config.get("path") or None
+        self.metrics_interval = metrics_config.get("interval", 60)
+
+        self.client = client_class(self.config, self.game_data, game=self)
         
         # Leaderboard
+        self.leaderboard = Leaderboard()
         self.leaderboard_embed = None
+        self.leaderboard_embed_version = None
         self.leaderboard_channel = self.config["chat"]["leaderboard_channel"]
 
+        # Numeric player fields, one column per field
+        self.table = PlayerTable()
+        self.trades = {} # player_id -> trade slots last logged, for players with a trade in them
+        self.economy_report = None
+        self.economy_version = None
+
+        # Harvest reminders for players with notify on
+        notify_config = self.config.get("notifications", {})
+        self.notifier = HarvestNotifier(
+            self,
+            batch_size=notify_config.get("batch_size", 50),
+            batch_interval=notify_config.get("batch_interval", 1.0)
+        )
+        self.rebuild_indexes()
+
+        # Production jobs
+        self.production = ProductionScheduler(self)
+        self.production.load()
+
 
         # Defined in game_data.json
         self.embeds = self.game_data["embeds"]
+        self.templates = self.ruleset.templates
 
         # Setup loggers
         set_logger_level(log, self.config["bot"]["debug_level"])
@@ -56,25 +142,305 @@ class GameManager:
         conf = Json(GameManager.config_path).data
         return conf
 
+    # Hot reload
+
+    def _ruleset_stamps(self):
+        """(mtime, size) of game_data.json, and config.json if it is watched."""
+        paths = [GameManager.data_path] + ([GameManager.config_path] if self.config_watched else [])
+        stamps = []
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                stamps.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                stamps.append(None)
+        return tuple(stamps)
+
+    async def reload_loop(self):
+        """Reload the rules whenever game_data.json or config.json changes."""
+        while True:
+            await asyncio.sleep(self.reload_interval)
+            stamps = self._ruleset_stamps()
+            if stamps != self.ruleset_stamps:
+                self.ruleset_stamps = stamps
+                await self.reload()
+
+    async def reload(self):
+        """Load game_data.json and config.json again, and swap them in if they are valid.
+
+        Returns:
+            str -- What happened, for the admin reload command.
+        """
+        try:
+            ruleset = await run_io(
+                Ruleset.load, GameManager.data_path, GameManager.config_path,
+                None if self.config_watched else self.config
+            )
+        except RulesetError as e:
+            log.error("Reload: keeping the current rules, {}".format(e))
+            self.metrics.inc("reloads_total", result="rejected")
+            return "Reload failed, nothing was changed: {}".format(e)
+
+        restart = ruleset.restart_changes(self.ruleset)
+        self.apply_ruleset(ruleset)
+        self.metrics.inc("reloads_total", result="applied")
+
+        message = "Reloaded game data and config."
+        if restart:
+            message += " Changes to {} take effect after a reboot.".format(", ".join(restart))
+        log.info("Reload: " + message)
+        return message
+
+    def apply_ruleset(self, ruleset):
+        """Switch to ruleset. Nothing here awaits, so no command sees half of the change."""
+        self.ruleset = ruleset
+        self.game_data = ruleset.game_data
+        self.embeds = ruleset.game_data["embeds"]
+        self.templates = ruleset.templates
+        self.config = ruleset.config
+
+        # Built from the old game data
+        self.economy_version = None
+
+        set_logger_level(log, self.config["bot"]["debug_level"])
+        notify_config = self.config.get("notifications", {})
+        self.notifier.batch_size = notify_config.get("batch_size", 50)
+        self.notifier.batch_interval = notify_config.get("batch_interval", 1.0)
+        self.reload_interval = self.config.get("reload", {}).get("interval", 5)
+        self.client.apply_config(self.config)
+
     # Players
     # ---------------------------
 
     # Player I/O
 
     async def get_player(self, player_id):
-        if await self.players.exists(player_id):
+        player = self.cache.get(player_id)
+        if player is not None:
+            return player
+
+        if not await self.players.exists(player_id):
+            return None
+
+        # Share one load between commands that miss on the same player at once
+        if player_id not in self.loading:
+            self.loading[player_id] = asyncio.ensure_future(self._load_player(player_id))
+        return await asyncio.shield(self.loading[player_id])
+
+    async def _load_player(self, player_id):
+        try:
             player = Player(player_id)
-            player.load()
+            self.metrics.inc("player_loads_total")
+            if not await player.load_async():
+                return None
+            self.cache.put(player)
             return player
-        return None
+        finally:
+            del self.loading[player_id]
+
+    def save_player(self, player, action="update"):
+        """Mark a player as changed. It is written to disk on the next cache flush.
+
+        The changed fields are appended to the event log straight away.
+
+        Keyword Arguments:
+            action {str} -- What changed the player, recorded in the event log. (default: {"update"})
+        """
+        values = PlayerTable.player_values(player)
+        trades = player.trade_slots()
+        self.events.record(player.id, self.table.row(player.id), values, action, (self._logged_trades(player), trades))
+        self._saved(player, values, trades)
+
+    def save_players(self, players, action="update"):
+        """Mark several players as changed together, like save_player.
+
+        Their changes are appended to the event log as one record that is on
+        disk before this returns, so after a crash either all of them are
+        recovered or none are.
+
+        Keyword Arguments:
+            action {str} -- What changed the players, recorded in the event log. (default: {"update"})
+        """
+        saved = [(player, PlayerTable.player_values(player), player.trade_slots()) for player in players]
+        self.events.record_many([
+            (player.id, self.table.row(player.id), values, (self._logged_trades(player), trades))
+            for player, values, trades in saved
+        ], action)
+        for player, values, trades in saved:
+            self._saved(player, values, trades)
+
+    def _saved(self, player, values, trades):
+        if any(trades["in_trade"]) or any(trades["out_trade"]):
+            self.trades[player.id] = trades
+        else:
+            self.trades.pop(player.id, None)
+
+        self.cache.mark_dirty(player)
+        self.leaderboard.update(player.id, player.money)
+        self.table.set(player.id, values)
+        self.notifier.update(player)
+
+    def _logged_trades(self, player):
+        """The player's trade slots as the event log last saw them."""
+        trades = self.trades.get(player.id)
+        if trades is None:
+            trades = {"in_trade": [0] * len(player.in_trade), "out_trade": [0] * len(player.out_trade)}
+        return trades
+
+    def transaction(self, *player_ids, action="update"):
+        """Lock, load and change several players at once, committing all of them or none.
+
+        e.g. `async with self.transaction(a, b, action="trade") as (player_a, player_b):`
+
+        Keyword Arguments:
+            action {str} -- Recorded in the event log for every changed player. (default: {"update"})
+        """
+        return Transaction(self, player_ids, action)
 
     async def remove_player(self, player_id):
         await self.players.remove(player_id)
+        self.cache.discard(player_id)
+        self.leaderboard.remove(player_id)
+        self.events.record(player_id, self.table.row(player_id), (0,) * len(FIELDS), "remove")
+        self.table.remove(player_id)
+        self.trades.pop(player_id, None)
+        self.notifier.cancel(player_id)
         player = Player(player_id)
         player.delete()
 
         return True
 
+    # Event log
+    # ---------------------------
+
+    def recover(self, tail):
+        """Apply the logged changes that didn't reach the player files (e.g. after a crash).
+
+        Arguments:
+            tail {dict} -- player_id -> {field: value}, from EventLog.open.
+        """
+        recovered = []
+        for player_id, values in tail.items():
+            if player_id not in self.players.players:
+                continue
+            record = self.storage.load_player(player_id)
+            if record is None:
+                continue
+            player = Player(player_id)
+            player.load_record(record)
+            self._apply_values(player, values)
+            recovered.append((player_id, player.to_record()))
+
+        if recovered:
+            self.storage.save_players(recovered)
+            self.storage.flush()
+            log.info("Recovered {} player(s) from the event log".format(len(recovered)))
+        self.events.checkpoint()
+
+    def _apply_values(self, player, values):
+        """Set logged fields on a player, keeping the fields derived from them in step.
+
+        Arguments:
+            values {dict} -- field -> value, fields as in eventLog.FIELDS, and "trades" -> trade slots.
+        """
+        for field, value in values.items():
+            if field == "trades":
+                # Copied, load_record turns the slots into Trade objects in place
+                player.load_record({name: list(slots) for name, slots in value.items()})
+            elif field in player.inventory:
+                player.inventory[field] = value
+            elif field in ("size_level", "multiplier_level"):
+                stat = field[:-len("_level")]
+                player.upgrade_levels[stat] = value
+                player.upgrades[stat] = CURVES[stat].value(value)
+            elif field == "farm_level":
+                player.farm_level = value
+                names = self.game_data["juice_upgrades"]["id_to_name"]
+                player.upgrades["farm"] = [self.game_data["juice_upgrades"][names[str(n)]]["name"] for n in range(1, value + 1)]
+            else:
+                setattr(player, field, value)
+
+    async def get_history(self, player_id, limit=10):
+        """The player's last limit events, oldest first."""
+        return await run_io(self.events.history, player_id, limit)
+
+    async def rollback_player(self, player_id, seq):
+        """Put a player's logged fields back to how they were before event seq.
+
+        Fields no event since seq touched are left alone. Trade slots are put
+        back too, the other player in a trade is not (roll them back as well).
+        The rollback is itself logged, so it can be undone too.
+
+        Returns:
+            int -- The amount of events undone, or None if the player does not exist.
+        """
+        async with self.locks.hold(player_id):
+            player = await self.get_player(player_id)
+            if player is None:
+                return None
+
+            events = await run_io(lambda: list(self.events.events(player_id, since=seq)))
+            values = {}
+            for event in events:
+                for field, before, after in event.changes:
+                    # The first change to each field holds its value before seq
+                    values.setdefault(field, before)
+                if event.trades is not None:
+                    values.setdefault("trades", event.trades[0])
+
+            self._apply_values(player, values)
+            self.save_player(player, "rollback")
+            return len(events)
+
+    # Indexes
+
+    def rebuild_indexes(self):
+        """Build the in-memory indexes from storage (once, at startup)."""
+        start = time.perf_counter()
+
+        # One pass over the stored records fills all of them
+        scores = []
+        reminders = []
+        self.table.clear()
+        self.trades.clear()
+        for player_id, record in self.storage.iter_players():
+            if player_id not in self.players.players:
+                continue
+            self.table.set(player_id, PlayerTable.record_values(record))
+            if any(record.get("in_trade", ())) or any(record.get("out_trade", ())):
+                self.trades[player_id] = {"in_trade": record["in_trade"], "out_trade": record["out_trade"]}
+            scores.append((player_id, record.get("money", 0)))
+            if record.get("notify"):
+                reminders.append((player_id, record.get("last_harvest", 0)))
+        self.leaderboard.rebuild(scores)
+        self.notifier.rebuild(reminders)
+
+        log.debug("Built leaderboard, player table and {} harvest reminders for {} players in {:.2f}s".format(
+            len(reminders), len(self.table), time.perf_counter() - start
+        ))
+
+    def get_economy(self):
+        """Return the economy report, recomputed only if a player changed since the last call."""
+        if self.economy_version != self.table.version:
+            self.economy_report = summarize(self.table, self.game_data)
+            self.economy_version = self.table.version
+        return self.economy_report
+
+    # Player cache
+
+    async def cache_flush_loop(self):
+        while True:
+            await asyncio.sleep(self.cache_flush_interval)
+            seq, failures = self.events.seq, self.cache.failures
+            written = await self.cache.flush_async()
+            self.metrics.inc("player_saves_total", written)
+            if self.cache.failures == failures:
+                # Every change up to seq is in the player files now
+                self.events.checkpoint(seq)
+            expired = self.cache.expire()
+            if written or expired:
+                log.debug("Cache: wrote {} player(s), evicted {} idle player(s)".format(written, expired))
+
     # Helper functions
     # ---------------------------
 
@@ -83,10 +449,14 @@ class GameManager:
         # TODO: (FUTURE) change into decorator
         if await self.get_player(member.id) is None: 
             message = "You have to join the game to run this command." if error_message is None else error_message
-            await self.client.send_message(member, content=message)
+            self.client.post(member, content=message)
             return False
         return True
 
+    async def _dialogue_expired(self, member):
+        # wait_for_message/wait_for_reaction returned None: the dialogue timed out or was replaced
+        self.client.post(member, "You took too long to answer. Run the command again to start over.")
+
     def _convert_short_text(self, short_text):
         if short_text == "money":
             return "moneybag"
@@ -110,7 +480,7 @@ class GameManager:
         
         # Ensure the user had not already joined
         if await self.get_player(member.id) is not None: 
-            await self.client.send_message(member, content="You have already joined the game.")
+            self.client.post(member, content="You have already joined the game.")
             return
 
         # Ensure the user has entered a valid fruit type            
@@ -121,32 +491,44 @@ class GameManager:
             msg = await self.client.send_message(member, "Choose a fruit type!")
             await self.client.add_reactions(msg, emojis.keys())
             res = await self.client.wait_for_reaction(emoji=list(emojis.keys()), message=msg, user=member)
+            if res is None: return await self._dialogue_expired(member)
 
             fruit_type = emojis[res.reaction.emoji]
             private = True
         
         elif not self._check_types(fruit_type):
-            await self.client.send_message(ctx.message.channel, "<@{}> Please enter a valid fruit type. They are:\n- {}".format(member.id, '\n- '.join(self.client.fruit_types)))
+            self.client.post(ctx.message.channel, "<@{}> Please enter a valid fruit type. They are:\n- {}".format(member.id, '\n- '.join(self.client.fruit_types)))
             return
 
-        # Create player instance
-        player = Player(ctx.message.author.id, fruit_type.lower())
-        player.last_harvest = int(time.time())
+        async with self.locks.hold(member.id):
+            # Joined from another command while choosing a fruit
+            if await self.players.exists(member.id):
+                self.client.post(member, content="You have already joined the game.")
+                return
+
+            # Create player instance
+            player = Player(ctx.message.author.id, fruit_type.lower())
+            player.last_harvest = int(time.time())
 
-        # Send user welcome embed
-        join_embed = player.create_join_embed(copy.deepcopy(self.embeds["join"]), member.name)
+            # Send user welcome embed
+            join_embed = player.create_join_embed(self.templates["join"], member.name)
 
-        await self.client.send_typing(ctx.message.channel)
-        await self.client.send_message(member, content=None, embed=join_embed)
+            await self.client.send_typing(ctx.message.channel)
+            self.client.post(member, content=None, embed=join_embed)
         
-        if not ctx.message.channel.is_private or not private: 
-            await self.client.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
+            if not ctx.message.channel.is_private or not private: 
+                self.client.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
         
-        await self.client.send_message(member, 
-        "You've chosen :{}:. We'll plant your first lot for you. Run the harvest command in {} hours.".format(self._convert_short_text(fruit_type), "2"))
+            self.client.post(member, 
+            "You've chosen :{}:. We'll plant your first lot for you. Run the harvest command in {} hours.".format(self._convert_short_text(fruit_type), "2"))
     
-        await self.players.add(player.id)
-        player.save()
+            await self.players.add(player.id)
+            self.cache.put(player)
+            self.leaderboard.update(player.id, player.money)
+            self.events.record(player.id, None, PlayerTable.player_values(player), "join")
+            self.table.update(player)
+            await player.save_async()
+            self.metrics.inc("player_saves_total")
         
     async def harvest(self, ctx):
         # Get (discord) member object from context
@@ -155,54 +537,76 @@ class GameManager:
         # Ensure the user has already joined
         if not await self.is_player(member): return
         
-        # Load player
-        player = await self.get_player(member.id)
+        async with self.locks.hold(member.id):
+            # Load player
+            player = await self.get_player(member.id)
+
+            # Ensure sufficient time has passed (HARVEST_COOLDOWN, 2 hours)
+            time_remaining = HARVEST_COOLDOWN - (int(time.time()) - player.last_harvest)
+            if time_remaining > 0:
+                # Nothing changes, so nothing is saved and the cooldown isn't reset
+                hours, minutes = divmod((time_remaining // 60), 60) # Convert seconds to minutes, then calculate hours & minutes
+                await self.client.send_typing(ctx.message.channel)
+                self.client.post(ctx.message.channel, "<@{}>, your fruit has not fully grown. ({} hour(s) {} minute(s) remaining){}".format(
+                    member.id, hours, minutes, "" if player.notify else " Use `{}notify` to get a DM when it's ready.".format(self.client.command_prefix)
+                ))
+                return
 
-        # Ensure sufficient time has passed (2 hours = 7200 seconds)
-        time_valid = True
-        if int(time.time()) - player.last_harvest < 7200:
-            time_valid = False
-            time_remaining = 7200 - (int(time.time()) - player.last_harvest)
-
-        # Calculate harvest yield
-        harvest_yield = player.upgrades["size"]
-        harvest_yield *= player.upgrades["multiplier"]
-        harvest_yield = int(harvest_yield)
-
-        # Add harvest yield to player's inventory
-        if player.type == "apple": 
-            player.inventory["apple"] += harvest_yield
-        if player.type == "banana": 
-            player.inventory["banana"] += harvest_yield
-        if player.type == "grape": 
-            player.inventory["grape"] += harvest_yield
-
-        player.last_harvest = int(time.time()) # Update last harvest
-        player.save()
+            # Calculate harvest yield
+            harvest_yield = player.upgrades["size"]
+            harvest_yield *= player.upgrades["multiplier"]
+            harvest_yield = int(harvest_yield)
+
+            # Add harvest yield to player's inventory
+            if player.type == "apple": 
+                player.inventory["apple"] += harvest_yield
+            if player.type == "banana": 
+                player.inventory["banana"] += harvest_yield
+            if player.type == "grape": 
+                player.inventory["grape"] += harvest_yield
+
+            player.last_harvest = int(time.time()) # Update last harvest
+            self.save_player(player, "harvest")
         
-        # Send message
-        if not time_valid:
-            hours, minutes = divmod((time_remaining // 60), 60) # Convert seconds to minutes, then calculate hours & minutes
-            await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "<@{}>, your fruit has not fully grown. ({} hour(s) {} minute(s) remaining)".format(member.id, hours, minutes))
+        # Format embed
+        harvest_embed = self.templates["harvest"].render({
+            "thumbnail.url": self.game_data["img_urls"][player.type],
+            "fields.0.value": (self._convert_short_text(player.type), harvest_yield)
+        })
+        
+        # Send embed
+        await self.client.send_typing(ctx.message.channel)
+        self.client.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
+        self.client.post(member, content=None, embed=discord.Embed().from_data(harvest_embed))
+
+    async def set_notify(self, ctx, setting):
+        member = ctx.message.author
+
+        if not await self.is_player(member): return
+
+        async with self.locks.hold(member.id):
+            player = await self.get_player(member.id)
+
+            # No argument toggles
+            if setting is None:
+                player.notify = not player.notify
+            elif setting.lower() in ("on", "off"):
+                player.notify = setting.lower() == "on"
+            else:
+                self.client.post(ctx.message.channel, "Please enter either on or off.")
+                return
+            self.save_player(player, "notify")
+
+        if player.notify:
+            self.client.post(ctx.message.channel, "<@{}>, you will get a DM when your fruit is ready to harvest.".format(member.id))
         else:
-            # Format embed
-            harvest_embed = copy.deepcopy(self.embeds["harvest"])
-            harvest_embed["thumbnail"]["url"] = harvest_embed["thumbnail"]["url"].format(self.game_data["img_urls"][player.type])
-            harvest_embed["fields"][0]["value"] = harvest_embed["fields"][0]["value"].format(self._convert_short_text(player.type), harvest_yield)
-            
-            # Send embed
-            await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
-            await self.client.send_message(member, content=None, embed=discord.Embed().from_data(harvest_embed))
+            self.client.post(ctx.message.channel, "<@{}>, harvest reminders turned off.".format(member.id))
 
-    async def produce(self, ctx, drink_type):
-        # FUTURE: Turn this into class and save them (persistance over restarts, crashes, etc)
-        
+    async def produce(self, ctx, drink_type, *options):
         # Ensure correct arguments are passed
         if drink_type == None:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a drink type (either regular or mixed).")
+            self.client.post(ctx.message.channel, "Please enter a drink type (either regular or mixed).")
             return
 
         # Get (discord) member object from context
@@ -217,25 +621,46 @@ class GameManager:
         # Ensure user has access to the command
         if not player.farm_level > 0:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "You do not have access to this command yet. Check shop for details.")
+            self.client.post(ctx.message.channel, "You do not have access to this command yet. Check shop for details.")
             return
 
         # Ensure correct argument was passed
         if not drink_type in ["regular", "mixed"]:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please choose either a reguar or mixed drink.")
+            self.client.post(ctx.message.channel, "Please choose either a reguar or mixed drink.")
             return
         
         if not player.farm_level > 2 and drink_type == "mixed":
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "You do not have access to mixed drinks yet. Check shop for details.")
+            self.client.post(ctx.message.channel, "You do not have access to mixed drinks yet. Check shop for details.")
             return
 
+        if options:
+            # Single line command, e.g. produce regular apple all quality
+            try:
+                fruits, level, amount, confirmed = parse_production(drink_type, options)
+            except ArgumentError as e:
+                self.client.post(ctx.message.channel, str(e))
+                return
+
+            if level == 1 and not self._has_quality(player, drink_type):
+                self.client.post(ctx.message.channel, "You do not have access to quality drinks yet. Check shop for details.")
+                return
+
+            max_drink = self._max_drinks(player, fruits, level)
+            if max_drink == 0:
+                self.client.post(ctx.message.channel, "You do not have enough {} to refine.".format(" and ".join(EMOJI_OF[x] for x in fruits)))
+                return
+
+            quantity = max_drink if amount == "all" else amount
+            if quantity > max_drink:
+                self.client.post(ctx.message.channel, "You can produce a max of {} drinks.".format(max_drink))
+                return
+
         if not ctx.message.channel.is_private:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
+            self.client.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
 
-        emojis = {"\U0001F34E": "apple", "\U0001F34C": "banana", "\U0001F347": "grape"}
         confirmation_check = lambda msg: True if msg.content.lower() in ['yes', 'no'] else False
         def production_check(msg):
                 try:
@@ -246,319 +671,241 @@ class GameManager:
                         return True
                     return False
 
-        if drink_type == "regular":
-            # Do regular dialogue
-            
-            await self.client.send_typing(member)
-            msg = await self.client.send_message(member, "Which fruit would you like to use?")
-            await self.client.add_reactions(msg, emojis.keys())
-            emoji_res = await self.client.wait_for_reaction(emoji=list(emojis.keys()), message=msg, user=member)
-
-            # Do calculations
-            max_drink = player.inventory[emojis[emoji_res.reaction.emoji]] / self.game_data["juice_upgrades"]["regular"]["fruit_req"][0]
-            max_drink = int(max_drink)
-
-            if max_drink == 0:
-                await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "You do not have enough {} to refine.".format(emoji_res.reaction.emoji))
-                return
+        if not options:
+            # Do the dialogue, one fruit for regular drinks and two for mixed
+            confirmed = False
+            fruits = []
+            count = 1 if drink_type == "regular" else 2
+            for n in range(count):
+                emojis = [x for x in FRUIT_EMOJIS if FRUIT_EMOJIS[x] not in fruits]
 
-            level = 0 # Regular
-            # If a user has unlocked quality products, ask if they want to make them.
-            if player.farm_level > 1:    
-                quality_hour, quality_minute = divmod((self.game_data["juice_upgrades"]["quality"]["refine_time"] // 60), 60)
-                regular_hour, regular_minute = divmod((self.game_data["juice_upgrades"]["regular"]["refine_time"] // 60), 60)
-                
                 await self.client.send_typing(member)
-                msg = await self.client.send_message(member, 
-                "Would you like to make higher quality drinks? These will take {} hour(s) {} minute(s). (Regular drinks take {} hour(s) {} minute(s))".format(
-                    quality_hour, quality_minute, regular_hour, regular_minute
-                ))
-                confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
-
-                if confirmation.content == "yes":
-                    level = 1 # Quality
-                    await self.client.send_typing(member)
-                    await self.client.send_message(member, "Quality set to high.")
-
-            await self.client.send_typing(member)
-            msg = await self.client.send_message(member, "This will make {quality} {name} juice. The conversion rate is {rate}.\n"
-                "You can produce a max of {max} {quality} {name} juice. Type `all` to produce this many, or enter a specific number.".format(
-                    quality = "regular" if level == 0 else "quality",
-                    name = emojis[emoji_res.reaction.emoji],
-                    rate = "{}x{}=\U0001F943x1".format(
-                        emoji_res.reaction.emoji,
-                        self.game_data["juice_upgrades"]["regular"]["fruit_req"][0]),
-                    max = max_drink
-                ))
-            quantity_res = await self.client.wait_for_message(check=production_check, author=member, channel=await self.client.start_private_message(member))
-
-            if quantity_res.content == "all":
-                quantity = max_drink
-            else:
-                quantity = int(quantity_res.content)
+                msg = await self.client.send_message(member, "Which {}fruit would you like to use?".format("" if count == 1 else ("1st ", "2nd ")[n]))
+                await self.client.add_reactions(msg, FRUIT_EMOJIS.keys())
+                emoji_res = await self.client.wait_for_reaction(emoji=emojis, message=msg, user=member)
+                if emoji_res is None: return await self._dialogue_expired(member)
 
-            production = {
-                "time": self.game_data["juice_upgrades"]["regular"]["refine_time"] if level == 0 else self.game_data["juice_upgrades"]["quality"]["refine_time"],
-                "fruit_type": [emojis[emoji_res.reaction.emoji]],
-                "drink_quantity": quantity,
-                "fruit_cost": (self.game_data["juice_upgrades"]["regular"]["fruit_req"][0] * quantity,),
-                "unit_sell_price": self.game_data["juice_upgrades"]["regular"]["item_price"] if level == 0 else self.game_data["juice_upgrades"]["quality"]["item_price"]
-            }
-
-            # Final confirmation check
-            embed = copy.deepcopy(self.embeds["production_confirmation"])
-            embed["fields"][0]["value"] = embed["fields"][0]["value"].format(emoji_res.reaction.emoji)
-            embed["fields"][1]["value"] = embed["fields"][1]["value"].format("Regular" if level == 0 else "Quality")
-            embed["fields"][2]["value"] = embed["fields"][2]["value"].format(production["unit_sell_price"] * production["drink_quantity"])
-            embed["fields"][3]["value"] = embed["fields"][3]["value"].format(emoji_res.reaction.emoji, production["fruit_cost"][0])
-            
-            hours, minutes = divmod((production["time"] // 60), 60)
-            embed["fields"][4]["value"] = embed["fields"][4]["value"].format(hours, minutes)
-
-            await self.client.send_typing(member)
-            await self.client.send_message(member, embed=discord.Embed().from_data(embed))
-            await self.client.send_message(member, "Would you like to start production?")
-            confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
+                fruits.append(FRUIT_EMOJIS[emoji_res.reaction.emoji])
 
-            if confirmation.content == "yes":
-                await self.client.send_typing(member)
-                await self.client.send_message(member, "Production started.")
-            else:
-                await self.client.send_typing(member)
-                await self.client.send_message(member, "Production canceled.")
+            # Tell the player early if they can't make any drinks at all
+            if self._max_drinks(player, fruits, 0) == 0:
+                await self.client.send_typing(ctx.message.channel)
+                self.client.post(ctx.message.channel, "You do not have enough {} to refine.".format(" and ".join(EMOJI_OF[x] for x in fruits)))
                 return
 
-        else:    
-            # Do mixed dialogue
-            # Get 1st fruit
-            await self.client.send_typing(member)
-            msg = await self.client.send_message(member, "Which 1st fruit would you like to use?")
-            await self.client.add_reactions(msg, emojis.keys())
-            fruit1_res = await self.client.wait_for_reaction(emoji=list(emojis.keys()), message=msg, user=member)
-
-            # Get 2nd fruit
-            await self.client.send_typing(member)
-            msg = await self.client.send_message(member, "Which 2nd fruit would you like to use?")
-            await self.client.add_reactions(msg, emojis.keys())
-            fruit2_res = await self.client.wait_for_reaction(emoji=list(emojis.keys()).remove(fruit1_res.reaction.emoji), message=msg, user=member)
-
             level = 0 # Regular
             # If a user has unlocked quality products, ask if they want to make them.
-            if player.farm_level > 3:    
-                quality_hour, quality_minute = divmod((self.game_data["juice_upgrades"]["quality_mixed"]["refine_time"] // 60), 60)
-                regular_hour, regular_minute = divmod((self.game_data["juice_upgrades"]["mixed"]["refine_time"] // 60), 60)
+            if self._has_quality(player, drink_type):
+                quality_hour, quality_minute = divmod((self._production_recipe(fruits, 1)["refine_time"] // 60), 60)
+                regular_hour, regular_minute = divmod((self._production_recipe(fruits, 0)["refine_time"] // 60), 60)
                 
                 await self.client.send_typing(member)
-                msg = await self.client.send_message(member, 
-                "Would you like to make higher quality mixed drinks? These will take {} hour(s) {} minute(s). (Regular drinks take {} hour(s) {} minute(s))".format(
-                    quality_hour, quality_minute, regular_hour, regular_minute
+                self.client.post(member, 
+                "Would you like to make higher quality{} drinks? These will take {} hour(s) {} minute(s). (Regular drinks take {} hour(s) {} minute(s))".format(
+                    "" if drink_type == "regular" else " mixed", quality_hour, quality_minute, regular_hour, regular_minute
                 ))
                 confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
+                if confirmation is None: return await self._dialogue_expired(member)
 
                 if confirmation.content == "yes":
                     level = 1 # Quality
                     await self.client.send_typing(member)
-                    await self.client.send_message(member, "Quality set to high.")
-  
-            # Get max drink
-            if level == 1:
-                # Account for quality mixed
-                calculated_amounts = []
-                
-                # 1st Fruit
-                calculated_amounts.append(
-                    player.inventory[emojis[fruit1_res.reaction.emoji]] / self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][0]
-                )
-
-                # 2nd Fruit
-                calculated_amounts.append(
-                    player.inventory[emojis[fruit2_res.reaction.emoji]] / self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][1]
-                )
-                
-                max_drink = int(min(calculated_amounts))
-            else:
-                # Account for regular mixed
-                calculated_amounts = []
-                
-                # 1st Fruit
-                calculated_amounts.append(
-                    player.inventory[emojis[fruit1_res.reaction.emoji]] / self.game_data["juice_upgrades"]["mixed"]["fruit_req"][0]
-                )
-
-                # 2nd Fruit
-                calculated_amounts.append(
-                    player.inventory[emojis[fruit2_res.reaction.emoji]] / self.game_data["juice_upgrades"]["mixed"]["fruit_req"][1]
-                )
-                
-                max_drink = int(min(calculated_amounts))
+                    self.client.post(member, "Quality set to high.")
 
+            max_drink = self._max_drinks(player, fruits, level)
             if max_drink == 0:
                 await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "You do not have enough {} to refine.".format(emoji_res.reaction.emoji))
+                self.client.post(ctx.message.channel, "You do not have enough {} to refine.".format(" and ".join(EMOJI_OF[x] for x in fruits)))
                 return
-            
+
+            fruit_req = self._production_recipe(fruits, level)["fruit_req"]
             await self.client.send_typing(member)
-            msg = await self.client.send_message(member, "This will make {quality} {name} juice. The conversion rate is {rate}.\n"
+            self.client.post(member, "This will make {quality} {name} juice. The conversion rate is {rate}.\n"
                 "You can produce a max of {max} {quality} {name} juice. Type `all` to produce this many, or enter a specific number.".format(
-                    quality = "regular mixed" if level == 0 else "quality mixed",
-                    name = emojis[fruit1_res.reaction.emoji] + " " + emojis[fruit2_res.reaction.emoji],
-                    rate = "{}x{} + {}x{} =\U0001F943x1".format(
-                        fruit1_res.reaction.emoji,
-                        self.game_data["juice_upgrades"]["mixed"]["fruit_req"][0] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][0],
-                        fruit2_res.reaction.emoji,
-                        self.game_data["juice_upgrades"]["mixed"]["fruit_req"][1] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][1]),
+                    quality = self._production_label(fruits, level).lower(),
+                    name = " ".join(fruits),
+                    rate = " + ".join("{}x{}".format(EMOJI_OF[x], fruit_req[i]) for i, x in enumerate(fruits)) + "=\U0001F943x1",
                     max = max_drink
                 ))
             quantity_res = await self.client.wait_for_message(check=production_check, author=member, channel=await self.client.start_private_message(member))
+            if quantity_res is None: return await self._dialogue_expired(member)
 
             if quantity_res.content == "all":
                 quantity = max_drink
             else:
                 quantity = int(quantity_res.content)
 
-            production = {
-                "time": self.game_data["juice_upgrades"]["mixed"]["refine_time"] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["refine_time"],
-                "fruit_type": [emojis[fruit1_res.reaction.emoji], emojis[fruit2_res.reaction.emoji]],
-                "drink_quantity": quantity,
-                "fruit_cost": (
-                    (self.game_data["juice_upgrades"]["mixed"]["fruit_req"][0] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][0]) * quantity,
-                    (self.game_data["juice_upgrades"]["mixed"]["fruit_req"][1] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["fruit_req"][1]) * quantity
-                ),
-                "unit_sell_price": self.game_data["juice_upgrades"]["mixed"]["item_price"] if level == 0 else self.game_data["juice_upgrades"]["quality_mixed"]["item_price"]
-            }
-
-            # Final confirmation check
-            embed = copy.deepcopy(self.embeds["production_confirmation"])
-            embed["fields"][0]["value"] = embed["fields"][0]["value"].format(fruit1_res.reaction.emoji+fruit2_res.reaction.emoji)
-            embed["fields"][1]["value"] = embed["fields"][1]["value"].format("Regular mixed" if level == 0 else "Quality mixed")
-            embed["fields"][2]["value"] = embed["fields"][2]["value"].format(production["unit_sell_price"] * production["drink_quantity"])
-            embed["fields"][3]["value"] = embed["fields"][3]["value"].format(
-                fruit1_res.reaction.emoji, 
-                "{}\n{}x{}".format(
-                    production["fruit_cost"][0],
-                    fruit2_res.reaction.emoji,
-                    production["fruit_cost"][1]
-                )
-            )
-            
-            hours, minutes = divmod((production["time"] // 60), 60)
-            embed["fields"][4]["value"] = embed["fields"][4]["value"].format(hours, minutes)
-
-            await self.client.send_typing(member)
-            await self.client.send_message(member, embed=discord.Embed().from_data(embed))
-            await self.client.send_message(member, "Would you like to start production?")
+        production = self._build_production(fruits, level, quantity)
+
+        # Final confirmation check
+        hours, minutes = divmod((production["time"] // 60), 60)
+        embed = self.templates["production_confirmation"].render({
+            "fields.0.value": "".join(EMOJI_OF[x] for x in fruits),
+            "fields.1.value": self._production_label(fruits, level),
+            "fields.2.value": production["unit_sell_price"] * production["drink_quantity"],
+            "fields.3.value": (
+                EMOJI_OF[fruits[0]],
+                "\n".join([str(production["fruit_cost"][0])] + [
+                    "{}x{}".format(EMOJI_OF[x], production["fruit_cost"][i]) for i, x in enumerate(fruits) if i > 0
+                ])
+            ),
+            "fields.4.value": (hours, minutes)
+        })
+
+        await self.client.send_typing(member)
+        self.client.post(member, embed=discord.Embed().from_data(embed))
+        if not confirmed:
+            self.client.post(member, "Would you like to start production?")
             confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
+            if confirmation is None: return await self._dialogue_expired(member)
 
-            if confirmation.content == "yes":
-                await self.client.send_typing(member)
-                await self.client.send_message(member, "Production started.")
-            else:
+            if not confirmation.content == "yes":
                 await self.client.send_typing(member)
-                await self.client.send_message(member, "Production canceled.")
+                self.client.post(member, "Production canceled.")
                 return
 
-        # By this line production (dict) should be defined
-        
-        # Sleep for time
-        # await asyncio.sleep(production["time"]) # Actual command
-        await asyncio.sleep(5) # For demonstration
-        
-        # Send message
-        await self.client.send_message(member, "Your production request has finished. This has netted you :moneybag:x{}".format(
-            production["unit_sell_price"] * production["drink_quantity"]
-        ))
-        # Update user profile
-        for i, x in enumerate(production["fruit_type"]):
-            player.inventory[x] -= production["fruit_cost"][i]
-        player.money += production["unit_sell_price"] * production["drink_quantity"]
+        async with self.locks.hold(member.id):
+            # Reload the player, it could have been dropped from the cache during the dialogue
+            player = await self.get_player(member.id)
+            if player is None: return
 
-        player.save()
+            # Ensure the player still has the fruit (it could have been sold or traded during the dialogue)
+            for i, x in enumerate(production["fruit_type"]):
+                if player.inventory[x] < production["fruit_cost"][i]:
+                    self.client.post(member, "You no longer have enough :{}: for this. Production canceled.".format(self._convert_short_text(x)))
+                    return
+
+            # Use up the fruit now, the scheduler credits the money once production finishes
+            for i, x in enumerate(production["fruit_type"]):
+                player.inventory[x] -= production["fruit_cost"][i]
+            self.save_player(player, "produce")
+
+            self.production.schedule(
+                player.id, production["time"],
+                production["unit_sell_price"] * production["drink_quantity"],
+                production["description"]
+            )
+
+        await self.client.send_typing(member)
+        self.client.post(member, "Production started.")
+
+    def _has_quality(self, player, drink_type):
+        # Quality drinks unlock at farm level 2, quality mixed at level 4
+        return player.farm_level > (1 if drink_type == "regular" else 3)
+
+    def _production_recipe(self, fruits, level):
+        """The juice_upgrades entry for a drink made from fruits at level (0 regular, 1 quality)."""
+        return self.ruleset.recipes[(len(fruits), level)]
+
+    def _production_label(self, fruits, level):
+        return ("Regular", "Quality")[level] + ("" if len(fruits) == 1 else " mixed")
+
+    def _max_drinks(self, player, fruits, level):
+        fruit_req = self._production_recipe(fruits, level)["fruit_req"]
+        return int(min(player.inventory[x] / fruit_req[i] for i, x in enumerate(fruits)))
+
+    def _build_production(self, fruits, level, quantity):
+        recipe = self._production_recipe(fruits, level)
+        return {
+            "description": "{} {} juice".format(self._production_label(fruits, level).lower(), " ".join(fruits)),
+            "time": recipe["refine_time"],
+            "fruit_type": list(fruits),
+            "drink_quantity": quantity,
+            "fruit_cost": tuple(recipe["fruit_req"][i] * quantity for i in range(len(fruits))),
+            "unit_sell_price": recipe["item_price"]
+        }
         
-    async def sell(self, ctx, type_amount):
+    async def sell(self, ctx, *type_amounts):
         member = ctx.message.author
 
-        if type_amount is None:
+        if not type_amounts:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a type and an amount.")
+            self.client.post(ctx.message.channel, "Please enter a type and an amount.")
             return
 
         if not await self.is_player(member): return
 
         player = await self.get_player(member.id)
-        
-        emojis = {"\U0001F34E": "apple", "\U0001F34C": "banana", "\U0001F347": "grape"}
-        string_list = type_amount.split("x")
-            
-        # Ensure there is an emoji passed
-        if emojis.get(string_list[0]) is None:
-            # Create error
-            print("Incorrect stuff")
-            return
 
-        # Ensure the amount is an int and is not less than 1
+        # e.g. sell 🍎xall 🍌x200, a trailing yes skips the confirmation
+        type_amounts, confirmed = split_confirmation(type_amounts)
         try:
-            quantity = int(string_list[1])
-
-            if quantity < 1:
-                raise ValueError
-        except ValueError:
+            items = [parse_item(x, allowed=self.game_data["fruits"], allow_all=True) for x in type_amounts]
+            if not items:
+                raise ArgumentError("Please enter a type and an amount.")
+        except ArgumentError as e:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a correct number.")
+            self.client.post(ctx.message.channel, str(e))
+            return
+
+        quantities = {}
+        for fruit, amount in items:
+            quantities[fruit] = player.inventory[fruit] if amount == "all" else quantities.get(fruit, 0) + amount
 
         # Ensure the player has the amount they want to sell
-        if not quantity <= player.inventory[emojis.get(string_list[0])]:
-            await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "You do not have enough {}.".format(string_list[0]))
-            return
+        for fruit, quantity in quantities.items():
+            if not 0 < quantity <= player.inventory[fruit]:
+                await self.client.send_typing(ctx.message.channel)
+                self.client.post(ctx.message.channel, "You do not have enough {}.".format(EMOJI_OF[fruit]))
+                return
 
         # Calculate profit
-        profit = quantity * self.game_data["fruit_price"]
+        profit = sum(quantities.values()) * self.game_data["fruit_price"]
         profit = int(profit)
+        sold = ", ".join("{}x{}".format(EMOJI_OF[x], y) for x, y in quantities.items())
 
         # Confirm with the user
-        await self.client.send_typing(ctx.message.channel)
-        await self.client.send_message(ctx.message.channel, "This will net you :moneybag:x{}".format(profit))
+        if not confirmed:
+            await self.client.send_typing(ctx.message.channel)
+            self.client.post(ctx.message.channel, "This will net you :moneybag:x{}".format(profit))
 
-        await self.client.send_message(member, "Would you like to sell?")
-        confirmation_check = lambda msg: True if msg.content.lower() in ['yes', 'no'] else False
-        confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=ctx.message.channel)
+            self.client.post(member, "Would you like to sell?")
+            confirmation_check = lambda msg: True if msg.content.lower() in ['yes', 'no'] else False
+            confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=ctx.message.channel)
+            if confirmation is None: return await self._dialogue_expired(member)
 
-        if confirmation.content == "yes":
-            await self.client.send_message(ctx.message.channel, "You gained :moneybag:x{} for selling {}x{}".format(
-                profit, string_list[0], quantity
-            ))
-        else:
-            await self.client.send_message(ctx.message.channel, "Selling canceled :wastebasket:")
-            return
-        
-        player.money += profit
-        player.inventory[emojis.get(string_list[0])] -= quantity
-        player.save()
+            if not confirmation.content == "yes":
+                self.client.post(ctx.message.channel, "Selling canceled :wastebasket:")
+                return
+
+        async with self.locks.hold(member.id):
+            # Reload the player, it could have been dropped from the cache while waiting
+            player = await self.get_player(member.id)
+            if player is None: return
+
+            # The fruit could have been used elsewhere while waiting
+            if any(player.inventory[x] < y for x, y in quantities.items()):
+                self.client.post(ctx.message.channel, "You no longer have enough fruit for this. Selling canceled :wastebasket:")
+                return
+
+            player.money += profit
+            for fruit, quantity in quantities.items():
+                player.inventory[fruit] -= quantity
+            self.save_player(player, "sell")
+
+        self.client.post(ctx.message.channel, "You gained :moneybag:x{} for selling {}".format(profit, sold))
     
-    async def send_trade(self, ctx, recipient_id, request, offer):
+    async def send_trade(self, ctx, recipient_id, request, offer, confirm=None):
         # Ensure recipient isn't blank
         if recipient_id is None: 
-            await self.client.send_message(ctx.message.channel, "Please @ a player to send the trade to.")
+            self.client.post(ctx.message.channel, "Please @ a player to send the trade to.")
             return
 
         # Get both member objects
         member = ctx.message.author
-        recipient_id = recipient_id[2:-1]
+        recipient_id = parse_mention(recipient_id)
         recipient = None
 
         # Ensure recipient isn't self
         if member.id == recipient_id:
-            await self.client.send_message(ctx.message.channel, "You cannot trade with yourself.")
+            self.client.post(ctx.message.channel, "You cannot trade with yourself.")
             return
 
-        for x in self.client.get_all_members():
-            if x.id == recipient_id:
-                recipient = x
-                break
+        recipient = self.client.member_directory.get(recipient_id)
 
         if recipient is None:
-            await self.client.send_message(ctx.message.channel, content="Cannot find player.")
+            self.client.post(ctx.message.channel, content="Cannot find player.")
+            return
 
         # Ensure both members are part of the game
         if not await self.is_player(member): return
@@ -577,7 +924,7 @@ class GameManager:
                 recipient_slot = c
                 break
         else:
-            await self.client.send_message(ctx.message.channel, "That player cannot recieve any more trade offers.")
+            self.client.post(ctx.message.channel, "That player cannot recieve any more trade offers.")
             return
 
         for c, x in enumerate(sender_player.out_trade):
@@ -585,26 +932,21 @@ class GameManager:
                 sender_slot = c
                 break
         else:
-            await self.client.send_message(ctx.message.channel, "You cannot send any more trade offers.")
+            self.client.post(ctx.message.channel, "You cannot send any more trade offers.")
             return
         
         # Parse and/or aquire the arguments
+        confirmed = False
         if request is not None and offer is not None:
-            # Parse the arguments from single line command
-            # TODO: Add this
-
-            # Request
-            request_list = request.split("x")
-            
-            if emojis.get(request_list[0]) is None:
-                # Create error
-                print("error")
-                return None
-
-            # Offer
-            offer_list = offer.replace(" ", "").split("x")
-
-            print(request_list, emojis.get(request_list[0]), request_list[1])
+            # Parse the arguments from single line command, e.g. trade @user 🍎x100 💰x50
+            arguments, confirmed = split_confirmation((request, offer, confirm))
+            try:
+                if len(arguments) != 2:
+                    raise ArgumentError("Please enter what you are requesting and offering, e.g. \U0001F34Ex100 \U0001F4B0x50.")
+                request, offer = (parse_item(x) for x in arguments)
+            except ArgumentError as e:
+                self.client.post(ctx.message.channel, str(e))
+                return
 
         else:
             # Get arguemnts from Trade dialogue
@@ -620,9 +962,11 @@ class GameManager:
             msg = await self.client.send_message(member, "What are you requesting?")
             await self.client.add_reactions(msg, emojis.keys())
             emoji_res = await self.client.wait_for_reaction(emoji=list(emojis.keys()), message=msg, user=member)
+            if emoji_res is None: return await self._dialogue_expired(member)
 
-            msg = await self.client.send_message(member, "How many {} are you requesting?".format(emoji_res.reaction.emoji))
+            self.client.post(member, "How many {} are you requesting?".format(emoji_res.reaction.emoji))
             quantity_res = await self.client.wait_for_message(check=is_positive_int, author=member, channel=await self.client.start_private_message(member))
+            if quantity_res is None: return await self._dialogue_expired(member)
 
             request = (emojis[emoji_res.reaction.emoji], int(quantity_res.content))
 
@@ -630,21 +974,18 @@ class GameManager:
             msg = await self.client.send_message(member, "What are you offering?")
             await self.client.add_reactions(msg, emojis.keys())
             emoji_res = await self.client.wait_for_reaction(emoji=list(emojis.keys()), message=msg, user=member)
+            if emoji_res is None: return await self._dialogue_expired(member)
 
-            msg = await self.client.send_message(member, "How many {} are you offering?".format(emoji_res.reaction.emoji))
+            self.client.post(member, "How many {} are you offering?".format(emoji_res.reaction.emoji))
             quantity_res = await self.client.wait_for_message(check=is_positive_int, author=member, channel=await self.client.start_private_message(member))
+            if quantity_res is None: return await self._dialogue_expired(member)
 
             offer = (emojis[emoji_res.reaction.emoji], int(quantity_res.content))
 
-            # Check if player has what they offered
-            if offer[0] == "money":
-                if not sender_player.money >= offer[1]:
-                    await self.client.send_message(member, "You do not have :moneybag:x{}. The trade has been canceled.".format(offer[1]))
-                    return
-            else:
-                if not sender_player.inventory[offer[0]] >= offer[1]:
-                    await self.client.send_message(member, "You do not have {}x{}. The trade has been canceled.".format(emoji_res.reaction.emoji, offer[1]))
-                    return
+        # Check if player has what they offered
+        if not self._has_offer(sender_player, offer):
+            self.client.post(member, "You do not have {}x{}. The trade has been canceled.".format(EMOJI_OF[offer[0]], offer[1]))
+            return
 
         # Create trade
         sender_details = (member, member.name, sender_slot)
@@ -653,48 +994,58 @@ class GameManager:
         trade = Trade(sender=sender_details, recipient=recipient_details, request=request, offer=offer)
 
         # Confirmation
-        confirmation_trade_embed = trade.create_confirmation_embed(self.embeds["trade_confirmation"], )
-        await self.client.send_message(member, embed=confirmation_trade_embed)
+        confirmation_trade_embed = trade.create_confirmation_embed(self.templates["trade_confirmation"])
+        self.client.post(member, embed=confirmation_trade_embed)
         
-        await self.client.send_message(member, "Is this trade correct?")
-        confirmation_check = lambda msg: True if msg.content.lower() in ['yes', 'no'] else False
-        confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
+        if not confirmed:
+            self.client.post(member, "Is this trade correct?")
+            confirmation_check = lambda msg: True if msg.content.lower() in ['yes', 'no'] else False
+            confirmation = await self.client.wait_for_message(check=confirmation_check, author=member, channel=await self.client.start_private_message(member))
+            if confirmation is None: return await self._dialogue_expired(member)
 
-        if confirmation.content == "yes":
-            await self.client.send_message(member, "Trade sent :incoming_envelope:")
-        else:
-            await self.client.send_message(member, "Trade canceled :wastebasket:")
+            if not confirmation.content == "yes":
+                self.client.post(member, "Trade canceled :wastebasket:")
+                return
+
+        try:
+            async with self.transaction(member.id, recipient.id, action="trade") as (sender_player, recipient_player):
+                # Slots and the offer could have been used while waiting
+                if (sender_player is None or recipient_player is None or recipient_player.in_trade[recipient_slot] != 0
+                        or sender_player.out_trade[sender_slot] != 0 or not self._has_offer(sender_player, offer)):
+                    self.client.post(member, "This trade can no longer be sent. Trade canceled :wastebasket:")
+                    return
+
+                # Remove offer from sender's inventory to prevent overdrawing from inventory
+                if offer[0] == "money":
+                    sender_player.money -= offer[1]
+                else:
+                    sender_player.inventory[offer[0]] -= offer[1]
+
+                # Add to players trade slots
+                # Recipient Incoming (holds Trade object)
+                recipient_player.in_trade[recipient_slot] = trade
+
+                # Sender Outgoing (only holds details)
+                sender_player.out_trade[sender_slot] = OutgoingTrade(recipient.name, recipient.id, request, offer)
+        except TransactionError:
+            self.client.post(member, "The trade could not be saved, nothing was changed. Please try again.")
             return
 
-        # Remove offer from sender's inventory to prevent overdrawing from inventory
-        if offer[0] == "money":
-            sender_player.money -= offer[1]
-        else:
-            sender_player.inventory[offer[0]] -= offer[1]
-
-        # Add to players trade slots
-        # Recipient Incoming (holds Trade object)
-        recipient_player.in_trade[recipient_slot] = trade
-
-        # Sender Outgoing (only holds details)
-        sender_player.out_trade[sender_slot] = {
-            "recipient_name": recipient.name,
-            "recipient_id": recipient.id,
-            "request": request,
-            "offer": offer
-        }
+        self.client.post(member, "Trade sent :incoming_envelope:")
 
         # Recipient Incoming Trade Embed
-        incoming_trade_embed = trade.create_incoming_embed(self.embeds["trade_incoming"])
+        incoming_trade_embed = trade.create_incoming_embed(self.templates["trade_incoming"])
 
-        await self.client.send_message(recipient, embed=incoming_trade_embed)
-        await self.client.send_message(recipient, 
+        self.client.post(recipient, embed=incoming_trade_embed)
+        self.client.post(recipient, 
         "Accept with `{command_prefix}accept {trade_slot}` or decline with `{command_prefix}decline {trade_slot}`".format(
             command_prefix = self.client.command_prefix, trade_slot = (recipient_slot+1)
         ))
-
-        recipient_player.save()
-        sender_player.save()
+    
+    def _has_offer(self, player, offer):
+        if offer[0] == "money":
+            return player.money >= offer[1]
+        return player.inventory[offer[0]] >= offer[1]
     
     async def accept_trade(self, ctx, trade_slot):
         # Load players into variables
@@ -703,7 +1054,7 @@ class GameManager:
 
         if trade_slot is None:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a trade slot.")
+            self.client.post(ctx.message.channel, "Please enter a trade slot.")
             return
         
         if not await self.is_player(recipient_member): return
@@ -711,60 +1062,69 @@ class GameManager:
         try:
             trade_slot = int(trade_slot)
         except ValueError:
-            await self.client.send_message(ctx.message.channel, "Please select a trade slot between 1-4.")
+            self.client.post(ctx.message.channel, "Please select a trade slot between 1-4.")
         
         if not await self._within_slot_boundaries(trade_slot, recipient_member): return
 
         recipient_player = await self.get_player(recipient_member.id)
-        sender_player = None
 
         # Ensure trade exists in slot
         trade_slot = trade_slot-1
         if not isinstance(recipient_player.in_trade[trade_slot], Trade):
-            await self.client.send_message(recipient_member, "This slot does not contain an incoming trade.")
+            self.client.post(recipient_member, "This slot does not contain an incoming trade.")
             return
         else:
             trade = recipient_player.in_trade[trade_slot]
 
-        # Ensure recipient has request
-        if trade.request[0] == "money":
-            if not recipient_player.money >= trade.request[1]:
-                await self.client.send_message(recipient_member, "You do not have {}x{}.".format(
-                    ":moneybag:", trade.request[1]
-                ))
-                return
-        else:
-            if not recipient_player.inventory[trade.request[0]] >= trade.request[1]:
-                await self.client.send_message(recipient_member, "You do not have {}x{}.".format(
-                    ":{}:".format(self._convert_short_text(trade.request[0])), trade.request[1]
-                ))
-                return
-        
         # Get sender member
-        for x in self.client.get_all_members():
-            if trade.sender == x.id:
-                sender_member = x
-        
-        sender_player = await self.get_player(sender_member.id)
+        sender_member = self.client.member_directory.get(trade.sender_id)
+        if sender_member is None:
+            self.client.post(recipient_member, "The sender of this trade could not be found.")
+            return
 
-        # Remove trades from both players boxes
-        recipient_player.in_trade[trade_slot] = 0
-        sender_player.out_trade[trade.sender_slot] = 0
-                
-        # Update player inventories
-        # Offer
-        if trade.offer[0] == "money":
-            recipient_player.money += trade.offer[1]
-        else:
-            recipient_player.inventory[trade.offer[0]] += trade.offer[1]
+        try:
+            async with self.transaction(recipient_member.id, sender_member.id, action="accept") as (recipient_player, sender_player):
+                # The trade could have been answered while waiting for the lock
+                trade = recipient_player.in_trade[trade_slot]
+                if not isinstance(trade, Trade) or trade.sender_id != sender_member.id or sender_player is None:
+                    self.client.post(recipient_member, "This slot does not contain an incoming trade.")
+                    return
 
-        # Request
-        if trade.request[0] == "money":
-            sender_player.money += trade.request[1]
-            recipient_player.money -= trade.request[1]
-        else:
-            sender_player.inventory[trade.request[0]] += trade.request[1]
-            recipient_player.inventory[trade.request[0]] -= trade.request[1]
+                # Ensure recipient has request
+                if trade.request[0] == "money":
+                    if not recipient_player.money >= trade.request[1]:
+                        self.client.post(recipient_member, "You do not have {}x{}.".format(
+                            ":moneybag:", trade.request[1]
+                        ))
+                        return
+                else:
+                    if not recipient_player.inventory[trade.request[0]] >= trade.request[1]:
+                        self.client.post(recipient_member, "You do not have {}x{}.".format(
+                            ":{}:".format(self._convert_short_text(trade.request[0])), trade.request[1]
+                        ))
+                        return
+
+                # Remove trades from both players boxes
+                recipient_player.in_trade[trade_slot] = 0
+                sender_player.out_trade[trade.sender_slot] = 0
+                    
+                # Update player inventories
+                # Offer
+                if trade.offer[0] == "money":
+                    recipient_player.money += trade.offer[1]
+                else:
+                    recipient_player.inventory[trade.offer[0]] += trade.offer[1]
+
+                # Request
+                if trade.request[0] == "money":
+                    sender_player.money += trade.request[1]
+                    recipient_player.money -= trade.request[1]
+                else:
+                    sender_player.inventory[trade.request[0]] += trade.request[1]
+                    recipient_player.inventory[trade.request[0]] -= trade.request[1]
+        except TransactionError:
+            self.client.post(recipient_member, "The trade could not be saved, nothing was changed. Please try again.")
+            return
 
         # Send message
         trade_message = "{}x{} for {}x{}.".format(
@@ -772,17 +1132,13 @@ class GameManager:
             ":{}:".format(self._convert_short_text(trade.offer[0])), trade.offer[1]
         )
         
-        await self.client.send_message(recipient_member, "You accepted {}'s trade request: {}".format(
+        self.client.post(recipient_member, "You accepted {}'s trade request: {}".format(
             sender_member.name, trade_message
         ))
         
-        await self.client.send_message(sender_member, "{} has accepted your trade request: {}".format(
+        self.client.post(sender_member, "{} has accepted your trade request: {}".format(
             recipient_member.name, trade_message))
 
-        # Save players
-        recipient_player.save()
-        sender_player.save()
-
     async def decline_trade(self, ctx, trade_slot):
         # Load players into variables
         recipient_member = ctx.message.author
@@ -790,7 +1146,7 @@ class GameManager:
         
         if trade_slot is None:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a trade slot.")
+            self.client.post(ctx.message.channel, "Please enter a trade slot.")
             return
 
         if not await self.is_player(recipient_member): return
@@ -798,37 +1154,46 @@ class GameManager:
         try:
             trade_slot = int(trade_slot)
         except ValueError:
-            await self.client.send_message(ctx.message.channel, "Please select a trade slot between 1-4.")
+            self.client.post(ctx.message.channel, "Please select a trade slot between 1-4.")
         
         if not await self._within_slot_boundaries(trade_slot, recipient_member): return
 
         recipient_player = await self.get_player(recipient_member.id)
-        sender_player = None
 
         # Ensure trade exists in slot
         trade_slot = trade_slot-1
         if not isinstance(recipient_player.in_trade[trade_slot], Trade):
-            await self.client.send_message(recipient_member, content="This slot does not contain an incoming trade.")
+            self.client.post(recipient_member, content="This slot does not contain an incoming trade.")
             return
         else:
             trade = recipient_player.in_trade[trade_slot]
 
         # Get sender member
-        for x in self.client.get_all_members():
-            if trade.sender == x.id:
-                sender_member = x
-        
-        sender_player = await self.get_player(sender_member.id)
+        sender_member = self.client.member_directory.get(trade.sender_id)
+        if sender_member is None:
+            self.client.post(recipient_member, "The sender of this trade could not be found.")
+            return
 
-        # Remove trades from both players boxes
-        recipient_player.in_trade[trade_slot] = 0
-        sender_player.out_trade[trade.sender_slot] = 0
-        
-        # Refund sender
-        if trade.offer[0] == "money":
-            sender_player.money += trade.offer[1]
-        else:
-            sender_player.inventory[trade.offer[0]] += trade.offer[1]
+        try:
+            async with self.transaction(recipient_member.id, sender_member.id, action="decline") as (recipient_player, sender_player):
+                # The trade could have been answered while waiting for the lock
+                trade = recipient_player.in_trade[trade_slot]
+                if not isinstance(trade, Trade) or trade.sender_id != sender_member.id or sender_player is None:
+                    self.client.post(recipient_member, content="This slot does not contain an incoming trade.")
+                    return
+
+                # Remove trades from both players boxes
+                recipient_player.in_trade[trade_slot] = 0
+                sender_player.out_trade[trade.sender_slot] = 0
+            
+                # Refund sender
+                if trade.offer[0] == "money":
+                    sender_player.money += trade.offer[1]
+                else:
+                    sender_player.inventory[trade.offer[0]] += trade.offer[1]
+        except TransactionError:
+            self.client.post(recipient_member, "The trade could not be saved, nothing was changed. Please try again.")
+            return
 
         # Send message
         trade_message = "{}x{} for {}x{}.".format(
@@ -836,17 +1201,13 @@ class GameManager:
             ":{}:".format(self._convert_short_text(trade.offer[0])), trade.offer[1]
         )
         
-        await self.client.send_message(recipient_member, "You declined {}'s trade request: {}".format(
+        self.client.post(recipient_member, "You declined {}'s trade request: {}".format(
             sender_member.name, trade_message
         ))
         
-        await self.client.send_message(sender_member, "{} has declined your trade request: {}".format(
+        self.client.post(sender_member, "{} has declined your trade request: {}".format(
             recipient_member.name, trade_message))
 
-        # Save players
-        recipient_player.save()
-        sender_player.save()
-
     async def get_profile(self, ctx):
         # Get (discord) member object from context
         member = ctx.message.author 
@@ -859,93 +1220,96 @@ class GameManager:
         # Format profile
         thumbnail = member.avatar_url if not member.avatar_url == "" else member.default_avatar_url
         profile_embed = player.create_profile_embed(
-            (copy.deepcopy(self.embeds["profile"]), copy.deepcopy(self.embeds["profile_trades"])),
+            (self.templates["profile"], self.templates["profile_trades"]),
             member.name, thumbnail
         )
         
         # Send embed
         await self.client.send_typing(ctx.message.channel)
-        await self.client.send_message(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
+        self.client.post(ctx.message.channel, "<@{}>, check your DMs. :incoming_envelope:".format(member.id))
         for x in profile_embed:
-            await self.client.send_message(member, content=None, embed=x)
+            self.client.post(member, content=None, embed=x)
     
-    async def upgrade(self, ctx, stat):
+    async def upgrade(self, ctx, stat, amount=None):
         # Get (discord) member object from context
         member = ctx.message.author
         
         if stat is None:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a stat you want to upgrade.")
+            self.client.post(ctx.message.channel, "Please enter a stat you want to upgrade.")
+            return
         
         stat = stat.lower()
 
         # Ensure the user has already joined
         if not await self.is_player(member): return
         
-        # Load player
-        player = await self.get_player(member.id)
-
-        if not stat in ["size", "multiplier", "farm"]:
-            await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, "Please enter a correct stat. See help or shop for details.")
-            return
-
-        # Upgrade stat
-        if stat == "size":
-            # Check if player has money
-            cost = player.calculate_upgrade("size")
+        async with self.locks.hold(member.id):
+            # Load player
+            player = await self.get_player(member.id)
 
-            if not cost <= player.money:
+            if not stat in ["size", "multiplier", "farm"]:
                 await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "You do not have enough money")
+                self.client.post(ctx.message.channel, "Please enter a correct stat. See help or shop for details.")
                 return
 
-            # Change variables in player
-            prior_yield = player.upgrades["size"]
-            player.upgrades["size"] = player.calculate_upgrade("size", price=False)
-            player.money -= player.calculate_upgrade("size")
-            player.upgrade_levels["size"] += 1
-            
-            
-            await self.client.send_message(member, "Farm size was upgraded from {} yield to {} yield.".format(prior_yield, player.upgrades["size"]))
+            # Upgrade stat
+            if stat in ["size", "multiplier"]:
+                curve = CURVES[stat]
+                level = player.upgrade_levels[stat]
+
+                # Amount of levels to buy: 1, a number or "max"
+                if amount is None:
+                    count = 1
+                elif amount.lower() == "max":
+                    count = max(1, curve.max_affordable(level, player.money))
+                elif amount.isdigit() and int(amount) > 0:
+                    count = int(amount)
+                else:
+                    await self.client.send_typing(ctx.message.channel)
+                    self.client.post(ctx.message.channel, "Please enter a positive amount of levels, or max.")
+                    return
 
-        elif stat == "multiplier":
-            # Check if player has money
-            cost = player.calculate_upgrade("multiplier")
-            
-            if not cost <= player.money:
-                await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "You do not have enough money.")
-                return
-            
-            # Change variables in player
-            prior_yield = player.upgrades["multiplier"]
-            player.upgrades["multiplier"] = player.calculate_upgrade("multiplier", price=False)
-            player.money -= player.calculate_upgrade("multiplier")
-            player.upgrade_levels["multiplier"] += 1
+                # Check if player has money
+                cost = curve.cost(level, count)
+
+                if not cost <= player.money:
+                    await self.client.send_typing(ctx.message.channel)
+                    self.client.post(ctx.message.channel, "You do not have enough money.")
+                    return
 
-            await self.client.send_message(ctx.message.channel, "Multiplier was upgraded from x{} to x{}.".format(prior_yield, player.upgrades["multiplier"]))
+                # Change variables in player
+                prior_yield = player.upgrades[stat]
+                player.upgrades[stat] = curve.value(level + count)
+                player.money -= cost
+                player.upgrade_levels[stat] += count
+
+                levels = "" if count == 1 else " ({} levels for :moneybag:x{})".format(count, cost)
+                if stat == "size":
+                    self.client.post(member, "Farm size was upgraded from {} yield to {} yield.{}".format(prior_yield, player.upgrades["size"], levels))
+                else:
+                    self.client.post(ctx.message.channel, "Multiplier was upgraded from x{} to x{}.{}".format(prior_yield, player.upgrades["multiplier"], levels))
         
-        else:
-            if player.farm_level == 4:
-                await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "Farm Utilites cannot be leveled any higher.")
-                return
+            else:
+                if player.farm_level == 4:
+                    await self.client.send_typing(ctx.message.channel)
+                    self.client.post(ctx.message.channel, "Farm Utilites cannot be leveled any higher.")
+                    return
             
-            juice_upgrades_name = self.game_data["juice_upgrades"]["id_to_name"][str(player.farm_level+1)]
+                juice_upgrades_name = self.game_data["juice_upgrades"]["id_to_name"][str(player.farm_level+1)]
 
-            if not self.game_data["juice_upgrades"][juice_upgrades_name]["unlock_price"] <= player.money:
-                await self.client.send_typing(ctx.message.channel)
-                await self.client.send_message(ctx.message.channel, "You do not have enough money.")
-                return
+                if not self.game_data["juice_upgrades"][juice_upgrades_name]["unlock_price"] <= player.money:
+                    await self.client.send_typing(ctx.message.channel)
+                    self.client.post(ctx.message.channel, "You do not have enough money.")
+                    return
             
-            player.farm_level += 1
-            player.upgrades["farm"].append(self.game_data["juice_upgrades"][juice_upgrades_name]["name"])
-            player.money -= self.game_data["juice_upgrades"][juice_upgrades_name]["unlock_price"]
+                player.farm_level += 1
+                player.upgrades["farm"].append(self.game_data["juice_upgrades"][juice_upgrades_name]["name"])
+                player.money -= self.game_data["juice_upgrades"][juice_upgrades_name]["unlock_price"]
 
-            await self.client.send_message(ctx.message.channel, "Farm Utilities was upgraded from level {} to level {}.".format(player.farm_level-1, player.farm_level))
+                self.client.post(ctx.message.channel, "Farm Utilities was upgraded from level {} to level {}.".format(player.farm_level-1, player.farm_level))
         
-        player.save()
+            self.save_player(player, "upgrade")
 
     async def get_shop(self, ctx):
         # Get (discord) member object from context
@@ -956,53 +1320,48 @@ class GameManager:
 
         player = await self.get_player(member.id)
         upgrades_embed = player.create_shop_embed(
-            copy.deepcopy(self.embeds["shop"]), member, self.client.command_prefix, self.game_data["juice_upgrades"]
+            self.templates["shop"], member, self.client.command_prefix, self.game_data["juice_upgrades"]
         )
 
         # Send embed
         await self.client.send_typing(ctx.message.channel)
         for x in upgrades_embed:
-            await self.client.send_message(member, content=None, embed=x)
+            self.client.post(member, content=None, embed=x)
         
     async def get_leaderboard(self, ctx=None, daily=False):
-        if ctx is not None and self.leaderboard_embed is not None:
-            await self.client.send_message(ctx.message.channel, embed=self.leaderboard_embed)
+        # Reuse the embed until someone's money changes
+        if ctx is not None and not daily and self.leaderboard_embed_version == self.leaderboard.version:
+            self.client.post(ctx.message.channel, embed=self.leaderboard_embed)
             return
         
-        # Generate leaderboard embed
-        # Load all player
+        # Generate leaderboard embed from the top 10 of the leaderboard index
+        top = self.leaderboard.top(10)
+
+        # Get discord.Member objects
         player_scores = []
-        
-        for x in self.players.list:
-            player = await self.get_player(x)
-            # Get discord.Member object
-            member = None
-            for x in self.client.get_all_members():
-                if x.id == player.id:
-                    member = x
-            score = (member, player.money)
-            player_scores.append(score)
-
-        player_scores = sorted(player_scores, key=lambda n: n[1], reverse=True)
+        for player_id, money in top:
+            member = self.client.member_directory.get(player_id)
+            # Players who are no longer in a server cannot be shown
+            if member is not None:
+                player_scores.append((member, money))
 
         # Create new/Overwrite self.leaderboard_embed
         leaderboard_embed = discord.Embed(title="Leaderboard", color=discord.Color(3060770))
         
         for c, x in enumerate(player_scores):
-            if c > 9:
-                break
             leaderboard_embed.add_field(name="({}) {}".format(c+1, x[0].name), value="Points: {}".format(x[1]))
 
         self.leaderboard_embed = leaderboard_embed
+        self.leaderboard_embed_version = self.leaderboard.version
         
         if ctx is not None:
             await self.client.send_typing(ctx.message.channel)
-            await self.client.send_message(ctx.message.channel, embed=leaderboard_embed)
+            self.client.post(ctx.message.channel, embed=leaderboard_embed)
         
         if daily:
             leaderboard_channel = self.client.get_channel(self.leaderboard_channel)
 
-            await self.client.send_message(leaderboard_channel, embed=discord.Embed(
+            self.client.post(leaderboard_channel, embed=discord.Embed(
                 title="Current Leaderboard", color=discord.Color(3060770), timestamp=datetime.datetime.now()))
 
             for c, x in enumerate(player_scores):
@@ -1013,9 +1372,9 @@ class GameManager:
                 thumbnail = x[0].avatar_url if not x[0].avatar_url == "" else x[0].default_avatar_url
                 embed.set_thumbnail(url=thumbnail)
                 embed.add_field(name="Points", value=x[1])
-                await self.client.send_message(leaderboard_channel, embed=embed)
+                self.client.post(leaderboard_channel, embed=embed)
 
-            await self.client.send_message(leaderboard_channel, embed=discord.Embed(
+            self.client.post(leaderboard_channel, embed=discord.Embed(
                 title="", color=discord.Color(3060770), description="Type `{}leaderboard` for the full leaderboard.".format(self.client.command_prefix)
             ))
       
@@ -1036,7 +1395,7 @@ class GameManager:
     async def _within_slot_boundaries(self, trade_slot, member):
         # Ensure trade slot is between 1-4
         if trade_slot>4 or trade_slot<1:
-            await self.client.send_message(member, content="Please select a trade slot between 1-4.")
+            self.client.post(member, content="Please select a trade slot between 1-4.")
             return False
         return True
 
@@ -1053,5 +1412,19 @@ class GameManager:
         # Start game stuff
         self.client.start_bot(self.config["credentials"]["token"])
 
+    def shutdown(self):
+        """Write back everything still held in memory before the process exits."""
+        # Queued async saves go first so they cannot overwrite the newer state below
+        self.storage.flush()
+        failures = self.cache.failures
+        written = self.cache.flush()
+        self.metrics.inc("player_saves_total", written)
+        if self.cache.failures == failures:
+            self.events.checkpoint()
+        self.events.close()
+        self.storage.close()
+        self.production.close()
+        log.info("Saved {} player(s) before shutdown".format(written))
+
 if __name__ == "__main__":
     GameManager().start_game()
@@ -0,0 +1,141 @@
+# Internal Python Moduels
+import time
+import heapq
+import asyncio
+import logging
+
+from .constants import HARVEST_COOLDOWN
+
+log = logging.getLogger("root")
+log.debug("harvestNotifier.py loaded")
+
+
+class HarvestNotifier:
+
+    def __init__(self, game, batch_size=50, batch_interval=1.0):
+        """DMs players who turned on notify once their fruit can be harvested.
+
+        Players are kept in a min-heap of (time ready, player id). A player's
+        entry is replaced whenever they are saved with a new last_harvest, the
+        old heap entry is skipped when it comes up (ready_at no longer matches).
+        One task sleeps until the earliest entry is due and sends the reminders
+        in batches.
+
+        Arguments:
+            game {GameManager} -- The game, for the client and member directory.
+
+        Keyword Arguments:
+            batch_size {int} -- Most reminders queued at once. (default: {50})
+            batch_interval {float} -- Seconds between batches. (default: {1.0})
+        """
+        self.game = game
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+
+        self.heap = [] # (ready time, player id)
+        self.ready_at = {} # player id -> ready time of their live heap entry
+        self.notified = {} # player id -> ready time they were already reminded about
+        self.wakeup = asyncio.Event()
+
+        # Counters
+        self.sent = 0
+
+    def __len__(self):
+        return len(self.ready_at)
+
+    # Schedule
+    # ---------------------------
+
+    def rebuild(self, entries):
+        """Replace every entry.
+
+        Arguments:
+            entries {iterable} -- (player id, last_harvest) of every player with notify on.
+        """
+        self.ready_at = {player_id: last_harvest + HARVEST_COOLDOWN for player_id, last_harvest in entries}
+        self.notified = {}
+        self.heap = [(ready, player_id) for player_id, ready in self.ready_at.items()]
+        heapq.heapify(self.heap)
+        self.wakeup.set()
+
+    def update(self, player):
+        """Schedule, move or remove the player's reminder after a save."""
+        if not player.notify:
+            self.cancel(player.id)
+            return
+
+        ready = player.last_harvest + HARVEST_COOLDOWN
+        if self.ready_at.get(player.id) == ready or self.notified.get(player.id) == ready:
+            return
+        self.notified.pop(player.id, None)
+        self.ready_at[player.id] = ready
+        heapq.heappush(self.heap, (ready, player.id))
+
+        # Wake the task up if this is now the earliest reminder
+        if self.heap[0][1] == player.id:
+            self.wakeup.set()
+
+    def cancel(self, player_id):
+        # The heap entry is dropped when it comes up
+        self.ready_at.pop(player_id, None)
+        self.notified.pop(player_id, None)
+
+    def due(self, now):
+        """Pop the players whose fruit is ready at now.
+
+        Returns:
+            list -- Player ids.
+        """
+        ready = []
+        while self.heap and self.heap[0][0] <= now:
+            when, player_id = heapq.heappop(self.heap)
+            if self.ready_at.get(player_id) == when:
+                del self.ready_at[player_id]
+                self.notified[player_id] = when
+                ready.append(player_id)
+        return ready
+
+    def next_due(self):
+        """Time of the earliest live entry, or None."""
+        while self.heap and self.ready_at.get(self.heap[0][1]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+        return self.heap[0][0] if self.heap else None
+
+    # Sending
+    # ---------------------------
+
+    async def run(self):
+        """Send reminders as they fall due. Runs until cancelled."""
+        while True:
+            self.wakeup.clear()
+            when = self.next_due()
+            delay = None if when is None else when - time.time()
+            if delay is None or delay > 0:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            ready = self.due(time.time())
+            for start in range(0, len(ready), self.batch_size):
+                if start:
+                    await asyncio.sleep(self.batch_interval)
+                self.notify(ready[start:start + self.batch_size])
+
+    def notify(self, player_ids):
+        for player_id in player_ids:
+            member = self.game.client.member_directory.get(player_id)
+            if member is None:
+                continue
+            self.game.client.post(member, "Your fruit is ready to harvest! :basket: (Turn these messages off with `{}notify off`)".format(
+                self.game.client.command_prefix
+            ))
+            self.sent += 1
+        log.debug("Sent {} harvest reminder(s)".format(len(player_ids)))
+
+    def stats(self):
+        return {
+            "waiting": len(self),
+            "sent": self.sent
+        }
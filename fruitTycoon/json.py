@@ -1,12 +1,30 @@
+import os
 import json
+import asyncio
+import tempfile
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
 log = logging.getLogger('root')
 
+# Dedicated, bounded pool for file I/O so a slow disk never blocks the event loop
+io_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="json-io")
+
+def run_io(func, *args):
+	"""Run a blocking function on the I/O pool and return an awaitable for its result."""
+	return asyncio.get_event_loop().run_in_executor(io_executor, func, *args)
+
 class Json:
 
-	def __init__(self, json_file, load=True):
+	def __init__(self, json_file, load=True, codec=None):
+		"""A file holding one JSON document.
+
+		Keyword Arguments:
+			load {bool} -- Parse the file straight away. (default: {True})
+			codec {Codec} -- Read and write the file with this codec instead of as JSON text (see codec.py). (default: {None})
+		"""
 		self.file = json_file
+		self.codec = codec
 		if load:
 			self.data = self.parse()
 		else:
@@ -14,6 +32,15 @@ class Json:
 
 	def parse(self):
 		"""Load and parse the JSON file"""
+		if self.codec is not None:
+			with open(self.file, 'rb') as f:
+				try:
+					data = self.codec.decode(f.read())
+				except Exception:
+					log.error("JSON: error loading {} as {}".format(self.file, self.codec.name))
+					data = {}
+			return data
+
 		with open(self.file, encoding='utf-8') as f:
 			try:
 				data = json.load(f)
@@ -37,14 +64,47 @@ class Json:
 		return data
 
 	def dump(self, data):
-		"""Save data to JSON file"""
-		with open(self.file, 'w', encoding='utf-8') as f:
-			try:
-				json.dump(data, f)
-			except Exception as e:
-				log.warning(e)
-				f.close()
-				return None
-			f.close()
+		"""Save data to JSON file
+
+		The data is written and fsynced to a temporary file which then replaces
+		the original, so a crash never leaves a half written file behind.
+		"""
+		fd, temp = tempfile.mkstemp(dir=os.path.dirname(self.file) or ".", suffix=".tmp")
+		try:
+			if self.codec is not None:
+				f = os.fdopen(fd, 'wb')
+			else:
+				f = os.fdopen(fd, 'w', encoding='utf-8')
+			with f:
+				if self.codec is not None:
+					f.write(self.codec.encode(data))
+				else:
+					json.dump(data, f)
+				f.flush()
+				os.fsync(f.fileno())
+			os.replace(temp, self.file)
+		except Exception as e:
+			log.warning(e)
+			if os.path.exists(temp):
+				os.remove(temp)
+			return None
 
 		return True
+
+	# Async
+	# ---------------------------
+
+	@classmethod
+	async def load_async(cls, json_file):
+		"""Create a Json object, parsing the file on the I/O pool"""
+		instance = cls(json_file, load=False)
+		instance.data = await instance.parse_async()
+		return instance
+
+	async def parse_async(self):
+		"""Load and parse the JSON file without blocking the event loop"""
+		return await run_io(self.parse)
+
+	async def dump_async(self, data):
+		"""Serialize and save data to the JSON file without blocking the event loop"""
+		return await run_io(self.dump, data)
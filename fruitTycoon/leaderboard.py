@@ -0,0 +1,72 @@
+# Internal Python Moduels
+import logging
+from bisect import bisect_left, insort
+
+log = logging.getLogger("root")
+log.debug("leaderboard.py loaded")
+
+class Leaderboard:
+
+    def __init__(self):
+        """Players ranked by money, updated whenever a player's money changes.
+
+        Rankings are kept in a sorted list of (-money, player_id) keys, so the
+        richest player is always first and ties are ordered by id.
+        """
+        self.keys = []
+        self.money = {} # player_id -> money
+
+        # Bumped on every change, lets callers cache anything built from the rankings
+        self.version = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    # Updates
+    # ---------------------------
+
+    def rebuild(self, scores):
+        """Replace every ranking.
+
+        Arguments:
+            scores {iterable} -- (player_id, money) pairs.
+        """
+        self.money = dict(scores)
+        self.keys = sorted((-money, player_id) for player_id, money in self.money.items())
+        self.version += 1
+
+    def update(self, player_id, money):
+        """Set a player's money, moving them to their new position."""
+        old = self.money.get(player_id)
+        if old == money:
+            return
+
+        if old is not None:
+            self._remove_key(old, player_id)
+        insort(self.keys, (-money, player_id))
+        self.money[player_id] = money
+        self.version += 1
+
+    def remove(self, player_id):
+        old = self.money.pop(player_id, None)
+        if old is not None:
+            self._remove_key(old, player_id)
+            self.version += 1
+
+    def _remove_key(self, money, player_id):
+        pos = bisect_left(self.keys, (-money, player_id))
+        del self.keys[pos]
+
+    # Queries
+    # ---------------------------
+
+    def top(self, n=10):
+        """Return the n richest players as (player_id, money) pairs."""
+        return [(player_id, -money) for money, player_id in self.keys[:n]]
+
+    def rank(self, player_id):
+        """Return a player's 1-based position, or None if they are not ranked."""
+        money = self.money.get(player_id)
+        if money is None:
+            return None
+        return bisect_left(self.keys, (-money, player_id)) + 1
@@ -0,0 +1,89 @@
+# Internal Python Moduels
+import zlib
+import asyncio
+import logging
+
+log = logging.getLogger("root")
+log.debug("locks.py loaded")
+
+
+class LockManager:
+
+    def __init__(self, stripes=256):
+        """Per-player locks, striped so memory doesn't grow with the player count.
+
+        Each player id hashes onto one of a fixed number of asyncio locks.
+        Players that share a stripe are serialised together, which is rare
+        with enough stripes and harmless otherwise. Several players are always
+        locked in stripe order, so two commands locking the same players can't
+        deadlock. Locks are not re-entrant, a command must not lock a player it
+        already holds.
+
+        Keyword Arguments:
+            stripes {int} -- Amount of locks. (default: {256})
+        """
+        self.locks = [asyncio.Lock() for n in range(stripes)]
+
+        # Counters
+        self.acquired = 0
+        self.contended = 0
+
+    def stripe(self, player_id):
+        return zlib.crc32(str(player_id).encode('utf-8')) % len(self.locks)
+
+    async def acquire(self, player_ids):
+        """Lock every player in player_ids.
+
+        Returns:
+            list -- The locks taken, pass them to release.
+        """
+        taken = []
+        try:
+            for n in sorted(set(self.stripe(x) for x in player_ids)):
+                lock = self.locks[n]
+                if lock.locked():
+                    self.contended += 1
+                await lock.acquire()
+                taken.append(lock)
+        except BaseException:
+            self.release(taken)
+            raise
+        self.acquired += len(taken)
+        return taken
+
+    def release(self, taken):
+        for lock in reversed(taken):
+            lock.release()
+
+    def hold(self, *player_ids):
+        """Lock the players for the length of an async with block.
+
+        e.g. `async with self.locks.hold(member.id):`
+        """
+        return _Held(self, player_ids)
+
+    def stats(self):
+        return {
+            "stripes": len(self.locks),
+            "held": sum(1 for x in self.locks if x.locked()),
+            "acquired": self.acquired,
+            "contended": self.contended
+        }
+
+
+class _Held:
+
+    __slots__ = ("manager", "player_ids", "taken")
+
+    def __init__(self, manager, player_ids):
+        self.manager = manager
+        self.player_ids = player_ids
+        self.taken = []
+
+    async def __aenter__(self):
+        self.taken = await self.manager.acquire(self.player_ids)
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.manager.release(self.taken)
+        self.taken = []
+        return False
@@ -0,0 +1,77 @@
+# Internal Python Moduels
+import logging
+
+log = logging.getLogger("root")
+log.debug("memberDirectory.py loaded")
+
+class MemberDirectory:
+
+    def __init__(self):
+        """Maps user ids to their discord.Member objects across every server.
+
+        Kept up to date by DiscordClient from the ready, member and server events,
+        so looking a member up never has to scan get_all_members().
+        """
+        self.members = {} # member_id -> {server_id: discord.Member}
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, member_id):
+        return member_id in self.members
+
+    # Updates
+    # ---------------------------
+
+    def rebuild(self, members):
+        """Replace the directory with an iterable of discord.Member objects."""
+        self.members = {}
+        for member in members:
+            self.add(member)
+
+    def add(self, member):
+        """Add or update a member (also used for member updates)."""
+        self.members.setdefault(member.id, {})[member.server.id] = member
+
+    def remove(self, member):
+        servers = self.members.get(member.id)
+        if servers is None:
+            return
+        servers.pop(member.server.id, None)
+        if not servers:
+            del self.members[member.id]
+
+    def add_server(self, server):
+        for member in server.members:
+            self.add(member)
+
+    def remove_server(self, server):
+        for member in list(server.members):
+            self.remove(member)
+
+    # Lookups
+    # ---------------------------
+
+    def get(self, member_id, server_id=None):
+        """Return a discord.Member for member_id, or None if they share no server with the bot.
+
+        Keyword Arguments:
+            server_id {str} -- Prefer the member object from this server. (default: {None})
+        """
+        servers = self.members.get(member_id)
+        if not servers:
+            return None
+        if server_id is not None and server_id in servers:
+            return servers[server_id]
+        return next(iter(servers.values()))
+
+    def name(self, member_id, fallback=None):
+        member = self.get(member_id)
+        return fallback if member is None else member.name
+
+    def avatar(self, member_id):
+        """Return a member's avatar url (or their default avatar), or None if unknown."""
+        member = self.get(member_id)
+        if member is None:
+            return None
+        return member.avatar_url if not member.avatar_url == "" else member.default_avatar_url
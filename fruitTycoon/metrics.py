@@ -0,0 +1,164 @@
+# Internal Python Moduels
+import time
+import asyncio
+import logging
+import functools
+from bisect import bisect_left
+
+from .json import run_io
+from .writer import write_files
+
+log = logging.getLogger("root")
+log.debug("metrics.py loaded")
+
+# Latency bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float("inf"))
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        if self.count == 0:
+            return 0
+        target = q * self.count
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return bound
+        return BUCKETS[-1]
+
+
+class Metrics:
+
+    prefix = "fruittycoon_"
+
+    def __init__(self):
+        """Counters, gauges and latency histograms for commands, Discord API calls and player I/O."""
+        self.counters = {} # (name, labels) -> int
+        self.histograms = {} # (name, labels) -> Histogram
+        self.gauges = {} # name -> function returning the current value
+        self.started = time.time()
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    # Recording
+    # ---------------------------
+
+    def inc(self, name, amount=1, **labels):
+        key = Metrics._key(name, labels)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        key = Metrics._key(name, labels)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.observe(value)
+
+    def gauge(self, name, func):
+        """Report func() as the value of name whenever metrics are rendered."""
+        self.gauges[name] = func
+
+    def get(self, name, **labels):
+        return self.counters.get(Metrics._key(name, labels), 0)
+
+    def instrument(self, name, callback):
+        """Wrap a command callback so its latency and errors are recorded.
+
+        Arguments:
+            name {str} -- The command name used as the label, e.g. "harvest" or "admin ping".
+            callback {coroutine function} -- The command's callback.
+        """
+        metrics = self
+
+        @functools.wraps(callback)
+        async def instrumented(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await callback(*args, **kwargs)
+            except Exception:
+                metrics.inc("command_errors_total", command=name)
+                raise
+            finally:
+                metrics.observe("command_seconds", time.perf_counter() - start, command=name)
+
+        return instrumented
+
+    # Output
+    # ---------------------------
+
+    def command_summary(self):
+        """Per-command stats, slowest (by p99) first.
+
+        Returns:
+            list -- (command, count, p50, p99, errors) tuples, latencies in seconds.
+        """
+        rows = []
+        for (name, labels), histogram in self.histograms.items():
+            if name != "command_seconds":
+                continue
+            command = dict(labels)["command"]
+            rows.append((
+                command, histogram.count, histogram.quantile(0.5), histogram.quantile(0.99),
+                self.get("command_errors_total", command=command)
+            ))
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format."""
+        lines = []
+
+        def label_string(labels, extra=()):
+            pairs = list(labels) + list(extra)
+            if not pairs:
+                return ""
+            return "{" + ",".join('{}="{}"'.format(k, v) for k, v in pairs) + "}"
+
+        for name in sorted({key[0] for key in self.counters}):
+            lines.append("# TYPE {}{} counter".format(Metrics.prefix, name))
+            for (metric, labels), value in sorted(self.counters.items()):
+                if metric == name:
+                    lines.append("{}{}{} {}".format(Metrics.prefix, name, label_string(labels), value))
+
+        for name in sorted({key[0] for key in self.histograms}):
+            lines.append("# TYPE {}{} histogram".format(Metrics.prefix, name))
+            for (metric, labels), histogram in sorted(self.histograms.items()):
+                if metric != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, histogram.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append("{}{}_bucket{} {}".format(Metrics.prefix, name, label_string(labels, (("le", le),)), cumulative))
+                lines.append("{}{}_sum{} {}".format(Metrics.prefix, name, label_string(labels), histogram.sum))
+                lines.append("{}{}_count{} {}".format(Metrics.prefix, name, label_string(labels), histogram.count))
+
+        for name, func in sorted(self.gauges.items()):
+            lines.append("# TYPE {}{} gauge".format(Metrics.prefix, name))
+            lines.append("{}{} {}".format(Metrics.prefix, name, func()))
+
+        lines.append("# TYPE {}uptime_seconds gauge".format(Metrics.prefix))
+        lines.append("{}uptime_seconds {}".format(Metrics.prefix, int(time.time() - self.started)))
+        return "\n".join(lines) + "\n"
+
+    async def write_loop(self, path, interval):
+        """Write the Prometheus text file every interval seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            text = self.render_prometheus().encode("utf-8")
+            if not (await run_io(write_files, [(path, text)]))[0]:
+                log.warning("Metrics: could not write {}".format(path))
@@ -0,0 +1,248 @@
+# Internal Python Moduels
+import time
+import asyncio
+import logging
+from collections import deque
+
+log = logging.getLogger("root")
+log.debug("outbox.py loaded")
+
+# Longest message Discord accepts
+MAX_LENGTH = 2000
+
+# How long Discord shows a typing indicator for
+TYPING_SECONDS = 10
+
+
+class TokenBucket:
+
+    __slots__ = ("capacity", "rate", "tokens", "updated")
+
+    def __init__(self, capacity, per):
+        """Allows capacity sends every per seconds, refilled continuously."""
+        self.capacity = capacity
+        self.rate = capacity / per
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Take a token.
+
+        Returns:
+            float -- 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class Outgoing:
+
+    __slots__ = ("destination", "content", "embed", "kwargs", "future", "typing", "queued")
+
+    def __init__(self, destination, content=None, embed=None, kwargs=None, future=None, typing=False):
+        self.destination = destination
+        self.content = content
+        self.embed = embed
+        self.kwargs = kwargs
+        self.future = future
+        self.typing = typing
+        self.queued = time.monotonic()
+
+
+class Outbox:
+
+    def __init__(self, deliver, deliver_typing, rate=5, per=5.0, global_rate=50, metrics=None):
+        """Queues outgoing messages per destination and sends them within Discord's rate limits.
+
+        Each destination (channel or member) has its own queue, worked through
+        in order by one task while it has messages. Consecutive text messages
+        to the same destination are joined into one (up to 2000 characters),
+        optionally ending with an embed. A typing indicator is dropped if a
+        message for the destination is already queued behind it, or if one is
+        still showing there.
+
+        Arguments:
+            deliver {coroutine function} -- Sends a message: deliver(destination, content, embed=..., **kwargs).
+            deliver_typing {coroutine function} -- Sends a typing indicator: deliver_typing(destination).
+
+        Keyword Arguments:
+            rate {int} -- Messages per destination every per seconds. (default: {5})
+            per {float} -- See rate. (default: {5.0})
+            global_rate {int} -- Requests per second across all destinations. (default: {50})
+            metrics {Metrics} -- Records send latency. (default: {None})
+        """
+        self.deliver = deliver
+        self.deliver_typing = deliver_typing
+        self.rate = rate
+        self.per = per
+        self.metrics = metrics
+
+        self.queues = {} # destination id -> deque of Outgoing
+        self.workers = {} # destination id -> Task
+        self.buckets = {} # destination id -> TokenBucket
+        self.typing_until = {} # destination id -> when its typing indicator ends
+        self.global_bucket = TokenBucket(global_rate, 1.0)
+
+        # Counters
+        self.sent = 0
+        self.merged = 0
+        self.typing_dropped = 0
+        self.delayed = 0
+        self.failed = 0
+
+    def __len__(self):
+        return sum(len(x) for x in self.queues.values())
+
+    def set_rates(self, rate, per, global_rate):
+        """Change the rate limits. Destinations already cooling down finish on their old bucket."""
+        self.rate = rate
+        self.per = per
+        self.global_bucket = TokenBucket(global_rate, 1.0)
+
+    # Queueing
+    # ---------------------------
+
+    def post(self, destination, content=None, *, embed=None, **kwargs):
+        """Queue a message and return at once. Errors are logged."""
+        self._queue(Outgoing(destination, content, embed, kwargs))
+
+    async def send(self, destination, content=None, *, embed=None, **kwargs):
+        """Queue a message and wait for it to be sent.
+
+        Returns:
+            discord.Message -- The message it was sent in (shared if it was merged).
+        """
+        future = asyncio.get_event_loop().create_future()
+        self._queue(Outgoing(destination, content, embed, kwargs, future))
+        return await future
+
+    def typing(self, destination):
+        """Queue a typing indicator."""
+        self._queue(Outgoing(destination, typing=True))
+
+    def _queue(self, item):
+        key = item.destination.id
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+            self.workers[key] = asyncio.ensure_future(self._work(key, queue))
+        queue.append(item)
+
+    async def drain(self):
+        """Wait until everything queued so far has been sent."""
+        while self.workers:
+            await asyncio.gather(*list(self.workers.values()), return_exceptions=True)
+
+    # Sending
+    # ---------------------------
+
+    async def _work(self, key, queue):
+        bucket = self.buckets.pop(key, None) or TokenBucket(self.rate, self.per)
+        try:
+            while queue:
+                item = queue.popleft()
+
+                if item.typing:
+                    if queue or self.typing_until.get(key, 0) > time.monotonic():
+                        self.typing_dropped += 1
+                        continue
+                    await self._wait_for(self.global_bucket)
+                    try:
+                        await self.deliver_typing(item.destination)
+                        self.typing_until[key] = time.monotonic() + TYPING_SECONDS
+                    except Exception as e:
+                        log.warning("Outbox: could not send typing to {}: {}".format(key, e))
+                    continue
+
+                batch = self._merge(item, queue)
+                content = "\n".join(str(x.content) for x in batch if x.content is not None) or None
+
+                await self._wait_for(bucket)
+                await self._wait_for(self.global_bucket)
+                try:
+                    message = await self.deliver(item.destination, content, embed=batch[-1].embed, **item.kwargs)
+                except Exception as e:
+                    self.failed += 1
+                    for x in batch:
+                        if x.future is None:
+                            log.error("Outbox: could not send message to {}: {}".format(key, e))
+                        elif not x.future.done():
+                            x.future.set_exception(e)
+                    continue
+
+                # A sent message ends the typing indicator
+                self.typing_until.pop(key, None)
+                self.sent += 1
+                self.merged += len(batch) - 1
+                now = time.monotonic()
+                for x in batch:
+                    if self.metrics is not None:
+                        self.metrics.observe("outbox_send_seconds", now - x.queued)
+                    if x.future is not None and not x.future.done():
+                        x.future.set_result(message)
+        finally:
+            del self.queues[key]
+            del self.workers[key]
+            if not bucket.full():
+                # Still cooling down, keep it for the next burst
+                self.buckets[key] = bucket
+            if self.typing_until.get(key, 0) <= time.monotonic():
+                self.typing_until.pop(key, None)
+
+    def _merge(self, item, queue):
+        """Take the queued messages that can be sent in the same message as item."""
+        batch = [item]
+        if item.embed is not None or item.kwargs:
+            return batch
+
+        length = len(str(item.content)) if item.content is not None else 0
+        while queue:
+            following = queue[0]
+            if following.typing:
+                # This message goes out right away, the indicator would only flash
+                queue.popleft()
+                self.typing_dropped += 1
+                continue
+            if following.kwargs:
+                break
+            if following.content is not None:
+                added = len(str(following.content)) + (1 if length else 0)
+                if length + added > MAX_LENGTH:
+                    break
+                length += added
+            batch.append(queue.popleft())
+            if following.embed is not None:
+                # Only one embed per message, and text after it would show above it
+                break
+        return batch
+
+    async def _wait_for(self, bucket):
+        delay = bucket.take()
+        if delay:
+            self.delayed += 1
+        while delay:
+            await asyncio.sleep(delay)
+            delay = bucket.take()
+
+    def stats(self):
+        return {
+            "queued": len(self),
+            "destinations": len(self.queues),
+            "sent": self.sent,
+            "merged": self.merged,
+            "typing_dropped": self.typing_dropped,
+            "delayed": self.delayed,
+            "failed": self.failed
+        }
@@ -1,17 +1,26 @@
-import os
 import time
 import logging
+from sys import intern
 from discord import Embed
 
-from .trade import Trade
-from .json import Json
+from .trade import Trade, OutgoingTrade
+from .upgrades import CURVES
 
 log = logging.getLogger("root")
 log.debug("player.py loaded")
 
+def _intern_name(value):
+    return intern(value) if isinstance(value, str) else value
+
 class Player:
 
-    player_file = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/player_data/"
+    __slots__ = (
+        "id", "type", "money", "last_harvest", "inventory", "in_trade", "out_trade",
+        "upgrades", "upgrade_levels", "farm_level", "planting_cost", "max_harvest_percent", "notify"
+    )
+
+    # Storage backend players are loaded from and saved to (set by GameManager)
+    storage = None
 
     def __init__(self, player_id, f_type=None):
         self.id = player_id
@@ -45,64 +54,47 @@ class Player:
         self.planting_cost = 0
         
         self.max_harvest_percent = 0
-        self.max_harvest_percent = 0
+
+        self.notify = False # DM the player when their fruit is ready
 
     def create_profile_embed(self, template, name, avatar_url):
-        """Creates a discord.Embed from the template "join" in the game_data.json file.
+        """Creates a discord.Embed from the templates "profile" and "profile_trades" in the game_data.json file.
         
         Arguments:
-            template {dict} -- Contains the template for the embed file.
+            template {tuple} -- The (profile, profile_trades) EmbedTemplates.
         
         Returns:
             discord.Embed -- A discord.Embed object containing the details of the trade.
         """
-        
-        embed = template[0]
-
-        embed["title"] = embed["title"].format(name)
-        embed["thumbnail"]["url"] = embed["thumbnail"]["url"].format(avatar_url)
-        
-        # Type
-        embed["fields"][0]["value"] = embed["fields"][0]["value"].format(
-            "grapes" if self.type == "grape" else self.type
-        ) 
 
         # Time of last harvest
         time_since_lh = int(time.time()) - self.last_harvest
         hours, minutes = divmod((time_since_lh // 60), 60) # Convert seconds to minutes, then calculate hours & minutes
-        embed["fields"][1]["value"] = embed["fields"][1]["value"].format(
-            str(hours) + " hours " + str(minutes) + " minutes"
-        )
-
-        # Inventory
-        embed["fields"][2]["value"] = embed["fields"][2]["value"].format(
-            self.inventory["apple"], self.inventory["banana"], self.inventory["grape"]
-        )
-
-        # Money
-        embed["fields"][3]["value"] = embed["fields"][3]["value"].format(self.money)
-
-        # Trades
-        trade_embed = self._create_trade_embed(template[1])
-
-        # Farm Stats
-        embed["fields"][4]["value"] = embed["fields"][4]["value"].format(
-            self.upgrade_levels["size"], self.upgrades["size"]
-        )
-        embed["fields"][5]["value"] = embed["fields"][5]["value"].format(self.upgrades["multiplier"])
         
         # Purchased Upgrades
         if not self.upgrades["farm"] == []:
             farm_upgrades = "\n".join(self.upgrades["farm"])
         else:
             farm_upgrades = "None"
-        embed["fields"][6]["value"] = embed["fields"][6]["value"].format(farm_upgrades)
+
+        embed = template[0].render({
+            "title": name,
+            "thumbnail.url": avatar_url,
+            "fields.0.value": "grapes" if self.type == "grape" else self.type, # Type
+            "fields.1.value": str(hours) + " hours " + str(minutes) + " minutes",
+            "fields.2.value": (self.inventory["apple"], self.inventory["banana"], self.inventory["grape"]), # Inventory
+            "fields.3.value": self.money,
+            "fields.4.value": (self.upgrade_levels["size"], self.upgrades["size"]), # Farm Stats
+            "fields.5.value": self.upgrades["multiplier"],
+            "fields.6.value": farm_upgrades
+        })
+
+        # Trades
+        trade_embed = self._create_trade_embed(template[1])
 
         return Embed().from_data(embed), trade_embed
 
     def _create_trade_embed(self, template):
-        embed = template
-        
         def convert_short_text(short_text):
             if short_text == "money":
                 return "moneybag"
@@ -129,14 +121,16 @@ class Player:
                 out_trade.append("")
             else:            
                 string = "{}: {}x{} for {}x{}.".format(
-                    x["recipient_name"],
-                    ":{}:".format(convert_short_text(x["request"][0])), x["request"][1],
-                    ":{}:".format(convert_short_text(x["offer"][0])), x["offer"][1]
+                    x.recipient_name,
+                    ":{}:".format(convert_short_text(x.request[0])), x.request[1],
+                    ":{}:".format(convert_short_text(x.offer[0])), x.offer[1]
                 )
                 out_trade.append(string)
         
-        embed["fields"][0]["value"] = embed["fields"][0]["value"].format(*in_trade)
-        embed["fields"][1]["value"] = embed["fields"][1]["value"].format(*out_trade)
+        embed = template.render({
+            "fields.0.value": tuple(in_trade),
+            "fields.1.value": tuple(out_trade)
+        })
 
         return Embed().from_data(embed)
 
@@ -144,48 +138,36 @@ class Player:
         """Creates a discord.Embed from the template "join" in the game_data.json file.
         
         Arguments:
-            template {dict} -- Contains the template for the embed file.
+            template {EmbedTemplate} -- The compiled "join" template.
         
         Returns:
             discord.Embed -- A discord.Embed object containing the details of the trade.
         """
-        embed = template
-
-        embed["title"] = embed["title"].format(name)
-        embed["description"] = embed["description"].format(name)
+        embed = template.render({"title": name, "description": name})
 
         return Embed().from_data(embed)
 
     def create_shop_embed(self, template, member, prefix, juice_upgrades):
-        embed = template
-        
-        # Create shop embed
-        embed["description"] = embed["description"].format(member.name)
-        
-        # Farm Size
-        embed["fields"][0]["value"] = embed["fields"][0]["value"].format(
-            self.upgrade_levels["size"]+1, self.calculate_upgrade("size")
-        )
-        
-        # Multiplier
-        embed["fields"][1]["value"] = embed["fields"][1]["value"].format(
-            self.calculate_upgrade("multiplier", price=False), 
-            self.calculate_upgrade("multiplier")
-        )
+        values = {
+            "description": member.name,
+            "fields.0.value": (self.upgrade_levels["size"]+1, self.calculate_upgrade("size")), # Farm Size
+            "fields.1.value": (self.calculate_upgrade("multiplier", price=False), self.calculate_upgrade("multiplier")) # Multiplier
+        }
+        replace = None
         
         # Farm Utilities (Juice type)
         if not self.farm_level == 4:
-            embed["fields"][2]["value"] = embed["fields"][2]["value"].format(
-                juice_upgrades[juice_upgrades["id_to_name"][str(self.farm_level+1)]]["name"], 
-                juice_upgrades[juice_upgrades["id_to_name"][str(self.farm_level+1)]]["unlock_price"], 
-                juice_upgrades[juice_upgrades["id_to_name"][str(self.farm_level+1)]]["description"]
-            )
+            next_upgrade = juice_upgrades[juice_upgrades["id_to_name"][str(self.farm_level+1)]]
+            values["fields.2.value"] = (next_upgrade["name"], next_upgrade["unlock_price"], next_upgrade["description"])
         else:
-            embed["fields"][2]["value"] = "This cannot be upgraded any higher."
+            replace = {"fields.2.value": "This cannot be upgraded any higher."}
+
+        # Create shop embed
+        embed = template.render(values, replace)
 
         # Create shop help embed
         embed_help = {
-            "description": "To purchase, type `{}upgrade [size/multiplier/farm]`".format(
+            "description": "To purchase, type `{0}upgrade [size/multiplier/farm]`. To buy several levels at once, type `{0}upgrade [size/multiplier] [amount/max]`".format(
                 prefix
             ),
             "color": 3060770
@@ -194,38 +176,103 @@ class Player:
         return Embed().from_data(embed), Embed().from_data(embed_help)
 
     def calculate_upgrade(self, upgrade, price=True):
-        # This is where the formulas are hard-coded in.
-        # So change them here.
-
-        upgrade_formula = {
-            "size": {
-                "price": lambda n: 10000 * (1.25 ** (n-1)),
-                "value": lambda n: int(1000 + (1500 * (n-1)))
-            },
-            "multiplier": {
-                "price": lambda n: 1000 * (1.5 ** (n-1)),
-                "value": lambda n: 1 + (0.1 * (n-1))
-            }}
+        """Price of the next level of upgrade, or the stat's value after buying it.
+
+        Arguments:
+            upgrade {str} -- Either "size" or "multiplier".
 
+        Keyword Arguments:
+            price {bool} -- Return the price instead of the value. (default: {True})
+        """
+        curve = CURVES[upgrade]
         if price:
-            return int(upgrade_formula[upgrade]["price"](self.upgrade_levels[upgrade]))
-        return upgrade_formula[upgrade]["value"](self.upgrade_levels[upgrade]+1)
+            return curve.price(self.upgrade_levels[upgrade])
+        return curve.value(self.upgrade_levels[upgrade]+1)
+
+    def to_record(self):
+        """Return a snapshot of the player's variables that is safe to serialize.
+
+        Nested containers are copied, so the live object can keep changing while
+        the snapshot is written on another thread.
+        """
+        trades = self.trade_slots()
+        return {
+            "id": self.id,
+            "type": self.type,
+            "money": self.money,
+            "last_harvest": self.last_harvest,
+            "inventory": dict(self.inventory),
+            "in_trade": trades["in_trade"],
+            "out_trade": trades["out_trade"],
+
+            "upgrades": dict(self.upgrades, farm=list(self.upgrades["farm"])),
+            "upgrade_levels": dict(self.upgrade_levels),
+            "farm_level": self.farm_level,
+            "planting_cost": self.planting_cost,
+            "max_harvest_percent": self.max_harvest_percent,
+            "notify": self.notify
+        }
+
+    def trade_slots(self):
+        """Return the player's trade slots as they are in to_record (empty slots are 0)."""
+
+        # Trades are saved as their dict form
+        return {
+            "in_trade": [trade if trade == 0 else trade.save_string() for trade in self.in_trade],
+            "out_trade": [trade if trade == 0 else trade.to_record() for trade in self.out_trade]
+        }
+
+    def load_record(self, record):
+        """Set the player's variables from a record made by to_record.
+
+        Fields missing from the record keep their defaults, unknown fields are ignored.
+        """
+
+        # Set instance variables to loaded variables
+        try:
+            for name in Player.__slots__:
+                if name in record:
+                    setattr(self, name, record[name])
+        except Exception as e:
+            log.error(e)
+            return None
+
+        # Share one copy of each key/type string between every loaded player
+        self.type = _intern_name(self.type)
+        self.inventory = {intern(k): v for k, v in self.inventory.items()}
+        self.upgrades = {intern(k): v for k, v in self.upgrades.items()}
+        self.upgrade_levels = {intern(k): v for k, v in self.upgrade_levels.items()}
+
+        # Check for and load Incoming Trades
+        for pos, trade_string in enumerate(self.in_trade):
+            if trade_string == 0:
+                continue
+            trade = Trade()
+            trade.load_string(trade_string)
+            self.in_trade[pos] = trade
+
+        # Outgoing Trades
+        for pos, outgoing in enumerate(self.out_trade):
+            if outgoing != 0:
+                self.out_trade[pos] = OutgoingTrade.from_record(outgoing)
+
+        return True
 
     def save(self):
-        """Save player variables to JSON."""
+        """Save player variables to storage."""
 
-        # Check for and save Incoming Trades
-        if not self.in_trade == [0] * 4:
-            for pos, trade in enumerate(self.in_trade):
-                if trade == 0:
-                    continue
-                self.in_trade[pos] = self.in_trade[pos].save_string()
+        # Write the record through the storage backend
+        succeeded = Player.storage.save_player(self.id, self.to_record())
 
-        # Get object variables as string
-        json_string = self.__dict__
+        if succeeded:
+            return True
+        else:
+            log.warning("Could not save player")
+            return None
 
-        # Dump the string to JSON
-        succeeded = Json(Player.player_file + "{}.json".format(self.id), load=False).dump(json_string)
+    async def save_async(self):
+        """Save player variables to storage without blocking the event loop."""
+        succeeded = await Player.storage.save_player_async(self.id, self.to_record())
 
         if succeeded:
             return True
@@ -234,34 +281,25 @@ class Player:
             return None
 
     def load(self):
-        """Load player variables from JSON."""
-
-        # Load json string from JSON
-        json_string = Json(Player.player_file + "{}.json".format(self.id)).data
+        """Load player variables from storage."""
 
-        # Set instance variables to loaded variables
-        try:
-            self.__dict__ = json_string
-        except Exception as e:
-            log.error(e)
+        # Load record from the storage backend
+        record = Player.storage.load_player(self.id)
+        if record is None:
+            log.error("Player {} has no saved data".format(self.id))
             return None
 
-        # Check for and load Incoming Trades
-        if not self.in_trade == [0] * 4:
-            for pos, trade_string in enumerate(self.in_trade):
-                if trade_string == 0:
-                    continue
-                trade = Trade()
-                trade.load_string(trade_string)
-                self.in_trade[pos] = trade
+        return self.load_record(record)
 
-        return True
+    async def load_async(self):
+        """Load player variables from storage without blocking the event loop."""
+        record = await Player.storage.load_player_async(self.id)
+        if record is None:
+            log.error("Player {} has no saved data".format(self.id))
+            return None
+
+        return self.load_record(record)
 
     def delete(self):
-        """Delete player variables from JSON."""
-        try:
-            os.remove(Player.player_file + "{}.json".format(self.id))
-        except Exception as e:
-            log.error(e)
-            return None
-        return True
\ No newline at end of file
+        """Delete player variables from storage."""
+        return Player.storage.delete_player(self.id)
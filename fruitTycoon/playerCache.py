@@ -0,0 +1,153 @@
+# Internal Python Moduels
+import time
+import asyncio
+import logging
+from itertools import islice
+from collections import OrderedDict
+
+log = logging.getLogger("root")
+log.debug("playerCache.py loaded")
+
+class PlayerCache:
+
+    def __init__(self, max_size=1000, ttl=900):
+        """Keeps recently used Player objects in memory and writes them back lazily.
+
+        Keyword Arguments:
+            max_size {int} -- Maximum amount of players held at once. (default: {1000})
+            ttl {int} -- Seconds a player can sit unused before being evicted. (default: {900})
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        # player_id -> [Player, time of last access], least recently used first
+        self.entries = OrderedDict()
+        self.dirty = set()
+
+        # Counters
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.writes = 0
+        self.failures = 0
+
+    # Lookups
+    # ---------------------------
+
+    def get(self, player_id):
+        """Return the live Player for player_id, or None if it is not cached."""
+        entry = self.entries.get(player_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        entry[1] = time.monotonic()
+        self.entries.move_to_end(player_id)
+        return entry[0]
+
+    def put(self, player, dirty=False):
+        """Add a Player to the cache, evicting the least recently used clean players if full."""
+        self.entries[player.id] = [player, time.monotonic()]
+        self.entries.move_to_end(player.id)
+        if dirty:
+            self.dirty.add(player.id)
+
+        overflow = len(self.entries) - self.max_size
+        if overflow > 0:
+            # Dirty players are skipped, they are evicted after the next flush writes them
+            candidates = (x for x in self.entries if x not in self.dirty and x != player.id)
+            for player_id in list(islice(candidates, overflow)):
+                self._evict(player_id)
+
+    def mark_dirty(self, player):
+        """Flag a Player as changed so it is written on the next flush."""
+        if player.id not in self.entries:
+            self.put(player)
+        self.dirty.add(player.id)
+
+    def discard(self, player_id):
+        """Drop a player from the cache without saving it (e.g. when removed from the game)."""
+        self.entries.pop(player_id, None)
+        self.dirty.discard(player_id)
+
+    # Write-back
+    # ---------------------------
+
+    def flush(self):
+        """Save every dirty player, blocking until done (used at shutdown).
+
+        Returns:
+            int -- The amount of players written.
+        """
+        written = 0
+        for player in self._take_dirty():
+            if player.save():
+                written += 1
+            else:
+                self._write_failed(player)
+        self.writes += written
+        return written
+
+    async def flush_async(self):
+        """Save every dirty player on the I/O pool.
+
+        Returns:
+            int -- The amount of players written.
+        """
+        players = self._take_dirty()
+        results = await asyncio.gather(*(player.save_async() for player in players))
+
+        written = 0
+        for player, succeeded in zip(players, results):
+            if succeeded:
+                written += 1
+            else:
+                self._write_failed(player)
+        self.writes += written
+        return written
+
+    def expire(self):
+        """Evict clean players that have not been used within the ttl."""
+        cutoff = time.monotonic() - self.ttl
+        expired = [
+            player_id for player_id, entry in self.entries.items()
+            if entry[1] < cutoff and player_id not in self.dirty
+        ]
+        for player_id in expired:
+            self._evict(player_id)
+        return len(expired)
+
+    def _take_dirty(self):
+        # Clear the flags before writing, so changes made during the write mark the player again
+        players = [self.entries[x][0] for x in self.dirty if x in self.entries]
+        self.dirty.clear()
+        return players
+
+    def _write_failed(self, player):
+        # Keep unsaved changes in memory rather than losing them
+        log.warning("Cache: could not write back player {}".format(player.id))
+        self.dirty.add(player.id)
+        self.failures += 1
+
+    def _evict(self, player_id):
+        del self.entries[player_id]
+        self.evictions += 1
+
+    # Stats
+    # ---------------------------
+
+    def stats(self):
+        """Return the cache counters as a dict."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "dirty": len(self.dirty),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0,
+            "evictions": self.evictions,
+            "writes": self.writes,
+            "failures": self.failures
+        }
@@ -1,44 +1,60 @@
 # Internal Python Moduels
-import os
 import logging
 
-from .json import Json
-
 log = logging.getLogger("root")
 log.debug("playerIndex.py loaded")
 
 class PlayerIndex:
 
-    file_location = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/index.json"
+    def __init__(self, storage):
+        """Keeps track of which users have joined the game.
+
+        Arguments:
+            storage {Storage} -- The backend the index is persisted through.
+        """
+        self.storage = storage
+
+        # Dict used as an ordered set (player_id -> None)
+        self.players = self.load()
+
+    @property
+    def list(self):
+        """Player ids in the order they joined."""
+        return list(self.players)
 
-    def __init__(self):
-        self.list = self.load()
+    def __len__(self):
+        return len(self.players)
 
     # I/O
     # ---------------------------
     def load(self):
-        """Load index from json"""
-        players = Json(PlayerIndex.file_location).get("players", fallback=[])
-        return players
+        """Load index from storage"""
+        return dict.fromkeys(self.storage.load_index())
 
     def save(self):
-        """Save index to json"""
-        Json(PlayerIndex.file_location, load=False).dump({"players": self.list})
+        """Save the whole index to storage"""
+        self.storage.save_index(self.list)
+
+    async def load_async(self):
+        """Reload the index from storage without blocking the event loop"""
+        self.players = dict.fromkeys(await self.storage.load_index_async())
+        return self.players
+
+    async def save_async(self):
+        """Save the whole index to storage without blocking the event loop"""
+        await self.storage.save_index_async(self.list)
 
     # Players
     # ---------------------------
     async def add(self, player_id):
-        self.list.append(player_id)
-        self.save()
+        if player_id in self.players:
+            return
+        self.players[player_id] = None
+        self.storage.index_add(player_id, self.players)
 
     async def remove(self, player_id):
-        self.list.remove(player_id)
-        self.save()
+        del self.players[player_id]
+        self.storage.index_remove(player_id, self.players)
 
     async def exists(self, player_id):
-        for x in self.list:
-            if x == player_id:
-                return True
-        else:
-            return False
-
+        return player_id in self.players
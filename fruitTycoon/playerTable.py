@@ -0,0 +1,173 @@
+# Internal Python Moduels
+import logging
+from array import array
+from heapq import nlargest
+from itertools import compress
+
+# NumPy is optional, columns are returned as plain arrays without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+log = logging.getLogger("root")
+log.debug("playerTable.py loaded")
+
+class PlayerTable:
+
+    # Column name -> array typecode
+    columns_spec = (
+        ("money", "d"),
+        ("apple", "q"),
+        ("banana", "q"),
+        ("grape", "q"),
+        ("size_level", "q"),
+        ("multiplier_level", "q"),
+        ("farm_level", "q"),
+        ("last_harvest", "q")
+    )
+
+    def __init__(self):
+        """The numeric fields of every player, one typed array per field.
+
+        Row n of every column belongs to the player ids[n]. Removing a player
+        moves the last row into its place, so rows stay packed. Cross-player
+        queries (totals, rankings, eligibility checks) scan the columns
+        instead of loading Player objects.
+        """
+        self.columns = {name: array(code) for name, code in PlayerTable.columns_spec}
+        self.ids = [] # row -> player_id
+        self.rows = {} # player_id -> row
+
+        # Bumped on every change, lets callers cache anything computed from the table
+        self.version = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, player_id):
+        return player_id in self.rows
+
+    # Row values
+    # ---------------------------
+
+    @staticmethod
+    def player_values(player):
+        """Return a Player's column values, in columns_spec order."""
+        return (
+            player.money,
+            player.inventory["apple"],
+            player.inventory["banana"],
+            player.inventory["grape"],
+            player.upgrade_levels["size"],
+            player.upgrade_levels["multiplier"],
+            player.farm_level,
+            player.last_harvest
+        )
+
+    @staticmethod
+    def record_values(record):
+        """Return a stored player record's column values, in columns_spec order."""
+        inventory = record.get("inventory", {})
+        levels = record.get("upgrade_levels", {})
+        return (
+            record.get("money", 0),
+            inventory.get("apple", 0),
+            inventory.get("banana", 0),
+            inventory.get("grape", 0),
+            levels.get("size", 1),
+            levels.get("multiplier", 1),
+            record.get("farm_level", 0),
+            record.get("last_harvest", 0)
+        )
+
+    # Updates
+    # ---------------------------
+
+    def clear(self):
+        self.columns = {name: array(code) for name, code in PlayerTable.columns_spec}
+        self.ids = []
+        self.rows = {}
+        self.version += 1
+
+    def set(self, player_id, values):
+        """Insert or overwrite a player's row.
+
+        Arguments:
+            player_id {str} -- The player.
+            values {tuple} -- From player_values or record_values.
+        """
+        row = self.rows.get(player_id)
+        if row is None:
+            self.rows[player_id] = len(self.ids)
+            self.ids.append(player_id)
+            for (name, code), value in zip(PlayerTable.columns_spec, values):
+                self.columns[name].append(value)
+        else:
+            for (name, code), value in zip(PlayerTable.columns_spec, values):
+                self.columns[name][row] = value
+        self.version += 1
+
+    def update(self, player):
+        """Copy a Player's current values into the table."""
+        self.set(player.id, PlayerTable.player_values(player))
+
+    def remove(self, player_id):
+        row = self.rows.pop(player_id, None)
+        if row is None:
+            return
+
+        # Move the last row into the gap
+        last = len(self.ids) - 1
+        if row != last:
+            moved = self.ids[last]
+            self.ids[row] = moved
+            self.rows[moved] = row
+            for column in self.columns.values():
+                column[row] = column[last]
+
+        self.ids.pop()
+        for column in self.columns.values():
+            column.pop()
+        self.version += 1
+
+    # Queries
+    # ---------------------------
+
+    def get(self, player_id, name):
+        row = self.rows.get(player_id)
+        return None if row is None else self.columns[name][row]
+
+    def row(self, player_id):
+        """Return a player's values in columns_spec order, or None."""
+        row = self.rows.get(player_id)
+        if row is None:
+            return None
+        return tuple(self.columns[name][row] for name, code in PlayerTable.columns_spec)
+
+    def column(self, name):
+        """Return a column as a NumPy array (a copy) if NumPy is installed, else the array itself.
+
+        The array must not be modified, and is only valid until the table next changes.
+        """
+        if numpy is None:
+            return self.columns[name]
+        # A view would stop the array from growing while it is alive, so copy it
+        return numpy.frombuffer(self.columns[name], dtype=self.columns[name].typecode).copy()
+
+    def total(self, name):
+        return sum(self.columns[name])
+
+    def count_where(self, name, predicate):
+        """Count the rows whose value in column name satisfies predicate."""
+        return sum(map(bool, map(predicate, self.columns[name])))
+
+    def ids_where(self, name, predicate):
+        """Return the ids of the players whose value in column name satisfies predicate."""
+        return list(compress(self.ids, map(predicate, self.columns[name])))
+
+    def top(self, name, n=10):
+        """Return the n players with the highest value in column name, as (player_id, value) pairs."""
+        column = self.columns[name]
+        rows = nlargest(n, range(len(column)), key=column.__getitem__)
+        return [(self.ids[row], column[row]) for row in rows]
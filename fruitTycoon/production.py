@@ -0,0 +1,226 @@
+# Internal Python Moduels
+import os
+import json
+import time
+import heapq
+import asyncio
+import logging
+
+log = logging.getLogger("root")
+log.debug("production.py loaded")
+
+class ProductionScheduler:
+
+    journal_location = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/productions.journal"
+
+    # Most jobs settled in one go
+    batch_size = 100
+
+    # Seconds to wait before retrying after settling failed
+    retry_delay = 5
+
+    # Event log action of a job's credit, so a credit is never paid twice
+    settle_action = "production #{}"
+
+    def __init__(self, game, path=None):
+        """Runs every pending production from a single task.
+
+        Jobs are kept in a min-heap ordered by completion time and persisted
+        to an append-only journal, so they survive restarts. Each credit is
+        logged in the event log with its job id; a job that was paid but not
+        yet removed from the journal when the bot stopped is not paid again.
+
+        Arguments:
+            game {GameManager} -- Used to load, credit and notify players.
+
+        Keyword Arguments:
+            path {str} -- Journal file to use instead of the default. (default: {None})
+        """
+        self.game = game
+        self.path = path or ProductionScheduler.journal_location
+
+        self.jobs = {} # job_id -> job dict
+        self.heap = [] # (finish time, job_id)
+        self.next_id = 1
+        self.wake = asyncio.Event()
+
+        self.journal = None
+        self.settled = 0
+
+    def __len__(self):
+        return len(self.jobs)
+
+    # I/O
+    # ---------------------------
+
+    def load(self):
+        """Replay the journal, then rewrite it with only the pending jobs."""
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                for line in f:
+                    # Ignore a partially written last line
+                    if not line.endswith("\n"):
+                        continue
+                    if line[0] == "+":
+                        job = json.loads(line[1:])
+                        self.jobs[job["id"]] = job
+                        self.next_id = max(self.next_id, job["id"] + 1)
+                    elif line[0] == "-":
+                        self.jobs.pop(int(line[1:]), None)
+
+        for job_id in self._paid(self.jobs):
+            log.info("Production: job {} was already paid".format(job_id))
+            del self.jobs[job_id]
+
+        self.heap = [(job["finish"], job_id) for job_id, job in self.jobs.items()]
+        heapq.heapify(self.heap)
+        self._compact()
+        log.debug("Production: loaded {} pending jobs".format(len(self.jobs)))
+
+    def _paid(self, jobs):
+        """Ids of the finished jobs whose credit is in the event log."""
+        due = {job_id: job["finish"] for job_id, job in jobs.items() if job["finish"] <= time.time()}
+        if not due:
+            return set()
+
+        prefix = ProductionScheduler.settle_action.format("")
+        earliest = min(due.values())
+        paid = set()
+        for event in self.game.events.events():
+            if event.time < earliest or not event.action.startswith(prefix):
+                continue
+            job_id = event.action[len(prefix):]
+            if job_id.isdigit() and int(job_id) in due:
+                paid.add(int(job_id))
+        return paid
+
+    def _compact(self):
+        temp = self.path + ".tmp"
+        with open(temp, 'w', encoding='utf-8') as f:
+            for job in self.jobs.values():
+                f.write("+{}\n".format(json.dumps(job)))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, self.path)
+
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = open(self.path, 'a', encoding='utf-8')
+
+    def _append(self, line):
+        self.journal.write(line)
+        self.journal.flush()
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+    # Jobs
+    # ---------------------------
+
+    def schedule(self, player_id, duration, profit, description):
+        """Add a production job.
+
+        Arguments:
+            player_id {str} -- Who gets paid.
+            duration {int} -- Seconds until the production finishes.
+            profit {int} -- Money credited when it finishes.
+            description {str} -- What is being made, used in the completion message.
+
+        Returns:
+            dict -- The job.
+        """
+        job = {
+            "id": self.next_id,
+            "player_id": player_id,
+            "finish": time.time() + duration,
+            "profit": profit,
+            "description": description
+        }
+        self.next_id += 1
+
+        self._append("+{}\n".format(json.dumps(job)))
+        self.jobs[job["id"]] = job
+
+        # Wake the scheduler if this job finishes before everything else
+        if not self.heap or job["finish"] < self.heap[0][0]:
+            self.wake.set()
+        heapq.heappush(self.heap, (job["finish"], job["id"]))
+        return job
+
+    def pending_for(self, player_id):
+        return [job for job in self.jobs.values() if job["player_id"] == player_id]
+
+    # Scheduler
+    # ---------------------------
+
+    async def run(self):
+        while True:
+            timeout = None if not self.heap else max(0, self.heap[0][0] - time.time())
+
+            self.wake.clear()
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            try:
+                await self.settle_due()
+            except Exception as e:
+                log.error("Production: could not settle jobs: {}".format(e))
+                await asyncio.sleep(ProductionScheduler.retry_delay)
+
+    async def settle_due(self):
+        """Credit every finished job, in batches."""
+        now = time.time()
+        while self.heap and self.heap[0][0] <= now:
+            batch = []
+            while self.heap and self.heap[0][0] <= now and len(batch) < ProductionScheduler.batch_size:
+                finish, job_id = heapq.heappop(self.heap)
+                if job_id in self.jobs:
+                    batch.append(self.jobs[job_id])
+            try:
+                await self._settle(batch)
+            except Exception:
+                # Jobs that weren't paid go back on the heap to be retried
+                for job in batch:
+                    if job["id"] in self.jobs:
+                        heapq.heappush(self.heap, (job["finish"], job["id"]))
+                raise
+
+    async def _settle(self, jobs):
+        players = {}
+        paid = []
+        try:
+            for job in jobs:
+                async with self.game.locks.hold(job["player_id"]):
+                    player = await self.game.get_player(job["player_id"])
+                    if player is not None:
+                        player.money += job["profit"]
+                        # Logged with the job id, from here on the job counts as paid
+                        self.game.save_player(player, ProductionScheduler.settle_action.format(job["id"]))
+                        players[player.id] = player
+                    # A player who left the game while producing gets nothing
+                    del self.jobs[job["id"]]
+                    paid.append(job)
+
+            # Make the credits durable (one group commit) before the jobs are forgotten
+            written = await self.game.storage.save_players_async([(player.id, player.to_record()) for player in players.values()])
+            self.game.metrics.inc("player_saves_total", written)
+            if written != len(players):
+                log.warning("Production: {} of {} credited player(s) not written yet, the cache retries them".format(
+                    len(players) - written, len(players)
+                ))
+        finally:
+            for job in paid:
+                self._append("-{}\n".format(job["id"]))
+            self.settled += len(paid)
+
+        for job in paid:
+            member = self.game.client.member_directory.get(job["player_id"])
+            if member is None:
+                continue
+            self.game.client.post(member, "Your {} production has finished. This has netted you :moneybag:x{}".format(
+                job["description"], job["profit"]
+            ))
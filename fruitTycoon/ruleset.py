@@ -0,0 +1,151 @@
+# Internal Python Moduels
+import os
+import json
+import logging
+
+from .embedTemplate import compile_templates
+
+log = logging.getLogger("root")
+log.debug("ruleset.py loaded")
+
+# Slots the commands fill in, per embed in game_data.json
+TEMPLATE_SLOTS = {
+    "join": ("title", "description"),
+    "profile": ("title", "thumbnail.url") + tuple("fields.{}.value".format(n) for n in range(7)),
+    "profile_trades": ("fields.0.value", "fields.1.value"),
+    "harvest": ("thumbnail.url", "fields.0.value"),
+    "trade_confirmation": ("title", "thumbnail.url", "author.name", "author.icon_url", "fields.0.value", "fields.1.value"),
+    "trade_incoming": ("description", "thumbnail.url", "author.name", "author.icon_url", "fields.0.value", "fields.1.value"),
+    "shop": ("description", "fields.0.value", "fields.1.value", "fields.2.value"),
+    "production_confirmation": tuple("fields.{}.value".format(n) for n in range(5))
+}
+
+# juice_upgrades entries, by (amount of fruits, level (0 regular, 1 quality))
+RECIPES = {(1, 0): "regular", (1, 1): "quality", (2, 0): "mixed", (2, 1): "quality_mixed"}
+
+# Config values that are only read at startup
+RESTART_SECTIONS = ("credentials", "storage", "cache", "events", "locks", "metrics")
+
+
+class RulesetError(ValueError):
+    """game_data.json or config.json is not valid. The message says what is wrong."""
+
+
+def _number(value, name, minimum=0):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value < minimum:
+        raise RulesetError("{} must be a number of at least {}".format(name, minimum))
+
+def validate_game_data(data):
+    """Raise RulesetError if game_data.json is missing anything the commands use."""
+    if not isinstance(data, dict):
+        raise RulesetError("game_data.json must be an object")
+    for key in ("embeds", "juice_upgrades", "fruits", "fruit_price", "img_urls", "max_trades"):
+        if key not in data:
+            raise RulesetError("game_data.json: missing {}".format(key))
+
+    if not data["fruits"] or not all(isinstance(x, str) for x in data["fruits"]):
+        raise RulesetError("fruits must be a list of fruit names")
+    _number(data["fruit_price"], "fruit_price")
+    _number(data["max_trades"], "max_trades", 1)
+    for fruit in data["fruits"]:
+        if fruit not in data["img_urls"]:
+            raise RulesetError("img_urls: missing {}".format(fruit))
+
+    juice_upgrades = data["juice_upgrades"]
+    id_to_name = juice_upgrades.get("id_to_name", {})
+    for level in range(1, 5):
+        name = id_to_name.get(str(level))
+        if name not in juice_upgrades:
+            raise RulesetError("juice_upgrades: level {} does not name an upgrade".format(level))
+    for (count, level), name in RECIPES.items():
+        recipe = juice_upgrades.get(name)
+        if not isinstance(recipe, dict):
+            raise RulesetError("juice_upgrades: missing {}".format(name))
+        for key in ("name", "description"):
+            if not isinstance(recipe.get(key), str):
+                raise RulesetError("juice_upgrades.{}.{} must be text".format(name, key))
+        for key in ("unlock_price", "item_price", "refine_time"):
+            _number(recipe.get(key), "juice_upgrades.{}.{}".format(name, key))
+        fruit_req = recipe.get("fruit_req")
+        if not isinstance(fruit_req, list) or len(fruit_req) != count:
+            raise RulesetError("juice_upgrades.{}.fruit_req must list {} amount(s)".format(name, count))
+        for n, amount in enumerate(fruit_req):
+            _number(amount, "juice_upgrades.{}.fruit_req.{}".format(name, n), 1)
+
+    embeds = data["embeds"]
+    for name in TEMPLATE_SLOTS:
+        if not isinstance(embeds.get(name), dict):
+            raise RulesetError("embeds: missing {}".format(name))
+
+def validate_config(config):
+    """Raise RulesetError if config.json is missing anything the bot needs."""
+    if not isinstance(config, dict):
+        raise RulesetError("config.json must be an object")
+    for section, keys in (("credentials", ("token",)), ("chat", ("prefix", "bind_to_channels")), ("bot", ("debug_level", "discord_debug_mode"))):
+        if not isinstance(config.get(section), dict):
+            raise RulesetError("config.json: missing {}".format(section))
+        for key in keys:
+            if key not in config[section]:
+                raise RulesetError("config.json: missing {}.{}".format(section, key))
+    if not isinstance(config["chat"]["prefix"], str):
+        raise RulesetError("chat.prefix must be text")
+    if not isinstance(config["chat"]["bind_to_channels"], list):
+        raise RulesetError("chat.bind_to_channels must be a list of channel ids")
+
+
+class Ruleset:
+
+    def __init__(self, game_data, config):
+        """game_data.json and config.json, checked and with everything derived from them built once.
+
+        A ruleset is never changed after it is made. Reloading builds a new one
+        and swaps it in (GameManager.apply_ruleset), so a bad edit is rejected
+        before anything uses it.
+
+        Arguments:
+            game_data {dict} -- Parsed game_data.json.
+            config {dict} -- Parsed config.json.
+        """
+        validate_game_data(game_data)
+        validate_config(config)
+        self.game_data = game_data
+        self.config = config
+
+        # Embed templates, and the slots the commands fill in must be in them
+        self.templates = compile_templates(game_data["embeds"])
+        for name, slots in TEMPLATE_SLOTS.items():
+            missing = [x for x in slots if x not in self.templates[name].slots]
+            if missing:
+                raise RulesetError("embeds.{}: no {{}} in {}".format(name, ", ".join(missing)))
+
+        # (amount of fruits, level) -> juice_upgrades entry
+        juice_upgrades = game_data["juice_upgrades"]
+        self.recipes = {key: juice_upgrades[name] for key, name in RECIPES.items()}
+
+    @classmethod
+    def load(cls, data_path, config_path=None, config=None):
+        """Read, parse and check the files.
+
+        Keyword Arguments:
+            config_path {str} -- config.json to read. (default: {None})
+            config {dict} -- Config to use instead of reading config_path. (default: {None})
+
+        Returns:
+            Ruleset
+        """
+        game_data = cls._read(data_path)
+        if config is None:
+            config = cls._read(config_path)
+        return cls(game_data, config)
+
+    @staticmethod
+    def _read(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise RulesetError("{}: {}".format(os.path.basename(path), e))
+
+    def restart_changes(self, other):
+        """Config sections that differ from other but are only read at startup."""
+        return [x for x in RESTART_SECTIONS if self.config.get(x) != other.config.get(x)]
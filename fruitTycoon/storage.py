@@ -0,0 +1,543 @@
+# Internal Python Moduels
+import os
+import copy
+import json
+import sqlite3
+import asyncio
+import logging
+import argparse
+import threading
+from abc import ABC, abstractmethod
+
+from .json import Json, run_io
+from .writer import GroupCommitWriter, write_files
+from .codec import CODECS, JsonCodec, PlayerCodec
+
+log = logging.getLogger("root")
+log.debug("storage.py loaded")
+
+DATA_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) + "/data/"
+
+
+class Storage(ABC):
+    """Where Player records and the PlayerIndex are kept.
+
+    A record is the dict a Player saves (see Player.save), keyed by player id.
+    """
+
+    name = None
+
+    # Players
+    # ---------------------------
+    @abstractmethod
+    def load_player(self, player_id):
+        """Return the record for player_id, or None if there isn't one."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_player(self, player_id, record):
+        """Write a record. Returns True if it succeeded."""
+        raise NotImplementedError
+
+    def save_players(self, records):
+        """Write several (player_id, record) pairs. Returns the amount written."""
+        return sum(1 for player_id, record in records if self.save_player(player_id, record))
+
+    @abstractmethod
+    def delete_player(self, player_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_players(self):
+        """Yield (player_id, record) for every stored player."""
+        raise NotImplementedError
+
+    def iter_money(self):
+        """Yield (player_id, money) for every stored player."""
+        for player_id, record in self.iter_players():
+            yield player_id, record.get("money", 0)
+
+    # Index
+    # ---------------------------
+    @abstractmethod
+    def load_index(self):
+        """Return the ids of every player in the game, in the order they joined."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_index(self, player_ids):
+        """Replace the whole index."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def index_add(self, player_id, players=None):
+        """Record that a player joined.
+
+        Arguments:
+            player_id {str} -- The player that joined.
+
+        Keyword Arguments:
+            players {iterable} -- Every player id after the change, for backends that rewrite the index. (default: {None})
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def index_remove(self, player_id, players=None):
+        raise NotImplementedError
+
+    # Async
+    # ---------------------------
+    # Run the blocking methods on the I/O pool. Backends can override these with native versions.
+    async def load_player_async(self, player_id):
+        return await run_io(self.load_player, player_id)
+
+    async def save_player_async(self, player_id, record):
+        return await run_io(self.save_player, player_id, record)
+
+    async def save_players_async(self, records):
+        return await run_io(self.save_players, records)
+
+    async def load_index_async(self):
+        return await run_io(self.load_index)
+
+    async def save_index_async(self, player_ids):
+        return await run_io(self.save_index, list(player_ids))
+
+    # Misc
+    # ---------------------------
+    def flush(self):
+        """Block until every queued async save is written."""
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonStorage(Storage):
+    """One JSON file per player in data/player_data, plus data/index.json.
+
+    Index changes are appended to data/index.journal, which is folded back
+    into index.json once it reaches compact_threshold entries.
+
+    With codec="binary" player files are written in the compact binary
+    format (<id>.dat) instead; players still in a legacy <id>.json file are
+    read from it until they are next saved.
+    """
+
+    name = "json"
+
+    # Amount of journal entries before the snapshot is rewritten
+    compact_threshold = 1000
+
+    def __init__(self, directory=None, commit_window=0.05, codec="json"):
+        directory = directory or DATA_PATH
+
+        if codec not in CODECS:
+            raise ValueError("Unknown player record codec: {}".format(codec))
+        self.codec = CODECS[codec]
+
+        self.player_dir = os.path.join(directory, "player_data")
+        self.index_file = os.path.join(directory, "index.json")
+        self.journal_file = os.path.join(directory, "index.journal")
+        os.makedirs(self.player_dir, exist_ok=True)
+
+        self.journal = None
+        self.journal_length = 0
+        self.compacting = False
+
+        # Async saves are coalesced and written together
+        self.writer = GroupCommitWriter(self._commit, window=commit_window)
+
+    def player_file(self, player_id):
+        return os.path.join(self.player_dir, "{}{}".format(player_id, self.codec.extension))
+
+    def _legacy_file(self, player_id):
+        # Where a player's record is if it has not been saved since switching codec
+        return os.path.join(self.player_dir, "{}{}".format(player_id, JsonCodec.extension))
+
+    def _existing_file(self, player_id):
+        path = self.player_file(player_id)
+        if self.codec.extension != JsonCodec.extension and not os.path.exists(path):
+            return self._legacy_file(player_id)
+        return path
+
+    def _commit(self, items):
+        return write_files([(path, self.codec.encode(record)) for path, record in items])
+
+    # Players
+    # ---------------------------
+    def load_player(self, player_id):
+        path = self.player_file(player_id)
+        unwritten = self.writer.get(path)
+        if unwritten is not None:
+            return copy.deepcopy(unwritten)
+
+        path = self._existing_file(player_id)
+        if not os.path.exists(path):
+            return None
+        return Json(path, codec=self.codec).data
+
+    def save_player(self, player_id, record):
+        return bool(Json(self.player_file(player_id), load=False, codec=self.codec).dump(record))
+
+    async def load_player_async(self, player_id):
+        path = self.player_file(player_id)
+        unwritten = self.writer.get(path)
+        if unwritten is not None:
+            return copy.deepcopy(unwritten)
+
+        try:
+            return (await run_io(Json, self._existing_file(player_id), True, self.codec)).data
+        except FileNotFoundError:
+            return None
+
+    async def save_player_async(self, player_id, record):
+        return await self.writer.submit(self.player_file(player_id), record)
+
+    async def save_players_async(self, records):
+        futures = [self.writer.submit(self.player_file(player_id), record) for player_id, record in records]
+        return sum(await asyncio.gather(*futures))
+
+    def delete_player(self, player_id):
+        try:
+            os.remove(self._existing_file(player_id))
+        except Exception as e:
+            log.error(e)
+            return None
+
+        # Drop a stale legacy file too
+        legacy = self._legacy_file(player_id)
+        if legacy != self.player_file(player_id) and os.path.exists(legacy):
+            os.remove(legacy)
+        return True
+
+    def iter_players(self):
+        extension = self.codec.extension
+        with os.scandir(self.player_dir) as entries:
+            paths = {}
+            for entry in entries:
+                player_id, ext = os.path.splitext(entry.name)
+                # Prefer the current codec's file over a stale legacy one
+                if ext == extension or (ext == JsonCodec.extension and player_id not in paths):
+                    paths[player_id] = entry.path
+
+        for player_id, path in paths.items():
+            yield player_id, Json(path, codec=self.codec).data
+
+    # Index
+    # ---------------------------
+    def load_index(self):
+        """Load index from json, then replay the journal on top of it."""
+        if os.path.exists(self.index_file):
+            snapshot = Json(self.index_file).get("players", fallback=[])
+        else:
+            snapshot = []
+        players = dict.fromkeys(snapshot)
+
+        # A leftover .compacting journal means the bot stopped mid-compaction
+        replayed = self._replay(self.journal_file + ".compacting", players)
+        replayed += self._replay(self.journal_file, players)
+
+        log.debug("JsonStorage: loaded {} players ({} journal entries)".format(len(players), replayed))
+        return list(players)
+
+    def save_index(self, player_ids):
+        self._write_snapshot(list(player_ids))
+
+        # The snapshot is now complete, so the journal is no longer needed
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        for path in (self.journal_file, self.journal_file + ".compacting"):
+            if os.path.exists(path):
+                os.remove(path)
+        self.journal_length = 0
+
+    def index_add(self, player_id, players=None):
+        self._append("+", player_id, players)
+
+    def index_remove(self, player_id, players=None):
+        self._append("-", player_id, players)
+
+    def _replay(self, path, players):
+        if not os.path.exists(path):
+            return 0
+
+        count = 0
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                # Ignore a partially written last line
+                if not line.endswith("\n") or len(line) < 3:
+                    continue
+                if line[0] == "+":
+                    players[line[1:-1]] = None
+                elif line[0] == "-":
+                    players.pop(line[1:-1], None)
+                count += 1
+        return count
+
+    def _write_snapshot(self, players, rotated_journal=None):
+        Json(self.index_file, load=False).dump({"players": players})
+
+        if rotated_journal is not None:
+            os.remove(rotated_journal)
+
+    # Journal
+    # ---------------------------
+    def _append(self, op, player_id, players):
+        if self.journal is None:
+            self.journal = open(self.journal_file, 'a', encoding='utf-8')
+
+        self.journal.write("{}{}\n".format(op, player_id))
+        self.journal.flush()
+        self.journal_length += 1
+
+        if players is not None and self.journal_length >= self.compact_threshold and not self.compacting:
+            self.compact(players)
+
+    def compact(self, players):
+        """Fold the journal into index.json in the background.
+
+        Arguments:
+            players {list} -- The full, current list of player ids.
+        """
+        self.compacting = True
+
+        # Move the current journal aside so new entries start a fresh one
+        rotated = self.journal_file + ".compacting"
+        self.journal.close()
+        if os.path.exists(rotated):
+            # A previous compaction failed, keep its entries in front of the new ones
+            with open(rotated, 'a', encoding='utf-8') as dst, open(self.journal_file, encoding='utf-8') as src:
+                dst.write(src.read())
+            os.remove(self.journal_file)
+        else:
+            os.replace(self.journal_file, rotated)
+        self.journal = open(self.journal_file, 'a', encoding='utf-8')
+        self.journal_length = 0
+
+        future = asyncio.get_event_loop().run_in_executor(None, self._write_snapshot, list(players), rotated)
+        future.add_done_callback(self._compaction_done)
+
+    def _compaction_done(self, future):
+        self.compacting = False
+        if future.exception() is not None:
+            log.error("JsonStorage: compaction failed: {}".format(future.exception()))
+
+    # Misc
+    # ---------------------------
+    def flush(self):
+        self.writer.flush_sync()
+
+    def close(self):
+        self.flush()
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+
+
+class SqliteStorage(Storage):
+    """Every player in a single SQLite database file.
+
+    money and last_harvest are kept in their own indexed columns so they can
+    be queried without decoding each record. With codec="binary" the data
+    column holds binary records (BLOB) instead of JSON text; rows of either
+    kind are read.
+    """
+
+    name = "sqlite"
+
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS players ("
+        "id TEXT PRIMARY KEY, money REAL NOT NULL DEFAULT 0, "
+        "last_harvest INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS players_money ON players (money)",
+        "CREATE INDEX IF NOT EXISTS players_last_harvest ON players (last_harvest)",
+        "CREATE TABLE IF NOT EXISTS player_index ("
+        "seq INTEGER PRIMARY KEY AUTOINCREMENT, id TEXT NOT NULL UNIQUE)"
+    )
+
+    # Statements are kept as constants so sqlite3's statement cache reuses the prepared versions
+    SELECT_PLAYER = "SELECT data FROM players WHERE id = ?"
+    UPSERT_PLAYER = (
+        "INSERT INTO players (id, money, last_harvest, data) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(id) DO UPDATE SET money = excluded.money, "
+        "last_harvest = excluded.last_harvest, data = excluded.data"
+    )
+    DELETE_PLAYER = "DELETE FROM players WHERE id = ?"
+    SELECT_ALL_PLAYERS = "SELECT id, data FROM players"
+    SELECT_ALL_MONEY = "SELECT id, money FROM players"
+    SELECT_INDEX = "SELECT id FROM player_index ORDER BY seq"
+    INSERT_INDEX = "INSERT OR IGNORE INTO player_index (id) VALUES (?)"
+    DELETE_INDEX = "DELETE FROM player_index WHERE id = ?"
+    CLEAR_INDEX = "DELETE FROM player_index"
+
+    def __init__(self, path=None, commit_window=0.05, codec="json"):
+        self.path = path or DATA_PATH + "players.db"
+
+        if codec not in CODECS:
+            raise ValueError("Unknown player record codec: {}".format(codec))
+        self.codec = CODECS[codec]
+
+        self.connection = sqlite3.connect(self.path, check_same_thread=False, cached_statements=64)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        with self.connection:
+            for statement in SqliteStorage.SCHEMA:
+                self.connection.execute(statement)
+
+        # The connection is shared with executor threads
+        self.lock = threading.Lock()
+
+        # Async saves are coalesced and committed in one transaction
+        self.writer = GroupCommitWriter(self._commit, window=commit_window)
+
+    def _commit(self, items):
+        succeeded = self.save_players(items) == len(items)
+        return [succeeded] * len(items)
+
+    def _row(self, player_id, record):
+        if self.codec.name == JsonCodec.name:
+            data = json.dumps(record, separators=(",", ":"))
+        else:
+            data = self.codec.encode(record)
+        return player_id, record.get("money", 0), record.get("last_harvest", 0), data
+
+    @staticmethod
+    def _decode(data):
+        # JSON rows come back as str, binary rows as bytes
+        if isinstance(data, str):
+            return json.loads(data)
+        return CODECS[PlayerCodec.name].decode(data)
+
+    # Players
+    # ---------------------------
+    def load_player(self, player_id):
+        unwritten = self.writer.get(player_id)
+        if unwritten is not None:
+            return copy.deepcopy(unwritten)
+
+        with self.lock:
+            row = self.connection.execute(SqliteStorage.SELECT_PLAYER, (player_id,)).fetchone()
+        if row is None:
+            return None
+        return SqliteStorage._decode(row[0])
+
+    def save_player(self, player_id, record):
+        return self.save_players(((player_id, record),)) == 1
+
+    def save_players(self, records):
+        rows = [self._row(player_id, record) for player_id, record in records]
+        try:
+            with self.lock, self.connection:
+                self.connection.executemany(SqliteStorage.UPSERT_PLAYER, rows)
+        except sqlite3.Error as e:
+            log.error("SqliteStorage: could not save players: {}".format(e))
+            return 0
+        return len(rows)
+
+    async def save_player_async(self, player_id, record):
+        return await self.writer.submit(player_id, record)
+
+    async def save_players_async(self, records):
+        futures = [self.writer.submit(player_id, record) for player_id, record in records]
+        return sum(await asyncio.gather(*futures))
+
+    def delete_player(self, player_id):
+        with self.lock, self.connection:
+            self.connection.execute(SqliteStorage.DELETE_PLAYER, (player_id,))
+        return True
+
+    def iter_players(self):
+        with self.lock:
+            rows = self.connection.execute(SqliteStorage.SELECT_ALL_PLAYERS).fetchall()
+        for player_id, data in rows:
+            yield player_id, SqliteStorage._decode(data)
+
+    def iter_money(self):
+        # Read from the money column, without decoding any records
+        with self.lock:
+            rows = self.connection.execute(SqliteStorage.SELECT_ALL_MONEY).fetchall()
+        return iter(rows)
+
+    # Index
+    # ---------------------------
+    def load_index(self):
+        with self.lock:
+            return [row[0] for row in self.connection.execute(SqliteStorage.SELECT_INDEX)]
+
+    def save_index(self, player_ids):
+        with self.lock, self.connection:
+            self.connection.execute(SqliteStorage.CLEAR_INDEX)
+            self.connection.executemany(SqliteStorage.INSERT_INDEX, ((x,) for x in player_ids))
+
+    def index_add(self, player_id, players=None):
+        with self.lock, self.connection:
+            self.connection.execute(SqliteStorage.INSERT_INDEX, (player_id,))
+
+    def index_remove(self, player_id, players=None):
+        with self.lock, self.connection:
+            self.connection.execute(SqliteStorage.DELETE_INDEX, (player_id,))
+
+    # Misc
+    # ---------------------------
+    def flush(self):
+        self.writer.flush_sync()
+
+    def close(self):
+        self.flush()
+        with self.lock:
+            self.connection.close()
+
+
+BACKENDS = {
+    JsonStorage.name: JsonStorage,
+    SqliteStorage.name: SqliteStorage
+}
+
+def create_storage(backend="json", path=None, **options):
+    """Create a storage backend by name.
+
+    Keyword Arguments:
+        backend {str} -- Either "json" or "sqlite". (default: {"json"})
+        path {str} -- Data directory (json) or database file (sqlite). Uses the default location if blank. (default: {None})
+        commit_window {float} -- Seconds async saves are collected before being committed together.
+        codec {str} -- Player record format, "json" or "binary".
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown storage backend: {}".format(backend))
+    return BACKENDS[backend](path or None, **options)
+
+def migrate(source, target):
+    """Copy every player and the index from one backend to another.
+
+    Returns:
+        int -- The amount of players copied.
+    """
+    batch = []
+    copied = 0
+    for player_id, record in source.iter_players():
+        batch.append((player_id, record))
+        if len(batch) >= 500:
+            copied += target.save_players(batch)
+            batch = []
+    copied += target.save_players(batch)
+
+    target.save_index(source.load_index())
+    return copied
+
+
+if __name__ == "__main__":
+    # python -m fruitTycoon.storage json sqlite
+    parser = argparse.ArgumentParser(description="Move player data between storage backends.")
+    parser.add_argument("source", choices=BACKENDS.keys())
+    parser.add_argument("target", choices=BACKENDS.keys())
+    parser.add_argument("--source-path", default=None, help="Data directory or database file to read from.")
+    parser.add_argument("--target-path", default=None, help="Data directory or database file to write to.")
+    args = parser.parse_args()
+
+    source = create_storage(args.source, args.source_path)
+    target = create_storage(args.target, args.target_path)
+    print("Migrated {} players from {} to {}.".format(migrate(source, target), source.name, target.name))
+    source.close()
+    target.close()
@@ -1,12 +1,20 @@
-import copy
 import logging
+from sys import intern
 from discord import Embed
 
 log = logging.getLogger("root")
 log.debug("trade.py loaded")
 
+def _pair(value):
+    # JSON turns tuples into lists, turn them back and share the fruit name string
+    if value is None:
+        return None
+    return (intern(value[0]) if isinstance(value[0], str) else value[0], value[1])
+
 class Trade:
 
+    __slots__ = ("sender", "recipient", "sender_name", "recipient_name", "sender_slot", "recipient_slot", "request", "offer")
+
     def __init__(self, sender=None, recipient=None, request=None, offer=None):
         """Holds the details of the trade, and stored in recipient's inbox.
         
@@ -26,6 +34,10 @@ class Trade:
 
             self.sender_slot = sender[2]
             self.recipient_slot = recipient[2]
+        else:
+            self.sender = self.recipient = None
+            self.sender_name = self.recipient_name = None
+            self.sender_slot = self.recipient_slot = None
 
         self.request = request
         self.offer = offer
@@ -51,24 +63,23 @@ class Trade:
         """Creates a discord.Embed from the template "trade_confirmation" in the game_data.json file.
         
         Arguments:
-            template {dict} -- Contains the template for the embed file.
+            template {EmbedTemplate} -- The compiled "trade_confirmation" template.
         
         Returns:
             discord.Embed -- A discord.Embed object containing the details of the trade.
         """
-        embed = copy.deepcopy(template)
-        
-        embed["title"] = embed["title"].format(self.recipient.name)
         thumbnail = self.recipient.avatar_url if not self.recipient.avatar_url == "" else self.recipient.default_avatar_url
-        embed["thumbnail"]["url"] = embed["thumbnail"]["url"].format(thumbnail)
-        embed["author"]["name"] = embed["author"]["name"].format(self.sender.name)
         icon = self.sender.avatar_url if not self.sender.avatar_url == "" else self.sender.default_avatar_url
-        embed["author"]["icon_url"] = embed["author"]["icon_url"].format(icon)
-        
-        
         request, offer = self._convert_short_text()
-        embed["fields"][0]["value"] = embed["fields"][0]["value"].format(request, self.request[1])
-        embed["fields"][1]["value"] = embed["fields"][1]["value"].format(offer, self.offer[1])
+
+        embed = template.render({
+            "title": self.recipient.name,
+            "thumbnail.url": thumbnail,
+            "author.name": self.sender.name,
+            "author.icon_url": icon,
+            "fields.0.value": (request, self.request[1]),
+            "fields.1.value": (offer, self.offer[1])
+        })
 
         return Embed().from_data(embed)
 
@@ -76,24 +87,23 @@ class Trade:
         """Creates a discord.Embed from the template "trade_incoming" in the game_data.json file.
         
         Arguments:
-            template {dict} -- Contains the template for the embed file.
+            template {EmbedTemplate} -- The compiled "trade_incoming" template.
         
         Returns:
             discord.Embed -- A discord.Embed object containing the details of the trade.
         """
-        embed = copy.deepcopy(template)
-
-        embed["description"] = embed["description"].format(self.sender.name)
         thumbnail = self.recipient.avatar_url if not self.recipient.avatar_url == "" else self.recipient.default_avatar_url
-        embed["thumbnail"]["url"] = embed["thumbnail"]["url"].format(thumbnail)
-        embed["author"]["name"] = embed["author"]["name"].format(self.sender.name)
         icon = self.sender.avatar_url if not self.sender.avatar_url == "" else self.sender.default_avatar_url
-        embed["author"]["icon_url"] = embed["author"]["icon_url"].format(icon)
-
-
         request, offer = self._convert_short_text()
-        embed["fields"][0]["value"] = embed["fields"][0]["value"].format(request, self.request[1])
-        embed["fields"][1]["value"] = embed["fields"][1]["value"].format(offer, self.offer[1])
+
+        embed = template.render({
+            "description": self.sender.name,
+            "thumbnail.url": thumbnail,
+            "author.name": self.sender.name,
+            "author.icon_url": icon,
+            "fields.0.value": (request, self.request[1]),
+            "fields.1.value": (offer, self.offer[1])
+        })
 
         return Embed().from_data(embed)
 
@@ -102,7 +112,12 @@ class Trade:
 
         # Set instance variables to loaded variables
         try:
-            self.__dict__ = string
+            for name in Trade.__slots__:
+                setattr(self, name, string.get(name))
+
+            # (fruit_type, quantity) pairs are kept as tuples
+            self.request = _pair(self.request)
+            self.offer = _pair(self.offer)
         except Exception as e:
             log.error(e)
             return None
@@ -114,9 +129,52 @@ class Trade:
         """Save Trade variables to string."""
         
         # Sender & Recipient serialize to their id
-        if not isinstance(self.sender, str) or not isinstance(self.recipient, str):
-            self.sender = self.sender.id
-            self.recipient = self.recipient.id
-        
-        # print(self.__dict__)
-        return self.__dict__
\ No newline at end of file
+        return {
+            "sender": self.sender_id,
+            "recipient": self.recipient_id,
+            "sender_name": self.sender_name,
+            "recipient_name": self.recipient_name,
+            "sender_slot": self.sender_slot,
+            "recipient_slot": self.recipient_slot,
+            "request": self.request,
+            "offer": self.offer
+        }
+
+    @property
+    def sender_id(self):
+        return self.sender if isinstance(self.sender, str) else self.sender.id
+
+    @property
+    def recipient_id(self):
+        return self.recipient if isinstance(self.recipient, str) else self.recipient.id
+
+
+class OutgoingTrade:
+
+    __slots__ = ("recipient_name", "recipient_id", "request", "offer")
+
+    def __init__(self, recipient_name, recipient_id, request, offer):
+        """The sender's copy of a trade (only holds details), stored in their outbox.
+
+        Arguments:
+            recipient_name {str} -- Name of the recipient when the trade was sent.
+            recipient_id {str} -- The recipient's id.
+            request {tuple} -- (fruit_type, quantity)
+            offer {tuple} -- (fruit_type, quantity)
+        """
+        self.recipient_name = recipient_name
+        self.recipient_id = recipient_id
+        self.request = request
+        self.offer = offer
+
+    @classmethod
+    def from_record(cls, record):
+        return cls(record["recipient_name"], record["recipient_id"], _pair(record["request"]), _pair(record["offer"]))
+
+    def to_record(self):
+        return {
+            "recipient_name": self.recipient_name,
+            "recipient_id": self.recipient_id,
+            "request": self.request,
+            "offer": self.offer
+        }
@@ -0,0 +1,109 @@
+# Internal Python Moduels
+import logging
+
+log = logging.getLogger("root")
+log.debug("transaction.py loaded")
+
+
+class TransactionError(Exception):
+    """A transaction's players could not be written. They are back as they were before it."""
+
+
+class Transaction:
+
+    def __init__(self, game, player_ids, action="update"):
+        """Changes several players together: all of them are committed, or none.
+
+        Used as `async with game.transaction(a, b) as (player_a, player_b):`.
+        Entering takes the players' locks (see LockManager), loads the players
+        and snapshots them. If the block raises, every player is put back to
+        its snapshot. Otherwise the players that changed are saved, as one
+        event log record that reaches the disk first, and then written to
+        storage in one group commit before the locks are released. A crash
+        during the write is rolled forward from the log at startup.
+
+        If storage doesn't write every player, the players are put back to
+        their snapshots (logged too, so recovery agrees), the snapshots are
+        written and TransactionError is raised from the async with.
+
+        Arguments:
+            game {GameManager} -- The game, for player loading and saving.
+            player_ids {iterable} -- The players to change, in the order they are returned.
+
+        Keyword Arguments:
+            action {str} -- Recorded in the event log for every changed player. (default: {"update"})
+        """
+        self.game = game
+        self.player_ids = list(player_ids)
+        self.action = action
+
+        self.locks = []
+        self.players = []
+        self.snapshots = {} # player_id -> record before the transaction
+
+    async def __aenter__(self):
+        try:
+            self.locks = await self.game.locks.acquire(self.player_ids)
+
+            # Missing players are returned as None
+            for player_id in self.player_ids:
+                player = await self.game.get_player(player_id)
+                if player is not None and player.id not in self.snapshots:
+                    self.snapshots[player.id] = player.to_record()
+                self.players.append(player)
+        except BaseException:
+            self._release()
+            raise
+        return self.players
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                self.rollback()
+        finally:
+            self._release()
+        return False
+
+    # Commit / Rollback
+    # ---------------------------
+
+    async def commit(self):
+        changed = []
+        for player in self.players:
+            if player is None or player in changed:
+                continue
+            if player.to_record() != self.snapshots[player.id]:
+                changed.append(player)
+        if not changed:
+            return
+
+        # The log record is the commit point, then one write for every player
+        self.game.save_players(changed, self.action)
+        written = await self.game.storage.save_players_async([(player.id, player.to_record()) for player in changed])
+        self.game.metrics.inc("player_saves_total", written)
+        if written < len(changed):
+            await self._undo(changed)
+            raise TransactionError("{} of {} could not be written".format(self.action, ", ".join(x.id for x in changed)))
+        self.game.metrics.inc("transactions_total")
+
+    def rollback(self):
+        for player in self.players:
+            if player is not None:
+                player.load_record(self.snapshots[player.id])
+        self.game.metrics.inc("transaction_rollbacks_total")
+        log.warning("Rolled back {} of {}".format(self.action, ", ".join(self.snapshots)))
+
+    async def _undo(self, changed):
+        # Some player files may have the new record already, put every one back
+        self.rollback()
+        self.game.save_players(changed, "rollback " + self.action)
+        written = await self.game.storage.save_players_async([(player.id, player.to_record()) for player in changed])
+        self.game.metrics.inc("player_saves_total", written)
+        if written < len(changed):
+            log.error("Could not write the rollback of {}, it stays in the cache and the event log".format(self.action))
+
+    def _release(self):
+        self.game.locks.release(self.locks)
+        self.locks = []
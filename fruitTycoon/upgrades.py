@@ -0,0 +1,96 @@
+# Internal Python Moduels
+import math
+import logging
+from itertools import accumulate
+
+log = logging.getLogger("root")
+log.debug("upgrades.py loaded")
+
+class UpgradeCurve:
+
+    # Levels precomputed in the tables, formulas are used past this
+    table_levels = 200
+
+    def __init__(self, base_price, ratio, value):
+        """Prices and values of an upgrade whose price grows geometrically.
+
+        Going from level n to n+1 costs int(base_price * ratio ** (n-1)). Prices
+        and values are computed once into tables shared by every player, and a
+        prefix sum of the prices gives the cost of any run of levels in O(1).
+
+        Arguments:
+            base_price {int} -- Price of the first upgrade (level 1 -> 2).
+            ratio {float} -- How much each upgrade costs compared to the one before it.
+            value {function} -- Level -> the stat's value at that level.
+        """
+        self.base_price = base_price
+        self.ratio = ratio
+        self.value_formula = value
+
+        levels = UpgradeCurve.table_levels
+        self.prices = [int(base_price * (ratio ** (n-1))) for n in range(1, levels + 1)] # [n-1] -> price from level n
+        self.prefix = [0] + list(accumulate(self.prices)) # [n-1] -> total price from level 1 to level n
+        self.values = [value(n) for n in range(1, levels + 2)] # [n-1] -> value at level n
+
+    # Single levels
+    # ---------------------------
+
+    def price(self, level):
+        """Price of going from level to level+1 (math.inf if it is too large to represent)."""
+        if level <= len(self.prices):
+            return self.prices[level-1]
+        try:
+            return int(self.base_price * (self.ratio ** (level-1)))
+        except OverflowError:
+            return math.inf
+
+    def value(self, level):
+        """The stat's value at level."""
+        if level <= len(self.values):
+            return self.values[level-1]
+        return self.value_formula(level)
+
+    # Bulk purchases
+    # ---------------------------
+
+    def cost(self, level, count):
+        """Total price of buying count levels, starting at level (math.inf if it is too large to represent)."""
+        end = level + count
+        limit = len(self.prices) + 1
+        if end <= limit:
+            return self.prefix[end-1] - self.prefix[level-1]
+
+        # Past the tables, the rest is a geometric series
+        total = self.prefix[-1] - self.prefix[level-1] if level < limit else 0
+        start = max(level, limit)
+        try:
+            first = self.base_price * (self.ratio ** (start-1))
+            return total + int(first * (self.ratio ** (end - start) - 1) / (self.ratio - 1))
+        except OverflowError:
+            # e.g. upgrade size 100000, no one can afford this
+            return math.inf
+
+    def max_affordable(self, level, money):
+        """The most levels that can be bought from level with money."""
+        if money < self.price(level):
+            return 0
+
+        # Invert the geometric sum for an estimate, then correct it for the truncated prices
+        try:
+            first = self.base_price * (self.ratio ** (level-1))
+            count = max(0, int(math.log(1 + money * (self.ratio - 1) / first, self.ratio)))
+        except OverflowError:
+            count = 0
+        while count > 0 and self.cost(level, count) > money:
+            count -= 1
+        while self.cost(level, count + 1) <= money:
+            count += 1
+        return count
+
+
+# This is where the formulas are hard-coded in.
+# So change them here.
+CURVES = {
+    "size": UpgradeCurve(10000, 1.25, lambda n: int(1000 + (1500 * (n-1)))),
+    "multiplier": UpgradeCurve(1000, 1.5, lambda n: 1 + (0.1 * (n-1)))
+}
@@ -0,0 +1,205 @@
+# Internal Python Moduels
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger("root")
+log.debug("writer.py loaded")
+
+def write_files(items):
+    """Atomically write several files as one group commit.
+
+    Every file is written to a temporary file first. All of them are then
+    fsynced together, renamed over their targets, and each directory
+    involved is fsynced once.
+
+    Arguments:
+        items {list} -- (path, bytes) pairs.
+
+    Returns:
+        list -- True/False for each item, in the same order.
+    """
+    results = [False] * len(items)
+    temps = []
+
+    # Write everything, fsync everything
+    for pos, (path, payload) in enumerate(items):
+        temp = None
+        try:
+            fd, temp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            temps.append((pos, temp, path))
+        except OSError as e:
+            log.warning("Writer: could not write {}: {}".format(path, e))
+            if temp is not None and os.path.exists(temp):
+                os.remove(temp)
+
+    # Swap them in
+    directories = set()
+    for pos, temp, path in temps:
+        try:
+            os.replace(temp, path)
+            results[pos] = True
+            directories.add(os.path.dirname(path) or ".")
+        except OSError as e:
+            log.warning("Writer: could not replace {}: {}".format(path, e))
+            os.remove(temp)
+
+    # Make the renames durable
+    for directory in directories:
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            continue # Directories cannot be opened on Windows
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    return results
+
+
+class GroupCommitWriter:
+
+    def __init__(self, commit, window=0.05, max_batch=256):
+        """Collects writes for a short window and commits them together on a worker thread.
+
+        Writes to the same key within one window are coalesced, only the newest
+        value is written. Commits run one at a time on the writer's own thread,
+        in the order their windows closed, so an older batch can never land
+        after a newer one. A key whose write failed stays readable through get
+        until a newer value is written.
+
+        Arguments:
+            commit {function} -- Called on the writer's thread with a list of (key, value) pairs, returns a list of True/False results.
+
+        Keyword Arguments:
+            window {float} -- Seconds to wait for more writes before committing. (default: {0.05})
+            max_batch {int} -- Commit early once this many keys are waiting. (default: {256})
+        """
+        self.commit = commit
+        self.window = window
+        self.max_batch = max_batch
+
+        self.pending = {} # key -> [value, asyncio.Future]
+        self.unwritten = {} # key -> newest value that is not durable yet
+        self.in_flight = set() # concurrent.futures.Future of running commits
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="group-commit")
+        self.timer = None
+
+        # Stats
+        self.submitted = 0
+        self.coalesced = 0
+        self.commits = 0
+        self.written = 0
+        self.failed = 0
+        self.commit_time = 0.0
+
+    def submit(self, key, value):
+        """Queue a write.
+
+        Returns:
+            asyncio.Future -- Resolves to True once the value is durable, or False if it failed.
+        """
+        self.submitted += 1
+        self.unwritten[key] = value
+        entry = self.pending.get(key)
+        if entry is not None:
+            entry[0] = value
+            self.coalesced += 1
+            return entry[1]
+
+        loop = asyncio.get_event_loop()
+        future = loop.create_future()
+        self.pending[key] = [value, future]
+
+        if len(self.pending) >= self.max_batch:
+            self._start_commit()
+        elif self.timer is None:
+            self.timer = loop.call_later(self.window, self._start_commit)
+        return future
+
+    def get(self, key):
+        """Return the newest value submitted for key that is not durable yet, or None."""
+        return self.unwritten.get(key)
+
+    async def flush(self):
+        """Commit anything waiting right away and wait for it."""
+        futures = [entry[1] for entry in self.pending.values()]
+        self._start_commit()
+        if futures:
+            await asyncio.wait(futures)
+
+    def flush_sync(self):
+        """Commit anything waiting on the calling thread (used at shutdown)."""
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        for future in list(self.in_flight):
+            future.result()
+
+        batch, self.pending = self.pending, {}
+        if batch:
+            items = [(key, entry[0]) for key, entry in batch.items()]
+            self._resolve(batch, self._run_commit(items))
+
+    def _start_commit(self):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+
+        batch, self.pending = self.pending, {}
+        if not batch:
+            return
+
+        items = [(key, entry[0]) for key, entry in batch.items()]
+        future = self.executor.submit(self._run_commit, items)
+        self.in_flight.add(future)
+        future.add_done_callback(self.in_flight.discard)
+
+        asyncio.wrap_future(future).add_done_callback(lambda f: self._resolve(batch, f.result() if not f.exception() else None))
+
+    def _run_commit(self, items):
+        start = time.perf_counter()
+        try:
+            results = self.commit(items)
+        except Exception as e:
+            log.error("Writer: commit failed: {}".format(e))
+            results = [False] * len(items)
+        self.commit_time += time.perf_counter() - start
+        return results
+
+    def _resolve(self, batch, results):
+        if results is None:
+            results = [False] * len(batch)
+
+        self.commits += 1
+        for (key, entry), succeeded in zip(batch.items(), results):
+            if succeeded:
+                self.written += 1
+                if self.unwritten.get(key) is entry[0]:
+                    del self.unwritten[key]
+            else:
+                self.failed += 1
+            if not entry[1].done():
+                entry[1].set_result(succeeded)
+
+    def stats(self):
+        return {
+            "submitted": self.submitted,
+            "coalesced": self.coalesced,
+            "commits": self.commits,
+            "written": self.written,
+            "failed": self.failed,
+            "pending": len(self.pending),
+            "avg_commit_ms": round(self.commit_time / self.commits * 1000, 2) if self.commits else 0
+        }
@@ -0,0 +1,64 @@
+"""A GameManager on a temporary data directory, driven through the benchmarks' FakeDiscordClient."""
+import os
+import asyncio
+import tempfile
+import unittest
+
+from fruitTycoon.game import GameManager
+from fruitTycoon.production import ProductionScheduler
+from fruitTycoon.eventLog import EventLog
+
+from benchmarks.bench_commands import make_config, build_population
+from benchmarks.fake_client import FakeDiscordClient
+
+
+class GameTestCase(unittest.TestCase):
+
+    players = 4
+    backend = "json"
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.config = make_config(self.directory.name, self.backend)
+        self.journal_location = ProductionScheduler.journal_location
+        self.log_location = EventLog.log_location
+        ProductionScheduler.journal_location = os.path.join(self.directory.name, "productions.journal")
+        EventLog.log_location = os.path.join(self.directory.name, "economy.log")
+
+        self.ids = build_population(self.config, self.players)
+        self.game = self.start_game()
+
+    def tearDown(self):
+        if self.game is not None:
+            self.game.shutdown()
+        ProductionScheduler.journal_location = self.journal_location
+        EventLog.log_location = self.log_location
+        self.directory.cleanup()
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def start_game(self):
+        return self.run_async(self._create())
+
+    async def _create(self):
+        # Created inside the loop, like the bot does
+        return GameManager(config=self.config, client_class=FakeDiscordClient)
+
+    def restart(self, crash=False):
+        """Start a new game on the same data. With crash, the old one is dropped without shutting down."""
+        if crash:
+            # Cached changes are lost, saves already handed to storage are written
+            self.game.production.close()
+            self.game.events.close()
+            self.game.storage.close()
+        else:
+            self.game.shutdown()
+        self.game = None
+        self.game = self.start_game()
+        return self.game
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
@@ -0,0 +1,159 @@
+import os
+import tempfile
+import unittest
+
+from fruitTycoon.eventLog import EventLog, FIELDS
+from fruitTycoon.trade import Trade, OutgoingTrade
+
+from tests.support import GameTestCase
+
+NO_TRADES = {"in_trade": [0, 0], "out_trade": [0, 0]}
+OFFER = {"in_trade": [0, 0], "out_trade": [{"recipient_name": "b", "recipient_id": "2", "request": ("apple", 10), "offer": ("banana", 5)}, 0]}
+
+
+def values(**changed):
+    return tuple(changed.get(field, 0) for field in FIELDS)
+
+
+class EventLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "economy.log")
+        self.log = self.open_log()
+
+    def tearDown(self):
+        self.log.close()
+        self.directory.cleanup()
+
+    def open_log(self, **kwargs):
+        log = EventLog(self.path, **kwargs)
+        self.tail = log.open()
+        return log
+
+    def reopen(self, **kwargs):
+        self.log.close()
+        self.log = self.open_log(**kwargs)
+        return self.tail
+
+    def test_records_changed_fields_only(self):
+        self.assertIsNone(self.log.record("1", values(money=5), values(money=5)))
+        seq = self.log.record("1", values(money=5), values(money=7, apple=1), "sell")
+
+        event, = self.log.events()
+        self.assertEqual(event.seq, seq)
+        self.assertEqual((event.player_id, event.action), ("1", "sell"))
+        self.assertEqual(sorted(event.changes), [("apple", 0, 1), ("money", 5, 7)])
+        self.assertIsNone(event.trades)
+
+    def test_records_trade_slots(self):
+        self.assertIsNone(self.log.record("1", values(), values(), trades=(NO_TRADES, NO_TRADES)))
+        self.log.record("1", values(), values(), "trade", (NO_TRADES, OFFER))
+
+        event, = self.log.events()
+        self.assertEqual(event.changes, ())
+        self.assertEqual(event.trades[0], NO_TRADES)
+        self.assertEqual(event.trades[1]["out_trade"][0]["request"], ["apple", 10])
+
+        # The logged (JSON) form of the slots is not a change
+        self.assertIsNone(self.log.record("1", values(), values(), trades=(event.trades[1], OFFER)))
+
+    def test_tail_is_what_changed_since_the_checkpoint(self):
+        self.log.record("1", values(), values(money=5))
+        self.log.checkpoint()
+        self.log.record("1", values(money=5), values(money=9))
+        self.log.record("2", values(), values(apple=3), trades=(NO_TRADES, OFFER))
+
+        tail = self.reopen()
+        self.assertEqual(tail["1"], {"money": 9})
+        self.assertEqual(tail["2"]["apple"], 3)
+        self.assertEqual(tail["2"]["trades"]["out_trade"][0]["recipient_id"], "2")
+        self.assertEqual(self.log.seq, 3)
+
+    def test_torn_record_is_dropped(self):
+        self.log.record("1", values(), values(money=5))
+        self.log.record("1", values(money=5), values(money=9))
+        self.log.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 3)
+
+        tail = self.reopen()
+        self.assertEqual(tail, {"1": {"money": 5}})
+        self.assertEqual(self.log.seq, 1)
+        # New events follow the last complete one
+        self.assertEqual(self.log.record("1", values(money=5), values(money=6)), 2)
+
+    def test_corrupt_record_is_dropped(self):
+        self.log.record("1", values(), values(money=5))
+        self.log.record("1", values(money=5), values(money=9))
+        self.log.close()
+        with open(self.path, 'r+b') as f:
+            f.seek(-1, os.SEEK_END)
+            last = f.read(1)
+            f.seek(-1, os.SEEK_END)
+            f.write(bytes([last[0] ^ 0xFF]))
+
+        self.assertEqual(self.reopen(), {"1": {"money": 5}})
+        self.assertEqual([x.seq for x in self.log.events()], [1])
+
+    def test_roll_over_carries_uncovered_events(self):
+        self.reopen(max_bytes=1)
+        self.log.record("1", values(), values(money=5))
+        self.log.record("1", values(money=5), values(money=9))
+        self.log.checkpoint(1)
+
+        self.assertEqual(len(self.log.segments()), 2)
+        self.assertEqual([x.seq for x in self.log.events()], [1, 2])
+        self.assertEqual(self.reopen(), {"1": {"money": 9}})
+
+
+class EventLogRecoveryTest(GameTestCase):
+
+    def offer(self, sender, recipient):
+        trade = Trade()
+        trade.load_string({
+            "sender": sender.id, "recipient": recipient.id, "sender_name": "a", "recipient_name": "b",
+            "sender_slot": 0, "recipient_slot": 0, "request": ("apple", 10), "offer": ("banana", 5)
+        })
+        recipient.in_trade[0] = trade
+        sender.out_trade[0] = OutgoingTrade("b", recipient.id, ("apple", 10), ("banana", 5))
+
+    def test_crash_recovers_fields_and_trade_slots(self):
+        sender = self.run_async(self.game.get_player(self.ids[0]))
+        recipient = self.run_async(self.game.get_player(self.ids[1]))
+        money = sender.money
+        sender.money += 100
+        self.offer(sender, recipient)
+        # Only in the cache and the event log
+        self.game.save_player(sender, "trade")
+        self.game.save_player(recipient, "trade")
+
+        game = self.restart(crash=True)
+        sender = self.run_async(game.get_player(self.ids[0]))
+        recipient = self.run_async(game.get_player(self.ids[1]))
+        self.assertEqual(sender.money, money + 100)
+        self.assertIsInstance(sender.out_trade[0], OutgoingTrade)
+        self.assertEqual(sender.out_trade[0].request, ("apple", 10))
+        self.assertIsInstance(recipient.in_trade[0], Trade)
+        self.assertEqual(recipient.in_trade[0].sender_id, self.ids[0])
+
+    def test_rollback_restores_trade_slots(self):
+        sender = self.run_async(self.game.get_player(self.ids[0]))
+        recipient = self.run_async(self.game.get_player(self.ids[1]))
+        self.offer(sender, recipient)
+        seq = self.game.events.seq + 1
+        self.game.save_player(sender, "trade")
+        self.game.save_player(recipient, "trade")
+
+        self.assertEqual(self.run_async(self.game.rollback_player(self.ids[1], seq)), 1)
+        self.assertEqual(recipient.in_trade[0], 0)
+        self.assertEqual(self.game.events.history(self.ids[1], 1)[0].action, "rollback")
+
+        # The rollback is logged, so the trade is still gone after a crash
+        game = self.restart(crash=True)
+        self.assertEqual(self.run_async(game.get_player(self.ids[1])).in_trade[0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import heapq
+
+from fruitTycoon.production import ProductionScheduler
+
+from tests.support import GameTestCase
+
+
+class ProductionSettleTest(GameTestCase):
+
+    def test_settles_a_finished_job(self):
+        player_id = self.ids[0]
+        money = self.run_async(self.game.get_player(player_id)).money
+        self.game.production.schedule(player_id, -1, 500, "regular apple juice")
+
+        self.run_async(self.game.production.settle_due())
+        self.assertEqual(len(self.game.production), 0)
+        self.assertEqual(self.run_async(self.game.get_player(player_id)).money, money + 500)
+
+    def test_paid_job_is_not_paid_again_after_a_crash(self):
+        player_id = self.ids[0]
+        money = self.run_async(self.game.get_player(player_id)).money
+        job = self.game.production.schedule(player_id, -1, 500, "regular apple juice")
+
+        # Stop after the credit is logged, before the job leaves the journal
+        player = self.run_async(self.game.get_player(player_id))
+        player.money += job["profit"]
+        self.game.save_player(player, ProductionScheduler.settle_action.format(job["id"]))
+
+        game = self.restart(crash=True)
+        self.assertEqual(len(game.production), 0)
+        self.run_async(game.production.settle_due())
+        self.assertEqual(self.run_async(game.get_player(player_id)).money, money + 500)
+
+    def test_unpaid_jobs_go_back_on_the_heap_when_settling_fails(self):
+        player_id = self.ids[0]
+        job = self.game.production.schedule(player_id, -1, 500, "regular apple juice")
+
+        get_player = self.game.get_player
+        async def broken(player_id):
+            raise OSError("disk gone")
+        self.game.get_player = broken
+
+        with self.assertRaises(OSError):
+            self.run_async(self.game.production.settle_due())
+        self.assertIn(job["id"], self.game.production.jobs)
+        self.assertEqual(self.game.production.heap, [(job["finish"], job["id"])])
+
+        self.game.get_player = get_player
+        self.run_async(self.game.production.settle_due())
+        self.assertEqual(len(self.game.production), 0)
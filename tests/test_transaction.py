@@ -0,0 +1,112 @@
+import unittest
+
+from fruitTycoon.trade import Trade, OutgoingTrade
+from fruitTycoon.transaction import TransactionError
+
+from benchmarks.bench_commands import APPLE, BANANA
+from tests.support import GameTestCase
+
+
+class TransactionTest(GameTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.a, self.b = self.ids[:2]
+
+    def players(self, game=None):
+        game = game or self.game
+        return [self.run_async(game.get_player(x)) for x in (self.a, self.b)]
+
+    def transfer(self, amount, fail=False):
+        async def scenario():
+            async with self.game.transaction(self.a, self.b, action="transfer") as (player_a, player_b):
+                player_a.money -= amount
+                player_b.money += amount
+                if fail:
+                    raise ValueError("changed my mind")
+        return self.run_async(scenario())
+
+    def break_storage(self, write=0, count=None):
+        """Make the next save_players_async write only the first write records, and report count written."""
+        storage = self.game.storage
+        save_players_async = storage.save_players_async
+        async def partial(records):
+            storage.save_players_async = save_players_async
+            written = await save_players_async(records[:write])
+            return written if count is None else count
+        storage.save_players_async = partial
+
+    def test_commit_writes_every_player(self):
+        money = [x.money for x in self.players()]
+        seq = self.game.events.seq
+        self.transfer(100)
+
+        # One log record, on disk before the write
+        events = list(self.game.events.events(since=seq + 1))
+        self.assertEqual([(x.seq, x.player_id, x.action) for x in events], [(seq + 1, self.a, "transfer"), (seq + 2, self.b, "transfer")])
+        # Written to storage, not only to the cache
+        records = [self.game.storage.load_player(x) for x in (self.a, self.b)]
+        self.assertEqual([x["money"] for x in records], [money[0] - 100, money[1] + 100])
+
+    def test_exception_rolls_back(self):
+        money = [x.money for x in self.players()]
+        seq = self.game.events.seq
+        with self.assertRaises(ValueError):
+            self.transfer(100, fail=True)
+
+        self.assertEqual([x.money for x in self.players()], money)
+        self.assertEqual(self.game.events.seq, seq)
+
+    def test_failed_write_rolls_back(self):
+        money = [x.money for x in self.players()]
+        self.break_storage(write=1)
+        with self.assertRaises(TransactionError):
+            self.transfer(100)
+
+        self.assertEqual([x.money for x in self.players()], money)
+        self.assertEqual(self.game.events.history(self.a, 1)[0].action, "rollback transfer")
+        self.assertEqual([self.game.storage.load_player(x)["money"] for x in (self.a, self.b)], money)
+
+        # The log agrees with the rollback
+        game = self.restart(crash=True)
+        self.assertEqual([x.money for x in self.players(game)], money)
+
+    def test_crash_during_the_write_is_rolled_forward(self):
+        money = [x.money for x in self.players()]
+        # Only the first file is written before the "crash"
+        self.break_storage(write=1, count=2)
+        self.transfer(100)
+        self.assertEqual(self.game.storage.load_player(self.b)["money"], money[1])
+
+        game = self.restart(crash=True)
+        self.assertEqual([x.money for x in self.players(game)], [money[0] - 100, money[1] + 100])
+
+    def test_trade_is_recovered_whole(self):
+        client = self.game.client
+        sender, recipient = client.add_member(self.a), client.add_member(self.b)
+        self.break_storage(write=0, count=2)
+        self.run_async(self.game.send_trade(client.context(sender), "<@{}>".format(self.b), APPLE + "x10", BANANA + "x10", "yes"))
+
+        game = self.restart(crash=True)
+        sender_player, recipient_player = self.players(game)
+        self.assertIsInstance(sender_player.out_trade[0], OutgoingTrade)
+        self.assertIsInstance(recipient_player.in_trade[0], Trade)
+        self.assertEqual(sender_player.inventory["banana"], 10 ** 6 - 10)
+
+    def test_trade_command_reports_a_failed_write(self):
+        client = self.game.client
+        sender, recipient = client.add_member(self.a), client.add_member(self.b)
+        self.break_storage(write=0)
+        self.run_async(self.game.send_trade(client.context(sender), "<@{}>".format(self.b), APPLE + "x10", BANANA + "x10", "yes"))
+        self.run_async(client.outbox.drain())
+
+        messages = [content for destination, content, embed in client.sent]
+        self.assertIn("The trade could not be saved, nothing was changed. Please try again.", messages)
+        self.assertNotIn("Trade sent :incoming_envelope:", messages)
+        sender_player, recipient_player = self.players()
+        self.assertEqual((sender_player.out_trade[0], recipient_player.in_trade[0]), (0, 0))
+        self.assertEqual(sender_player.inventory["banana"], 10 ** 6)
+
+
+if __name__ == "__main__":
+    unittest.main()
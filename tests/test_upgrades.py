@@ -0,0 +1,58 @@
+import unittest
+
+from fruitTycoon.upgrades import CURVES, UpgradeCurve
+
+from tests.support import GameTestCase
+
+
+class UpgradeCurveTest(unittest.TestCase):
+
+    def test_table_matches_formula(self):
+        for curve in CURVES.values():
+            for level in (1, 2, 50, UpgradeCurve.table_levels):
+                self.assertEqual(curve.price(level), int(curve.base_price * curve.ratio ** (level - 1)))
+
+    def test_cost_is_the_sum_of_prices_within_the_table(self):
+        for curve in CURVES.values():
+            for level, count in ((1, 1), (1, 10), (7, 30), (150, 50)):
+                self.assertEqual(curve.cost(level, count), sum(curve.price(n) for n in range(level, level + count)))
+
+    def test_cost_past_the_table_is_close_to_the_sum_of_prices(self):
+        # The closed form only truncates once, the per-level prices truncate every level
+        for curve in CURVES.values():
+            for level, count in ((190, 20), (250, 10)):
+                total = sum(curve.price(n) for n in range(level, level + count))
+                self.assertAlmostEqual(curve.cost(level, count) / total, 1, places=9)
+
+    def test_max_affordable(self):
+        curve = CURVES["size"]
+        for level in (1, 20):
+            for money in (0, curve.price(level), 10 ** 6, 10 ** 9, 10 ** 15):
+                count = curve.max_affordable(level, money)
+                self.assertLessEqual(curve.cost(level, count), money)
+                self.assertGreater(curve.cost(level, count + 1), money)
+
+    def test_huge_purchases_are_infinitely_expensive(self):
+        curve = CURVES["size"]
+        self.assertEqual(curve.cost(1, 100000), float("inf"))
+        self.assertEqual(curve.price(10 ** 6), float("inf"))
+        self.assertEqual(curve.max_affordable(10 ** 6, 10 ** 9), 0)
+
+
+class UpgradeCommandTest(GameTestCase):
+
+    def test_unaffordable_amount_is_refused(self):
+        player_id = self.ids[0]
+        member = self.game.client.add_member(player_id)
+        money = self.run_async(self.game.get_player(player_id)).money
+
+        self.run_async(self.game.upgrade(self.game.client.context(member), "size", "100000"))
+        self.run_async(self.game.client.outbox.drain())
+
+        self.assertIn("You do not have enough money.", [content for destination, content, embed in self.game.client.sent])
+        player = self.run_async(self.game.get_player(player_id))
+        self.assertEqual((player.money, player.upgrade_levels["size"]), (money, 1))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+
+from fruitTycoon.writer import GroupCommitWriter, write_files
+
+
+class RecordingCommit:
+    """A commit function that keeps what it was given, and can be made slow or fail."""
+
+    def __init__(self, delays=(), fail=()):
+        self.delays = list(delays)
+        self.fail = set(fail)
+        self.batches = []
+        self.stored = {}
+
+    def __call__(self, items):
+        if self.delays:
+            time.sleep(self.delays.pop(0))
+        self.batches.append(list(items))
+        results = []
+        for key, value in items:
+            if value in self.fail:
+                results.append(False)
+            else:
+                self.stored[key] = value
+                results.append(True)
+        return results
+
+
+class GroupCommitWriterTest(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_async(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_coalesces_writes_in_one_window(self):
+        commit = RecordingCommit()
+        writer = GroupCommitWriter(commit, window=0.01)
+
+        async def scenario():
+            futures = [writer.submit("a", n) for n in range(5)] + [writer.submit("b", 1)]
+            return await asyncio.gather(*futures)
+
+        self.assertTrue(all(self.run_async(scenario())))
+        self.assertEqual(commit.batches, [[("a", 4), ("b", 1)]])
+        self.assertEqual(writer.stats()["coalesced"], 4)
+        self.assertIsNone(writer.get("a"))
+
+    def test_later_window_is_never_overwritten_by_an_earlier_one(self):
+        # The first commit is slow, the second must still be applied after it
+        commit = RecordingCommit(delays=[0.1, 0])
+        writer = GroupCommitWriter(commit, window=0.01)
+
+        async def overlapping():
+            first = writer.submit("a", "old")
+            writer._start_commit()
+            second = writer.submit("a", "new")
+            writer._start_commit()
+            await asyncio.gather(first, second)
+
+        self.run_async(overlapping())
+        self.assertEqual([batch[0][1] for batch in commit.batches], ["old", "new"])
+        self.assertEqual(commit.stored["a"], "new")
+
+    def test_failed_write_stays_readable(self):
+        commit = RecordingCommit(fail={"lost"})
+        writer = GroupCommitWriter(commit, window=0.01)
+
+        async def scenario():
+            return await writer.submit("a", "lost")
+
+        self.assertFalse(self.run_async(scenario()))
+        self.assertEqual(writer.get("a"), "lost")
+        self.assertEqual(writer.stats()["failed"], 1)
+
+        # A newer value that is written replaces it
+        async def retry():
+            return await writer.submit("a", "saved")
+
+        self.assertTrue(self.run_async(retry()))
+        self.assertIsNone(writer.get("a"))
+
+    def test_commit_exception_fails_the_batch(self):
+        def broken(items):
+            raise OSError("disk full")
+        writer = GroupCommitWriter(broken, window=0.01)
+
+        async def scenario():
+            return await writer.submit("a", 1)
+
+        self.assertFalse(self.run_async(scenario()))
+        self.assertEqual(writer.get("a"), 1)
+
+    def test_flush_sync_writes_pending(self):
+        commit = RecordingCommit()
+        writer = GroupCommitWriter(commit, window=60)
+
+        async def scenario():
+            writer.submit("a", 1)
+
+        self.run_async(scenario())
+        writer.flush_sync()
+        self.assertEqual(commit.stored, {"a": 1})
+
+
+class WriteFilesTest(unittest.TestCase):
+
+    def test_writes_every_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, name) for name in ("a", "b")]
+            self.assertEqual(write_files([(paths[0], b"one"), (paths[1], b"two")]), [True, True])
+            with open(paths[1], 'rb') as f:
+                self.assertEqual(f.read(), b"two")
+            # No temporary files are left behind
+            self.assertEqual(sorted(os.listdir(directory)), ["a", "b"])
+
+    def test_reports_failed_items(self):
+        with tempfile.TemporaryDirectory() as directory:
+            good = os.path.join(directory, "a")
+            bad = os.path.join(directory, "missing", "b")
+            self.assertEqual(write_files([(good, b"one"), (bad, b"two")]), [True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()